@@ -0,0 +1,444 @@
+import sys
+import os
+import json
+import gzip
+import random
+import time
+import datetime
+import argparse
+import functools
+import platform
+import shlex
+import string
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# zeek2es is imported from the directory of this script, which picks up a local zeek2es.so if one is built.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import zeek2es
+
+# The time the synthetic logs start at.
+starttime = datetime.datetime(2021, 6, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+
+# This generates the values of synthetic Zeek logs from a seed, so every run gets the same logs.
+class LogValues:
+    def __init__(self, seed=1, uids=()):
+        self.rand = random.Random(seed)
+        self.hosts = ["10.{}.{}.{}".format(self.rand.randint(0, 3), self.rand.randint(0, 255), self.rand.randint(1, 254)) for _ in range(200)]
+        self.servers = ["{}.{}.{}.{}".format(self.rand.randint(1, 223), self.rand.randint(0, 255), self.rand.randint(0, 255), self.rand.randint(1, 254)) for _ in range(500)]
+        self.servers += ["2001:db8:{:x}::{:x}".format(self.rand.randint(0, 65535), self.rand.randint(1, 65535)) for _ in range(50)]
+        self.domains = ["{}.{}".format("".join(self.rand.choices(string.ascii_lowercase, k=self.rand.randint(3, 12))), self.rand.choice(["com", "net", "org", "io"])) for _ in range(300)]
+        # The uids of the conn log, and the row being made, so the other logs refer to connections from a little before.
+        self.uids = uids
+        self.row = 0
+
+    def id(self, prefix, n=17):
+        return prefix + "".join(self.rand.choices(string.ascii_letters + string.digits, k=n))
+
+    # The uid of a new connection.
+    def uid(self):
+        return self.id("C")
+
+    # The uid of one of the last 500 connections of the conn log.
+    def olduid(self):
+        if len(self.uids) == 0:
+            return self.uid()
+        return self.uids[max(min(self.row, len(self.uids) - 1) - self.rand.randint(0, 500), 0)]
+
+    def host(self):
+        return self.rand.choice(self.hosts)
+
+    def server(self):
+        return self.rand.choice(self.servers)
+
+    def domain(self):
+        return self.rand.choice(self.domains)
+
+    def port(self):
+        return self.rand.choice([53, 80, 443, 443, 443, 22, 123, 8080, self.rand.randint(1024, 65535)])
+
+    def interval(self, scale=1.0):
+        return round(self.rand.expovariate(1.0 / scale), 6)
+
+    def count(self, scale=1000):
+        return int(self.rand.expovariate(1.0 / scale))
+
+    def maybe(self, value, p=0.5):
+        return value if self.rand.random() < p else None
+
+    def hexdigest(self, n):
+        return "".join(self.rand.choices("0123456789abcdef", k=n))
+
+# The fields of the synthetic logs, with their Zeek types and a function to make a value.
+# A value of None is unset, and containers are lists.
+logspecs = {
+    "conn": [
+        ("uid", "string", lambda v: v.uid()),
+        ("id.orig_h", "addr", lambda v: v.host()),
+        ("id.orig_p", "port", lambda v: v.rand.randint(1024, 65535)),
+        ("id.resp_h", "addr", lambda v: v.server()),
+        ("id.resp_p", "port", lambda v: v.port()),
+        ("proto", "enum", lambda v: v.rand.choice(["tcp", "tcp", "udp", "icmp"])),
+        ("service", "string", lambda v: v.maybe(v.rand.choice(["dns", "http", "ssl", "ssh"]), 0.7)),
+        ("duration", "interval", lambda v: v.maybe(v.interval(5.0), 0.8)),
+        ("orig_bytes", "count", lambda v: v.maybe(v.count(2000), 0.8)),
+        ("resp_bytes", "count", lambda v: v.maybe(v.count(20000), 0.8)),
+        ("conn_state", "string", lambda v: v.rand.choice(["SF", "S0", "REJ", "RSTO", "SHR", "OTH"])),
+        ("local_orig", "bool", lambda v: v.rand.random() < 0.9),
+        ("local_resp", "bool", lambda v: v.rand.random() < 0.1),
+        ("missed_bytes", "count", lambda v: 0),
+        ("history", "string", lambda v: v.rand.choice(["ShADadFf", "Dd", "S", "ShADadfF", "^dD"])),
+        ("orig_pkts", "count", lambda v: v.count(20)),
+        ("orig_ip_bytes", "count", lambda v: v.count(3000)),
+        ("resp_pkts", "count", lambda v: v.count(30)),
+        ("resp_ip_bytes", "count", lambda v: v.count(30000)),
+        ("tunnel_parents", "set[string]", lambda v: []),
+    ],
+    "dns": [
+        ("uid", "string", lambda v: v.olduid()),
+        ("id.orig_h", "addr", lambda v: v.host()),
+        ("id.orig_p", "port", lambda v: v.rand.randint(1024, 65535)),
+        ("id.resp_h", "addr", lambda v: v.server()),
+        ("id.resp_p", "port", lambda v: 53),
+        ("proto", "enum", lambda v: "udp"),
+        ("trans_id", "count", lambda v: v.rand.randint(0, 65535)),
+        ("rtt", "interval", lambda v: v.maybe(v.interval(0.05), 0.9)),
+        ("query", "string", lambda v: v.domain()),
+        ("qclass", "count", lambda v: 1),
+        ("qclass_name", "string", lambda v: "C_INTERNET"),
+        ("qtype", "count", lambda v: v.rand.choice([1, 28, 5, 15])),
+        ("qtype_name", "string", lambda v: v.rand.choice(["A", "AAAA", "CNAME", "MX"])),
+        ("rcode", "count", lambda v: v.rand.choice([0, 0, 0, 3])),
+        ("rcode_name", "string", lambda v: v.rand.choice(["NOERROR", "NOERROR", "NXDOMAIN"])),
+        ("AA", "bool", lambda v: False),
+        ("TC", "bool", lambda v: False),
+        ("RD", "bool", lambda v: True),
+        ("RA", "bool", lambda v: v.rand.random() < 0.9),
+        ("Z", "count", lambda v: 0),
+        ("answers", "vector[string]", lambda v: v.maybe([v.server() for _ in range(v.rand.randint(1, 4))], 0.8)),
+        ("TTLs", "vector[interval]", lambda v: v.maybe([float(v.rand.choice([60, 300, 3600])) for _ in range(v.rand.randint(1, 4))], 0.8)),
+        ("rejected", "bool", lambda v: False),
+    ],
+    "http": [
+        ("uid", "string", lambda v: v.olduid()),
+        ("id.orig_h", "addr", lambda v: v.host()),
+        ("id.orig_p", "port", lambda v: v.rand.randint(1024, 65535)),
+        ("id.resp_h", "addr", lambda v: v.server()),
+        ("id.resp_p", "port", lambda v: v.rand.choice([80, 8080])),
+        ("trans_depth", "count", lambda v: v.rand.randint(1, 5)),
+        ("method", "string", lambda v: v.rand.choice(["GET", "GET", "GET", "POST", "HEAD"])),
+        ("host", "string", lambda v: v.domain()),
+        ("uri", "string", lambda v: "/" + "/".join(v.id("", v.rand.randint(3, 10)) for _ in range(v.rand.randint(1, 4)))),
+        ("referrer", "string", lambda v: v.maybe("http://{}/".format(v.domain()), 0.3)),
+        ("version", "string", lambda v: "1.1"),
+        ("user_agent", "string", lambda v: v.rand.choice(["Mozilla/5.0 (X11; Linux x86_64)", "curl/7.68.0", "Wget/1.20.3"])),
+        ("origin", "string", lambda v: None),
+        ("request_body_len", "count", lambda v: v.count(100)),
+        ("response_body_len", "count", lambda v: v.count(50000)),
+        ("status_code", "count", lambda v: v.rand.choice([200, 200, 200, 301, 304, 404])),
+        ("status_msg", "string", lambda v: v.rand.choice(["OK", "Moved Permanently", "Not Modified", "Not Found"])),
+        ("info_code", "count", lambda v: None),
+        ("info_msg", "string", lambda v: None),
+        ("tags", "set[enum]", lambda v: []),
+        ("username", "string", lambda v: None),
+        ("password", "string", lambda v: None),
+        ("proxied", "set[string]", lambda v: None),
+        ("orig_fuids", "vector[string]", lambda v: None),
+        ("orig_filenames", "vector[string]", lambda v: None),
+        ("orig_mime_types", "vector[string]", lambda v: None),
+        ("resp_fuids", "vector[string]", lambda v: v.maybe([v.id("F")], 0.8)),
+        ("resp_filenames", "vector[string]", lambda v: None),
+        ("resp_mime_types", "vector[string]", lambda v: v.maybe([v.rand.choice(["text/html", "image/png", "application/json"])], 0.8)),
+    ],
+    "files": [
+        ("fuid", "string", lambda v: v.id("F")),
+        ("tx_hosts", "set[addr]", lambda v: [v.server()]),
+        ("rx_hosts", "set[addr]", lambda v: [v.host()]),
+        ("conn_uids", "set[string]", lambda v: [v.olduid() for _ in range(v.rand.randint(1, 2))]),
+        ("source", "string", lambda v: v.rand.choice(["HTTP", "SSL", "SMTP"])),
+        ("depth", "count", lambda v: 0),
+        ("analyzers", "set[string]", lambda v: v.rand.sample(["MD5", "SHA1", "SHA256", "PE", "X509"], v.rand.randint(0, 3))),
+        ("mime_type", "string", lambda v: v.rand.choice(["text/html", "image/png", "application/x-x509-ca-cert"])),
+        ("filename", "string", lambda v: v.maybe(v.id("", 8) + ".bin", 0.2)),
+        ("duration", "interval", lambda v: v.interval(0.5)),
+        ("local_orig", "bool", lambda v: False),
+        ("is_orig", "bool", lambda v: False),
+        ("seen_bytes", "count", lambda v: v.count(50000)),
+        ("total_bytes", "count", lambda v: v.maybe(v.count(50000), 0.7)),
+        ("missing_bytes", "count", lambda v: 0),
+        ("overflow_bytes", "count", lambda v: 0),
+        ("timedout", "bool", lambda v: False),
+        ("parent_fuid", "string", lambda v: None),
+        ("md5", "string", lambda v: v.maybe(v.hexdigest(32), 0.6)),
+        ("sha1", "string", lambda v: v.maybe(v.hexdigest(40), 0.6)),
+        ("sha256", "string", lambda v: None),
+        ("extracted", "string", lambda v: None),
+        ("extracted_cutoff", "bool", lambda v: None),
+        ("extracted_size", "count", lambda v: None),
+    ],
+}
+
+# A function to get the uids of the synthetic conn log with the same rows and seed, which the other logs refer to.
+@functools.lru_cache(maxsize=4)
+def connuids(rows, seed=1):
+    return [row["uid"] for row in logrows("conn", rows, seed)]
+
+# A function to make the rows of a synthetic log as dicts of field to value, in time order over an hour.
+def logrows(logtype, rows, seed=1):
+    values = LogValues(seed, connuids(rows, seed) if logtype != "conn" else ())
+    base = starttime.timestamp()
+    step = 3600.0 / max(rows, 1)
+    for k in range(rows):
+        values.row = k
+        row = {"ts": round(base + k * step + values.rand.random() * step, 6)}
+        for field, zeektype, make in logspecs[logtype]:
+            row[field] = make(values)
+        yield row
+
+# A function to write a value the way Zeek writes it in a TSV log.
+def tsvvalue(value, zeektype):
+    if value is None:
+        return "-"
+    if isinstance(value, list):
+        return ",".join(tsvvalue(x, zeektype) for x in value) if len(value) > 0 else "(empty)"
+    if isinstance(value, bool):
+        return "T" if value else "F"
+    if isinstance(value, float):
+        return "{:.6f}".format(value)
+    return str(value)
+
+# A function to write a synthetic Zeek TSV log, with its header block and close line.
+def writetsv(filename, logtype, rows, seed=1):
+    fields = ["ts"] + [f[0] for f in logspecs[logtype]]
+    types = ["time"] + [f[1] for f in logspecs[logtype]]
+    closetime = starttime + datetime.timedelta(hours=1)
+    with open(filename, "w") as f:
+        f.write("#separator \\x09\n#set_separator\t,\n#empty_field\t(empty)\n#unset_field\t-\n")
+        f.write("#path\t{}\n#open\t{}\n".format(logtype, starttime.strftime("%Y-%m-%d-%H-%M-%S")))
+        f.write("#fields\t{}\n#types\t{}\n".format("\t".join(fields), "\t".join(types)))
+        for row in logrows(logtype, rows, seed):
+            f.write("\t".join(tsvvalue(row[field], zeektype) for field, zeektype in zip(fields, types)))
+            f.write("\n")
+        f.write("#close\t{}\n".format(closetime.strftime("%Y-%m-%d-%H-%M-%S")))
+
+# A function to write a synthetic Zeek JSON log.  Like Zeek, unset fields are left out.
+def writejson(filename, logtype, rows, seed=1):
+    with open(filename, "w") as f:
+        for row in logrows(logtype, rows, seed):
+            f.write(json.dumps({k: v for k, v in row.items() if v is not None}, separators=(",", ":")))
+            f.write("\n")
+
+# This counts what the mock ES server was sent.  It is shared by the request threads.
+class MockStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.bulks = 0
+        self.docs = 0
+        self.rejected = 0
+        self.bytes = 0
+        self.indices = set()
+        self.connections = 0
+        # The method, path, Content-Encoding and uncompressed body of every request, if the server keeps them.
+        self.requests = []
+
+# This answers the requests zeek2es makes to ES: bulk bodies, index mappings, index templates,
+# lifecycle policies and ingest pipelines.  Bulk requests can be slowed down, and their documents
+# or the whole request can be rejected with a 429 as a busy ES does.
+class MockESHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.stats.lock:
+            self.server.stats.connections += 1
+
+    def do_PUT(self):
+        self.answer()
+
+    def do_POST(self):
+        self.answer()
+
+    def do_GET(self):
+        self.answer()
+
+    def reply(self, code, resp):
+        out = json.dumps(resp).encode("UTF-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def answer(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        path = self.path.split("?")[0]
+        if server.keep:
+            with server.stats.lock:
+                server.stats.requests.append((self.command, path, self.headers.get("Content-Encoding"), body))
+
+        if path == "/_bulk":
+            if server.latency > 0:
+                time.sleep(server.latency)
+            lines = body.split(b"\n")
+            ndocs = (len(lines) - 1) // 2
+            with server.stats.lock:
+                server.stats.bulks += 1
+                server.stats.bytes += len(body)
+                if server.rand.random() < server.rejectbulk:
+                    server.stats.rejected += ndocs
+                    reject = None
+                else:
+                    reject = [server.rand.random() < server.reject for _ in range(ndocs)]
+                    server.stats.rejected += sum(reject)
+                    server.stats.docs += ndocs - sum(reject)
+            if reject is None:
+                return self.reply(429, {"error": {"type": "es_rejected_execution_exception"}, "status": 429})
+            items = [{"create": {"status": 429, "error": {"type": "es_rejected_execution_exception"}}} if r else {"create": {"status": 201}} for r in reject]
+            return self.reply(200, {"took": 1, "errors": any(reject), "items": items})
+
+        # Humio ingest requests are only kept.
+        if path.startswith("/api/v1/ingest/"):
+            return self.reply(200, {})
+
+        if path.startswith("/_index_template/") or path.startswith("/_ilm/policy/") or path.startswith("/_ingest/pipeline/") or path.endswith("/_mapping"):
+            return self.reply(200, {"acknowledged": True})
+
+        # Anything else is an index being created, which only works once, like in ES.
+        index = path.strip("/")
+        with server.stats.lock:
+            exists = index in server.stats.indices
+            server.stats.indices.add(index)
+        if exists:
+            return self.reply(400, {"error": {"type": "resource_already_exists_exception", "index": index}, "status": 400})
+        return self.reply(200, {"acknowledged": True, "shards_acknowledged": True, "index": index})
+
+# A function to start the mock ES server on a free local port, in a thread of this process.
+def startmockes(latency=0.0, reject=0.0, rejectbulk=0.0, seed=1, keep=False):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockESHandler)
+    server.keep = keep
+    server.daemon_threads = True
+    server.latency = latency
+    server.reject = reject
+    server.rejectbulk = rejectbulk
+    server.rand = random.Random(seed)
+    server.stats = MockStats()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# The zeek2es options of every scenario.  A function is given the log type and the work directory.
+scenarios = {
+    "base": lambda logtype, workdir: [],
+    "ingest": lambda logtype, workdir: ["-g"],
+    "outputfields": lambda logtype, workdir: ["-y", "ts"] + [f[0] for f in logspecs[logtype][:3]],
+    "filterfile": lambda logtype, workdir: ["-f", filterfile(workdir)],
+    "lines": lambda logtype, workdir: ["-l", "5000"],
+}
+
+# A function to write the Python filter of the filterfile scenario, which keeps about half of the documents.
+def filterfile(workdir):
+    filename = os.path.join(workdir, "filter.txt")
+    with open(filename, "w") as f:
+        f.write('lambda x: str(x["ts"])[-1] in "02468"\n')
+    return filename
+
+# A function to run zeek2es on a log in a child process, returning how long it took, its peak RSS in KB and its exit code.
+def runzeek2es(zargs):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            sys.argv = ["zeek2es.py"] + zargs
+            args = zeek2es.parseargs()
+            zeek2es.main(**vars(args))
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else 1
+        except BaseException:
+            code = 1
+        finally:
+            sys.stdout.flush()
+            os._exit(code & 0xff)
+    start = time.perf_counter()
+    _, status, rusage = os.wait4(pid, 0)
+    seconds = time.perf_counter() - start
+    # Linux counts the peak RSS in KB, and macOS in bytes.
+    peak = rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+    return seconds, peak, os.waitstatus_to_exitcode(status)
+
+# A function to get the zeek2es version from the newest line of the CHANGES file.
+def version():
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "CHANGES"), "r") as f:
+            return f.readline().split()[0]
+    except (OSError, IndexError):
+        return ""
+
+# This takes care of arg parsing
+def parseargs():
+    parser = argparse.ArgumentParser(description='Benchmark zeek2es on synthetic Zeek logs against a local mock ES server.\nEvery scenario prints one JSON line.', formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('-r', '--rows', default=100000, type=int, help='The number of rows in every synthetic log. (default: 100000)')
+    parser.add_argument('--logs', nargs="+", default=list(logspecs), choices=list(logspecs), help='The log types to benchmark. (default: all)')
+    parser.add_argument('--formats', nargs="+", default=["tsv", "json"], choices=["tsv", "json"], help='The log formats to benchmark. (default: tsv json)')
+    parser.add_argument('--scenarios', nargs="+", default=list(scenarios), choices=list(scenarios), help='The scenarios to run for every log. (default: all)')
+    parser.add_argument('--zeekargs', default="", help='More zeek2es options for every scenario, in one quoted string.  Example: "--gzip -t".')
+    parser.add_argument('--latency', default=0.0, type=float, help='Seconds the mock ES server waits before answering a bulk request. (default: 0)')
+    parser.add_argument('--reject', default=0.0, type=float, help='The fraction of bulk documents the mock ES server rejects with a 429. (default: 0)')
+    parser.add_argument('--rejectbulk', default=0.0, type=float, help='The fraction of whole bulk requests the mock ES server rejects with a 429. (default: 0)')
+    parser.add_argument('--seed', default=1, type=int, help='The random seed for the logs and the mock ES server. (default: 1)')
+    parser.add_argument('--workdir', default="", help='A directory to keep the synthetic logs in, so they are made once.  (default: a temporary directory)')
+    parser.add_argument('-o', '--output', default="", help='A file to append the results to, as JSON lines. (default: empty string - stdout only)')
+    return parser.parse_args()
+
+# Everything important is in here.
+def main(**args):
+    workdir = args['workdir'] if len(args['workdir']) > 0 else tempfile.mkdtemp(prefix="zeek2es-benchmark-")
+    os.makedirs(workdir, exist_ok=True)
+    server = startmockes(args['latency'], args['reject'], args['rejectbulk'], args['seed'])
+    esurl = "http://127.0.0.1:{}/".format(server.server_address[1])
+    output = open(args['output'], "a") if len(args['output']) > 0 else None
+
+    for logtype in args['logs']:
+        for fmt in args['formats']:
+            # The JSON logs are named so zeek2es finds the log type in their name.
+            filename = os.path.join(workdir, "{}.{}.{}".format(logtype, args['rows'], "json.log" if fmt == "json" else "log"))
+            if not os.path.isfile(filename):
+                if fmt == "json":
+                    writejson(filename, logtype, args['rows'], args['seed'])
+                else:
+                    writetsv(filename, logtype, args['rows'], args['seed'])
+            size = os.path.getsize(filename)
+
+            for name in args['scenarios']:
+                zargs = [filename, "-u", esurl, "-z"] + scenarios[name](logtype, workdir) + shlex.split(args['zeekargs'])
+                if fmt == "json":
+                    zargs.append("-j")
+                with server.stats.lock:
+                    server.stats.reset()
+                seconds, peak, code = runzeek2es(zargs)
+                result = dict(time=datetime.datetime.now(datetime.timezone.utc).isoformat(), version=version(), python=platform.python_version(),
+                              scenario=name, log=logtype, format=fmt, rows=args['rows'], bytes=size, seconds=round(seconds, 3),
+                              rows_per_sec=round(args['rows'] / seconds, 1), bytes_per_sec=round(size / seconds, 1), peak_rss_kb=peak,
+                              docs=server.stats.docs, bulks=server.stats.bulks, rejected=server.stats.rejected, sent_bytes=server.stats.bytes,
+                              args=zargs[4:], exit=code)
+                line = json.dumps(result)
+                print(line, flush=True)
+                if output is not None:
+                    output.write(line + "\n")
+                    output.flush()
+
+    if output is not None:
+        output.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    args = parseargs()
+    main(**vars(args))
@@ -2,9 +2,7 @@
 
 # Things you can set:
 zeek2es_path=~/Source/zeek2es/zeek2es.py
-lognamedelim=\\.
 #zeek2es_path=~/zeek2es.py
-#lognamedelim=_2
 filter_file_dir=~/
 num_of_lines=50000
 num_of_gb=50
@@ -26,19 +24,7 @@ additional_args=$2
 logs=$3
 logdirs=${@:4}
 
-# Iterate through the *.log.gz files in the supplied directory
-for val in $logs; do
-    zeek2esargsplus=$zeek2esargs" --compress -d "$num_of_gb" "$additional_args
-    echo "Processing $val logs..."
-    filename_re="/^.*\/"$val$lognamedelim".*\.log\.gz$/"
-
-    filterfile=$filter_file_dir$val"_filter.txt"
-
-    if [ -f $filterfile ]; then
-      echo "  Using filter file "$filterfile
-      find $logdirs | awk $filename_re | parallel -j $njobs $pythoncmd $zeek2es_path {} $zeek2esargsplus -f $filterfile :::: -
-    else
-      echo "  No filter file found for "$filterfile
-      find $logdirs | awk $filename_re | parallel -j $njobs $pythoncmd $zeek2es_path {} $zeek2esargsplus :::: -
-    fi
-done
\ No newline at end of file
+# zeek2es finds the logs of each type in the supplied directories and processes them with
+# a pool of worker processes, one log type at a time.  Filter files are picked up from filter_file_dir.
+zeek2esargsplus=$zeek2esargs" --compress -d "$num_of_gb" "$additional_args
+$pythoncmd $zeek2es_path $logdirs $zeek2esargsplus --procs $njobs --logtypes $logs --filterdir $filter_file_dir
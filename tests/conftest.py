@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zeek2es
+import benchmark
+
+# The header of the conn logs written by the tests.
+connfields = ["ts", "uid", "id.orig_h", "id.orig_p", "id.resp_h", "id.resp_p", "proto", "service", "orig_bytes", "local_orig"]
+conntypes = ["time", "string", "addr", "port", "addr", "port", "enum", "string", "count", "bool"]
+
+# A function to make the conn rows written by the tests.  Every tenth row is local, and every hundredth has no time.
+def connrows(n):
+    rows = []
+    for i in range(n):
+        ts = "-" if i % 100 == 99 else "{}.{:06d}".format(1622548800 + i, i)
+        rows.append([ts, "C{:016x}".format(i), "10.0.{}.{}".format(i // 250 % 250, i % 250), str(1024 + i % 5000),
+                     "192.168.1.{}".format(i % 7), str((53, 80, 443)[i % 3]), ("udp", "tcp")[i % 2],
+                     ("dns", "http", "-")[i % 3], str(i * 10), "F" if i % 10 else "T"])
+    return rows
+
+# A function to write a Zeek TSV log.
+def writetsv(filename, path, fields, types, rows):
+    with open(filename, "w") as f:
+        f.write("#separator \\x09\n#set_separator\t,\n#empty_field\t(empty)\n#unset_field\t-\n")
+        f.write("#path\t{}\n#open\t2021-06-01-12-00-00\n".format(path))
+        f.write("#fields\t" + "\t".join(fields) + "\n#types\t" + "\t".join(types) + "\n")
+        for row in rows:
+            f.write("\t".join(row) + "\n")
+        f.write("#close\t2021-06-01-13-00-00\n")
+    return str(filename)
+
+# A function to write the same rows as a Zeek JSON log, the way Zeek writes them.
+def writejson(filename, fields, types, rows):
+    with open(filename, "w") as f:
+        for row in rows:
+            d = {}
+            for name, ztype, value in zip(fields, types, row):
+                if value == "-":
+                    continue
+                if ztype == "bool":
+                    d[name] = value == "T"
+                elif ztype in ("count", "port", "int"):
+                    d[name] = int(value)
+                elif ztype in ("time", "interval", "double"):
+                    d[name] = float(value)
+                else:
+                    d[name] = value
+            f.write(json.dumps(d) + "\n")
+    return str(filename)
+
+# A function to get the args of a command line, with the defaults for everything not given.
+def zargs(*argv):
+    saved = sys.argv
+    sys.argv = ["zeek2es.py"] + list(argv)
+    try:
+        return vars(zeek2es.parseargs())
+    finally:
+        sys.argv = saved
+
+# A function to run zeek2es on a command line, returning the documents written to stdout.
+def rundocs(capfd, *argv):
+    zeek2es.main(**zargs(*argv, "--stdout", "--nobulk"))
+    out = capfd.readouterr().out
+    return [json.loads(line) for line in out.splitlines() if len(line) > 0]
+
+# The logs in this directory were written by benchmark.py.  The files in its baseline directory hold what
+# zeek2es.py printed for them before it was rewritten, run from the directory with the options below.
+datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+baselines = {
+    "conn.log.s": ["conn.log", "-s"],
+    "conn.log.sb": ["conn.log", "-s", "-b"],
+    "conn.log.gz.sb": ["conn.log.gz", "-s", "-b"],
+    "dns.log.sb": ["dns.log", "-s", "-b"],
+    "http.log.sb": ["http.log", "-s", "-b"],
+    "files.log.sb": ["files.log", "-s", "-b"],
+    "conn.log.sy": ["conn.log", "-s", "-b", "-y", "ts", "uid", "id.orig_h", "orig_bytes", "service", "tunnel_parents"],
+    "conn.log.sa": ["conn.log", "-s", "-n", "sensor1", "-a", "lambda x: x.get('service') == 'dns'"],
+    "types.log.sb": ["types.log", "-s", "-b"],
+    "types.log.st": ["types.log", "-s", "-b", "-t"],
+    "types.log.str": ["types.log", "-s", "-b", "-t", "-r"],
+    "conn.log.st": ["conn.log", "-s", "-b", "-t"],
+    "conn.log.str": ["conn.log", "-s", "-b", "-t", "-r"],
+    "dns.log.st": ["dns.log", "-s", "-b", "-t"],
+    "files.log.str": ["files.log", "-s", "-b", "-t", "-r"],
+    "conn.json.s": ["json/conn.log", "-j", "-s"],
+    "conn.json.sb": ["json/conn.log", "-j", "-s", "-b"],
+    "conn.json.st": ["json/conn.log", "-j", "-s", "-b", "-t"],
+    "conn.json.str": ["json/conn.log", "-j", "-s", "-b", "-t", "-r"],
+    "conn.json.sy": ["json/conn.log", "-j", "-s", "-b", "-y", "ts", "uid", "id.orig_h", "orig_bytes", "service", "tunnel_parents"],
+    "conn.json.sa": ["json/conn.log", "-j", "-s", "-n", "sensor1", "-a", "lambda x: x.get('service') == 'dns'"],
+    "dns.json.sb": ["json/dns.log", "-j", "-s", "-b"],
+    "dns.json.st": ["json/dns.log", "-j", "-s", "-b", "-t"],
+    # This is what was printed by a run on conn.log with -o uid, and then runs on dns.log and http.log with -e uid.
+    "conn.log.correlate": ["conn.log", "dns.log", "http.log", "-s", "-b", "-a", "lambda x: 'service' not in x", "--correlate", "uid", "dns", "http"],
+}
+
+# A function to run zeek2es on a log of the data directory, returning what it printed and what it printed before.
+def runbaseline(capfd, monkeypatch, name, *argv):
+    monkeypatch.chdir(datadir)
+    zeek2es.main(**zargs(*baselines[name], *argv))
+    with open(os.path.join(datadir, "baseline", name)) as f:
+        return capfd.readouterr().out, f.read()
+
+# The files in the baseline directory ending in .es hold the requests zeek2es.py sent to ES for these options,
+# before it was rewritten, and those with .humio the requests it sent to Humio.  Each line is the method, the path
+# and the JSON lines of the body of a request.
+esbaselines = {
+    "conn.log.es": ["conn.log", "-l", "10"],
+    "conn.log.esg": ["conn.log", "-l", "10", "-g"],
+    "conn.log.esd": ["conn.log", "-l", "10", "-d", "10", "--compress"],
+    "conn.json.es": ["json/conn.log", "-j", "-l", "10"],
+    "conn.log.humio": ["conn.log", "-s", "--nobulk"],
+    "conn.log.humion": ["conn.log", "-s", "--nobulk", "-n", "sensor1"],
+    "dns.log.humio": ["dns.log", "-s", "--nobulk", "-l", "7"],
+}
+
+# A function to run zeek2es against a mock ES server that keeps what it was sent, returning its stats.  The
+# mock stands for Humio instead with humio.
+def sendmock(*argv, humio=False, **mockargs):
+    server = benchmark.startmockes(keep=True, **mockargs)
+    url = "http://127.0.0.1:{}/".format(server.server_port)
+    try:
+        zeek2es.main(**zargs(*argv, *(["--humio", url, "token"] if humio else ["-u", url])))
+    finally:
+        server.shutdown()
+        server.server_close()
+    return server.stats
+
+# A function to get the requests a mock ES server was sent, the way they are kept in the baseline directory.
+def requestlines(stats):
+    return [[method, path, [json.loads(line) for line in body.splitlines() if len(line) > 0]] for method, path, encoding, body in stats.requests]
+
+# A function to send a log of the data directory to a mock ES server, returning the requests it was sent and the
+# requests sent before.
+def runesbaseline(monkeypatch, name, *argv, **mockargs):
+    monkeypatch.chdir(datadir)
+    stats = sendmock(*esbaselines[name], *argv, humio=".humio" in name, **mockargs)
+    with open(os.path.join(datadir, "baseline", name)) as f:
+        return requestlines(stats), [json.loads(line) for line in f], stats
+
+# A function to split requests into the setup requests, in order, and the (action, document) pairs of the bulk
+# requests, sorted, since bulk requests can be sent at the same time.
+def bulksplit(requests):
+    setup = [r for r in requests if r[1] != "/_bulk"]
+    pairs = sorted(json.dumps(pair, sort_keys=True) for r in requests if r[1] == "/_bulk" for pair in zip(r[2][0::2], r[2][1::2]))
+    return setup, pairs
+
+# A function to get the JSON of each line of output.
+def jsonlines(out):
+    return [json.loads(line) for line in out.splitlines() if len(line) > 0]
+
+@pytest.fixture
+def conn(tmp_path):
+    return writetsv(tmp_path / "conn.log", "conn", connfields, conntypes, connrows(3000))
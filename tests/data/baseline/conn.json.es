@@ -0,0 +1,4 @@
+["PUT", "/zeek_conn_2021-06-01", [{"mappings": {"properties": {"ts": {"type": "date"}, "geoip_orig": {"properties": {"location": {"type": "geo_point"}}}, "geoip_resp": {"properties": {"location": {"type": "geo_point"}}}, "id.orig_h": {"type": "ip"}, "id.resp_h": {"type": "ip"}}}}]]
+["PUT", "/_bulk", [{"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:01:31.374744", "uid": "C5FLfmyHnGUS0LUNgN", "id.orig_h": "10.3.203.43", "id.orig_p": 50956, "id.resp_h": "19.248.42.217", "id.resp_p": 22, "proto": "udp", "duration": 2.738246, "orig_bytes": 565, "resp_bytes": 38625, "conn_state": "OTH", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "S", "orig_pkts": 39, "orig_ip_bytes": 8265, "resp_pkts": 12, "resp_ip_bytes": 76549, "tunnel_parents": [], "@timestamp": "2021-06-01T12:01:31.374744"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:02:50.021624", "uid": "Cd4j5OOU3s84AsTqC7", "id.orig_h": "10.1.85.234", "id.orig_p": 3525, "id.resp_h": "54.196.89.102", "id.resp_p": 80, "proto": "tcp", "service": "http", "duration": 0.776646, "orig_bytes": 1184, "resp_bytes": 82366, "conn_state": "S0", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadfF", "orig_pkts": 4, "orig_ip_bytes": 2863, "resp_pkts": 24, "resp_ip_bytes": 33964, "tunnel_parents": [], "@timestamp": "2021-06-01T12:02:50.021624"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:04:56.186589", "uid": "Cni54xGKZ1VpVHkavd", "id.orig_h": "10.3.232.3", "id.orig_p": 31141, "id.resp_h": "172.229.150.175", "id.resp_p": 8080, "proto": "icmp", "duration": 1.046135, "orig_bytes": 438, "resp_bytes": 3936, "conn_state": "OTH", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadFf", "orig_pkts": 3, "orig_ip_bytes": 30, "resp_pkts": 11, "resp_ip_bytes": 35526, "tunnel_parents": [], "@timestamp": "2021-06-01T12:04:56.186589"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:06:22.136102", "uid": "Cbr3rksFXP1BnmdLuw", "id.orig_h": "10.0.151.4", "id.orig_p": 51399, "id.resp_h": "152.56.109.21", "id.resp_p": 123, "proto": "tcp", "service": "http", "duration": 2.173344, "orig_bytes": 82, "resp_bytes": 8813, "conn_state": "SHR", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "Dd", "orig_pkts": 30, "orig_ip_bytes": 430, "resp_pkts": 16, "resp_ip_bytes": 33156, "tunnel_parents": [], "@timestamp": "2021-06-01T12:06:22.136102"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:09:53.684492", "uid": "Cps33NBbR6byrQlKyT", "id.orig_h": "10.0.228.69", "id.orig_p": 16975, "id.resp_h": "36.99.115.202", "id.resp_p": 22, "proto": "udp", "service": "ssh", "duration": 15.374017, "orig_bytes": 1462, "resp_bytes": 2924, "conn_state": "S0", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadFf", "orig_pkts": 34, "orig_ip_bytes": 43, "resp_pkts": 108, "resp_ip_bytes": 67634, "tunnel_parents": [], "@timestamp": "2021-06-01T12:09:53.684492"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:11:38.147084", "uid": "CVpkpsbm5rEr6gCrWZ", "id.orig_h": "10.0.161.211", "id.orig_p": 23282, "id.resp_h": "15.11.110.175", "id.resp_p": 443, "proto": "udp", "service": "ssh", "duration": 16.042046, "orig_bytes": 2805, "resp_bytes": 12198, "conn_state": "REJ", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "^dD", "orig_pkts": 7, "orig_ip_bytes": 4560, "resp_pkts": 15, "resp_ip_bytes": 5916, "tunnel_parents": [], "@timestamp": "2021-06-01T12:11:38.147084"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:13:33.505910", "uid": "CDuLYkAyt3fC1k6Eid", "id.orig_h": "10.0.228.207", "id.orig_p": 46849, "id.resp_h": "2001:db8:c04d::6fe0", "id.resp_p": 32433, "proto": "tcp", "service": "http", "duration": 3.861254, "conn_state": "REJ", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "^dD", "orig_pkts": 9, "orig_ip_bytes": 103, "resp_pkts": 16, "resp_ip_bytes": 20590, "tunnel_parents": [], "@timestamp": "2021-06-01T12:13:33.505910"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:15:56.777919", "uid": "Cxp7UeqsVs5R10PG4m", "id.orig_h": "10.2.248.7", "id.orig_p": 39124, "id.resp_h": "2001:db8:71c3::3be2", "id.resp_p": 443, "proto": "tcp", "service": "http", "duration": 0.928997, "orig_bytes": 1135, "conn_state": "S0", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "Dd", "orig_pkts": 43, "orig_ip_bytes": 4337, "resp_pkts": 1, "resp_ip_bytes": 2386, "tunnel_parents": [], "@timestamp": "2021-06-01T12:15:56.777919"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:17:34.104363", "uid": "C3l0aAp4gx0L0GftNC", "id.orig_h": "10.1.81.191", "id.orig_p": 37834, "id.resp_h": "105.176.64.148", "id.resp_p": 123, "proto": "tcp", "service": "ssl", "duration": 1.318376, "orig_bytes": 1035, "resp_bytes": 1273, "conn_state": "SHR", "local_orig": false, "local_resp": false, "missed_bytes": 0, "history": "S", "orig_pkts": 4, "orig_ip_bytes": 2030, "resp_pkts": 15, "resp_ip_bytes": 42072, "tunnel_parents": [], "@timestamp": "2021-06-01T12:17:34.104363"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:18:00.714801", "uid": "Cw7TWxS62dtueit7UB", "id.orig_h": "10.0.222.234", "id.orig_p": 25433, "id.resp_h": "167.52.214.214", "id.resp_p": 443, "proto": "icmp", "service": "dns", "duration": 6.614192, "orig_bytes": 64, "resp_bytes": 21561, "conn_state": "S0", "local_orig": true, "local_resp": true, "missed_bytes": 0, "history": "^dD", "orig_pkts": 29, "orig_ip_bytes": 2330, "resp_pkts": 80, "resp_ip_bytes": 16556, "tunnel_parents": [], "@timestamp": "2021-06-01T12:18:00.714801"}]]
+["PUT", "/_bulk", [{"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:20:32.222466", "uid": "CDBOMfv2och9OyYzhJ", "id.orig_h": "10.3.128.139", "id.orig_p": 43107, "id.resp_h": "180.121.73.15", "id.resp_p": 443, "proto": "tcp", "service": "ssh", "orig_bytes": 3274, "resp_bytes": 29481, "conn_state": "REJ", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadFf", "orig_pkts": 27, "orig_ip_bytes": 1147, "resp_pkts": 96, "resp_ip_bytes": 9075, "tunnel_parents": [], "@timestamp": "2021-06-01T12:20:32.222466"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:23:37.454962", "uid": "C90i5de95iPbHdUwDQ", "id.orig_h": "10.1.72.211", "id.orig_p": 43483, "id.resp_h": "2001:db8:c04d::6fe0", "id.resp_p": 8080, "proto": "icmp", "service": "dns", "duration": 2.976742, "orig_bytes": 384, "resp_bytes": 87, "conn_state": "SHR", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadfF", "orig_pkts": 2, "orig_ip_bytes": 2224, "resp_pkts": 33, "resp_ip_bytes": 52030, "tunnel_parents": [], "@timestamp": "2021-06-01T12:23:37.454962"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:25:11.600313", "uid": "CSMQFt8f6htBTrrFW4", "id.orig_h": "10.2.45.252", "id.orig_p": 39652, "id.resp_h": "179.156.136.126", "id.resp_p": 443, "proto": "tcp", "service": "ssl", "duration": 10.168683, "resp_bytes": 34332, "conn_state": "OTH", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadFf", "orig_pkts": 17, "orig_ip_bytes": 1716, "resp_pkts": 8, "resp_ip_bytes": 23330, "tunnel_parents": [], "@timestamp": "2021-06-01T12:25:11.600313"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:26:08.750776", "uid": "CPpQVv4xi8uzfK8AyJ", "id.orig_h": "10.3.57.166", "id.orig_p": 18094, "id.resp_h": "167.95.1.23", "id.resp_p": 123, "proto": "tcp", "orig_bytes": 7, "conn_state": "S0", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadfF", "orig_pkts": 19, "orig_ip_bytes": 723, "resp_pkts": 6, "resp_ip_bytes": 14791, "tunnel_parents": [], "@timestamp": "2021-06-01T12:26:08.750776"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:29:32.843258", "uid": "CRrkPVLeMJHpEBHg8u", "id.orig_h": "10.1.145.38", "id.orig_p": 52253, "id.resp_h": "78.50.30.204", "id.resp_p": 443, "proto": "tcp", "service": "ssh", "duration": 9.255677, "orig_bytes": 1293, "conn_state": "REJ", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadfF", "orig_pkts": 5, "orig_ip_bytes": 497, "resp_pkts": 25, "resp_ip_bytes": 2109, "tunnel_parents": [], "@timestamp": "2021-06-01T12:29:32.843258"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:31:46.117925", "uid": "CzZHIR45ZxbHe8DDP6", "id.orig_h": "10.0.169.118", "id.orig_p": 27247, "id.resp_h": "149.199.108.116", "id.resp_p": 123, "proto": "icmp", "service": "ssh", "duration": 6.250792, "orig_bytes": 280, "conn_state": "OTH", "local_orig": false, "local_resp": false, "missed_bytes": 0, "history": "ShADadfF", "orig_pkts": 4, "orig_ip_bytes": 3022, "resp_pkts": 17, "resp_ip_bytes": 48336, "tunnel_parents": [], "@timestamp": "2021-06-01T12:31:46.117925"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:32:02.627712", "uid": "CcTiKUFZ27ecSCjcss", "id.orig_h": "10.1.211.87", "id.orig_p": 35329, "id.resp_h": "6.249.10.239", "id.resp_p": 53, "proto": "icmp", "duration": 6.740694, "orig_bytes": 2791, "resp_bytes": 24250, "conn_state": "RSTO", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "S", "orig_pkts": 29, "orig_ip_bytes": 151, "resp_pkts": 6, "resp_ip_bytes": 5986, "tunnel_parents": [], "@timestamp": "2021-06-01T12:32:02.627712"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:34:16.594260", "uid": "CfcZtEJLbJxTiVgInI", "id.orig_h": "10.0.119.125", "id.orig_p": 57054, "id.resp_h": "51.28.184.247", "id.resp_p": 123, "proto": "tcp", "service": "http", "duration": 0.971816, "orig_bytes": 2557, "resp_bytes": 45170, "conn_state": "SHR", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "S", "orig_pkts": 20, "orig_ip_bytes": 822, "resp_pkts": 2, "resp_ip_bytes": 58256, "tunnel_parents": [], "@timestamp": "2021-06-01T12:34:16.594260"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:36:39.049100", "uid": "COLnVkYdw1MscB8UkI", "id.orig_h": "10.0.71.249", "id.orig_p": 45630, "id.resp_h": "2001:db8:3f2c::8941", "id.resp_p": 22, "proto": "udp", "service": "ssl", "duration": 5.508817, "resp_bytes": 28357, "conn_state": "S0", "local_orig": false, "local_resp": false, "missed_bytes": 0, "history": "ShADadFf", "orig_pkts": 55, "orig_ip_bytes": 1303, "resp_pkts": 37, "resp_ip_bytes": 13696, "tunnel_parents": [], "@timestamp": "2021-06-01T12:36:39.049100"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:39:21.176991", "uid": "CPQcJ5GxfaalgxFyBL", "id.orig_h": "10.1.51.129", "id.orig_p": 61029, "id.resp_h": "213.66.95.144", "id.resp_p": 8080, "proto": "tcp", "service": "ssl", "duration": 24.523847, "resp_bytes": 3517, "conn_state": "REJ", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadFf", "orig_pkts": 1, "orig_ip_bytes": 2767, "resp_pkts": 0, "resp_ip_bytes": 35677, "tunnel_parents": [], "@timestamp": "2021-06-01T12:39:21.176991"}]]
+["PUT", "/_bulk", [{"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:40:01.501925", "uid": "C4BlxjvMgYMvASkFD2", "id.orig_h": "10.3.201.151", "id.orig_p": 5295, "id.resp_h": "103.61.249.238", "id.resp_p": 443, "proto": "tcp", "duration": 3.945504, "orig_bytes": 37, "conn_state": "S0", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadfF", "orig_pkts": 14, "orig_ip_bytes": 783, "resp_pkts": 1, "resp_ip_bytes": 5553, "tunnel_parents": [], "@timestamp": "2021-06-01T12:40:01.501925"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:43:35.123086", "uid": "CPAHqU3WHsoHuITzHL", "id.orig_h": "10.3.221.156", "id.orig_p": 51986, "id.resp_h": "2001:db8:c04d::6fe0", "id.resp_p": 53, "proto": "udp", "service": "ssh", "orig_bytes": 2476, "resp_bytes": 10384, "conn_state": "S0", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "Dd", "orig_pkts": 28, "orig_ip_bytes": 5416, "resp_pkts": 5, "resp_ip_bytes": 8942, "tunnel_parents": [], "@timestamp": "2021-06-01T12:43:35.123086"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:45:24.900002", "uid": "Cqe1PbluNmDjcFyNro", "id.orig_h": "10.1.139.166", "id.orig_p": 31149, "id.resp_h": "114.203.93.122", "id.resp_p": 53, "proto": "tcp", "service": "dns", "duration": 12.220658, "orig_bytes": 5538, "resp_bytes": 5721, "conn_state": "S0", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "S", "orig_pkts": 23, "orig_ip_bytes": 6191, "resp_pkts": 14, "resp_ip_bytes": 3398, "tunnel_parents": [], "@timestamp": "2021-06-01T12:45:24.900002"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:47:22.779923", "uid": "CAAYnkKMCgy1UlQJ6w", "id.orig_h": "10.0.119.125", "id.orig_p": 25648, "id.resp_h": "2001:db8:6faf::2a85", "id.resp_p": 80, "proto": "tcp", "service": "http", "orig_bytes": 178, "resp_bytes": 2063, "conn_state": "REJ", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "S", "orig_pkts": 16, "orig_ip_bytes": 800, "resp_pkts": 63, "resp_ip_bytes": 44315, "tunnel_parents": [], "@timestamp": "2021-06-01T12:47:22.779923"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:48:50.193775", "uid": "Cj0iuluEtRcZluFlOA", "id.orig_h": "10.0.43.35", "id.orig_p": 39188, "id.resp_h": "164.85.119.219", "id.resp_p": 53, "proto": "udp", "service": "ssh", "duration": 2.589866, "resp_bytes": 18678, "conn_state": "RSTO", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadfF", "orig_pkts": 24, "orig_ip_bytes": 2451, "resp_pkts": 8, "resp_ip_bytes": 11112, "tunnel_parents": [], "@timestamp": "2021-06-01T12:48:50.193775"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:50:49.238951", "uid": "CsWmOi0Ln2gXnUHP1i", "id.orig_h": "10.3.232.3", "id.orig_p": 44414, "id.resp_h": "33.202.228.7", "id.resp_p": 22, "proto": "tcp", "duration": 9.856514, "orig_bytes": 120, "conn_state": "SF", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadFf", "orig_pkts": 3, "orig_ip_bytes": 597, "resp_pkts": 6, "resp_ip_bytes": 50167, "tunnel_parents": [], "@timestamp": "2021-06-01T12:50:49.238951"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:53:17.359010", "uid": "CcLMM2QEMHo8oguk4F", "id.orig_h": "10.0.151.4", "id.orig_p": 21000, "id.resp_h": "185.184.0.183", "id.resp_p": 8080, "proto": "udp", "service": "ssh", "duration": 3.207076, "orig_bytes": 357, "resp_bytes": 24259, "conn_state": "SHR", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadfF", "orig_pkts": 4, "orig_ip_bytes": 5266, "resp_pkts": 28, "resp_ip_bytes": 18902, "tunnel_parents": [], "@timestamp": "2021-06-01T12:53:17.359010"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:54:27.161302", "uid": "CdMkCK3acMeRy3XQYv", "id.orig_h": "10.0.83.134", "id.orig_p": 43931, "id.resp_h": "169.195.197.23", "id.resp_p": 22, "proto": "tcp", "service": "dns", "orig_bytes": 2392, "resp_bytes": 17923, "conn_state": "REJ", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "Dd", "orig_pkts": 31, "orig_ip_bytes": 2165, "resp_pkts": 4, "resp_ip_bytes": 51781, "tunnel_parents": [], "@timestamp": "2021-06-01T12:54:27.161302"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:56:01.512529", "uid": "CannBajrT6ZlMyXX2r", "id.orig_h": "10.2.201.166", "id.orig_p": 63144, "id.resp_h": "38.212.75.5", "id.resp_p": 80, "proto": "icmp", "duration": 2.422832, "orig_bytes": 113, "resp_bytes": 6217, "conn_state": "OTH", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "ShADadfF", "orig_pkts": 0, "orig_ip_bytes": 1019, "resp_pkts": 56, "resp_ip_bytes": 46516, "tunnel_parents": [], "@timestamp": "2021-06-01T12:56:01.512529"}, {"create": {"_index": "zeek_conn_2021-06-01"}}, {"ts": "2021-06-01T12:58:14.677332", "uid": "COZA6AIKRESRL4zsCp", "id.orig_h": "10.2.203.145", "id.orig_p": 52390, "id.resp_h": "200.221.216.71", "id.resp_p": 53, "proto": "udp", "orig_bytes": 385, "resp_bytes": 15774, "conn_state": "S0", "local_orig": true, "local_resp": false, "missed_bytes": 0, "history": "Dd", "orig_pkts": 10, "orig_ip_bytes": 5596, "resp_pkts": 42, "resp_ip_bytes": 49641, "tunnel_parents": [], "@timestamp": "2021-06-01T12:58:14.677332"}]]
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import zeek2es
+from conftest import runesbaseline, sendmock, requestlines, bulksplit
+
+@pytest.fixture(autouse=True)
+def nobackoff(monkeypatch):
+    monkeypatch.setattr(zeek2es, "retrybackoff", lambda attempt: 0)
+
+# A function to get the bulk bodies a mock ES server was sent.
+def bodies(stats):
+    return [body for method, path, encoding, body in stats.requests if path == "/_bulk"]
+
+def test_byte_budget(conn, monkeypatch):
+    stats = sendmock(conn, "-l", "100000", "--bulksize", "1")
+    longest = max(len(line) for body in bodies(stats) for line in body.splitlines())
+    # A request is sent once it has a MB, so it has at most one more document.
+    assert len(bodies(stats)) > 1 and all(len(body) < 1024 * 1024 + 2 * longest + 2 for body in bodies(stats))
+    assert bulksplit(requestlines(stats)) == bulksplit(requestlines(sendmock(conn, "-l", "100", "--bulksize", "0")))
+
+@pytest.mark.parametrize("options", [["--adaptive", "10"], ["--adaptive", "10", "--senders", "1"]])
+def test_adaptive_same_requests(monkeypatch, options):
+    requests, before, stats = runesbaseline(monkeypatch, "conn.log.es", "-l", "2", *options)
+    assert bulksplit(requests) == bulksplit(before)
+    # Fast requests grow, so fewer are needed than with -l 2.
+    assert len(bodies(stats)) < 15
+
+def test_adaptive_busy_es(monkeypatch):
+    requests, before, stats = runesbaseline(monkeypatch, "conn.log.es", "--adaptive", "10", "--retries", "50", rejectbulk=0.3)
+    assert stats.docs == 30 and stats.rejected > 0
+    documents = lambda requests: sorted(set(json.dumps(doc, sort_keys=True) for r in requests if r[1] == "/_bulk" for doc in r[2][1::2]))
+    assert documents(requests) == documents(before)
+
+def test_observe():
+    size = zeek2es.BatchSize()
+    size.setup(dict(lines=100, bulksize=50, adaptive=1.0))
+    assert not size.full(99, 1000) and size.full(100, 1000) and size.full(1, 50 * 1024 * 1024)
+    size.observe(0.1, 100, False)
+    assert size.lines == 110
+    # A small request says nothing about a bigger one.
+    size.observe(0.1, 10, False)
+    assert size.lines == 110
+    size.observe(2.0, 110, False)
+    assert size.lines == 82
+    size.observe(0.1, 82, True)
+    assert size.lines == 41
+    for _ in range(10):
+        size.observe(0.1, 1, True)
+    assert size.lines == 1
+    for _ in range(200):
+        size.observe(0.1, size.lines, False)
+    assert size.lines == 1000
+    # The same arguments keep what was learned, and new ones start over.
+    size.setup(dict(lines=100, bulksize=50, adaptive=1.0))
+    assert size.lines == 1000
+    size.setup(dict(lines=100, bulksize=0, adaptive=0.0))
+    size.observe(0.1, 100, False)
+    assert size.lines == 100 and not size.full(99, 1024 ** 3)
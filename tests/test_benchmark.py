@@ -0,0 +1,19 @@
+import pytest
+
+import benchmark
+
+@pytest.mark.parametrize("logtype", ["dns", "http"])
+def test_uids_come_from_conn(logtype):
+    uids = set(benchmark.connuids(2000))
+    rows = list(benchmark.logrows(logtype, 2000))
+    assert len(set(r["uid"] for r in rows)) > 1000
+    assert all(r["uid"] in uids for r in rows)
+
+def test_files_refer_to_conn():
+    uids = set(benchmark.connuids(2000))
+    found = [u for r in benchmark.logrows("files", 2000) for u in r["conn_uids"]]
+    assert len(set(found)) > 1000
+    assert all(u in uids for u in found)
+
+def test_logs_are_the_same_every_run():
+    assert list(benchmark.logrows("dns", 100, seed=3)) == list(benchmark.logrows("dns", 100, seed=3))
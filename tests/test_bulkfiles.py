@@ -0,0 +1,27 @@
+import glob
+
+import pytest
+
+import zeek2es
+import benchmark
+from conftest import zargs, rundocs
+
+def test_load_with_stdout_is_refused(tmp_path):
+    with pytest.raises(SystemExit) as exc:
+        zeek2es.main(**zargs(str(tmp_path), "--load", "--stdout", "--supresswarnings"))
+    assert exc.value.code == -19
+
+@pytest.mark.parametrize("outcompress", ["none", "gzip"])
+def test_write_then_load(conn, tmp_path, capfd, outcompress):
+    outdir = tmp_path / "out"
+    zeek2es.main(**zargs(conn, "--outdir", str(outdir), "--outcompress", outcompress))
+    assert len(glob.glob(str(outdir / "*" / "*.ndjson*"))) == 1
+    assert glob.glob(str(outdir / "*" / "*.tmp")) == []
+
+    server = benchmark.startmockes()
+    try:
+        zeek2es.main(**zargs(str(outdir), "--load", "-u", "http://127.0.0.1:{}".format(server.server_port), "-l", "500"))
+    finally:
+        server.shutdown()
+    assert server.stats.docs == len(rundocs(capfd, conn)) == 2970
+    assert server.stats.bulks >= 6
@@ -0,0 +1,107 @@
+import gzip
+import json
+import shutil
+
+import pytest
+
+import zeek2es
+from conftest import connrows, rundocs, zargs
+
+# The number of header lines written by writetsv.
+headerlines = 8
+
+# A function to get the lines recorded last in a checkpoint file, by log.
+def checkpoints(filename):
+    lines = {}
+    with open(filename) as f:
+        for line in f:
+            if line.endswith("}\n"):
+                c = json.loads(line)
+                lines[c["log"]] = c["line"]
+    return lines
+
+@pytest.fixture
+def conngz(conn, tmp_path):
+    (tmp_path / "gz").mkdir()
+    filename = str(tmp_path / "gz" / "conn.log.gz")
+    with open(conn, "rb") as src, gzip.open(filename, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    return filename
+
+def test_checkpoint_is_the_whole_log(conn, tmp_path, capfd):
+    ck = str(tmp_path / "ck.txt")
+    assert len(rundocs(capfd, conn, "--checkpoint", ck, "-l", "700")) == 2970
+    assert checkpoints(ck) == {zeek2es.fileid(conn): headerlines + 3000}
+    # Nothing is left to send.
+    zeek2es.checkpointstores.clear()
+    assert rundocs(capfd, conn, "--checkpoint", ck, "--resume") == []
+
+@pytest.mark.parametrize("fileprocs", ["0", "2"])
+@pytest.mark.parametrize("compressed", [False, True])
+def test_resume_skips_what_was_sent(conn, conngz, tmp_path, capfd, fileprocs, compressed):
+    filename = conngz if compressed else conn
+    ck = str(tmp_path / "ck.txt")
+    with open(ck, "w") as f:
+        f.write(json.dumps(dict(log=zeek2es.fileid(filename), filename=filename, line=headerlines + 1234)) + "\n")
+        # A line cut short when we were stopped is left out.
+        f.write('{"log": "')
+    zeek2es.checkpointstores.clear()
+    docs = rundocs(capfd, filename, "--checkpoint", ck, "--resume", "--fileprocs", fileprocs)
+    assert sorted(d["uid"] for d in docs) == sorted(r[1] for r in connrows(3000)[1234:] if r[0] != "-")
+    assert checkpoints(ck)[zeek2es.fileid(filename)] == headerlines + 3000
+    zeek2es.checkpointstores.clear()
+    assert zeek2es.checkpointstore(zargs(filename, "--checkpoint", ck)).get(zeek2es.fileid(filename)) == headerlines + 3000
+
+def test_ids_are_the_same_compressed_or_not(conn, conngz, capfd):
+    ids = []
+    for filename in (conn, conngz):
+        zeek2es.main(**zargs(filename, "--stdout", "--ids"))
+        ids.append([json.loads(line)["create"]["_id"] for line in capfd.readouterr().out.splitlines() if line.startswith('{"create"')])
+    assert len(ids[0]) == len(set(ids[0])) == 2970
+    assert ids[0] == ids[1]
+
+def test_progress_waits_for_earlier_lines(tmp_path):
+    store = zeek2es.CheckpointStore(str(tmp_path / "ck.txt"))
+    progress = zeek2es.LogProgress(store, "log", "conn.log")
+    first = progress.claim(10)
+    second = progress.claim(20)
+    assert progress.claim(20) is None
+    second()
+    assert store.get("log") == 0
+    first()
+    assert store.get("log") == 20
+
+def test_empty_checkpoint_file(tmp_path):
+    ck = tmp_path / "ck.txt"
+    ck.write_text("")
+    store = zeek2es.CheckpointStore(str(ck))
+    store.record("log", "conn.log", 5)
+    assert zeek2es.CheckpointStore(str(ck)).get("log") == 5
+
+def test_checkpoint_file_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(zeek2es, "checkpointcompact", 10)
+    ck = str(tmp_path / "ck.txt")
+    # Two stores stand for two processes adding to the same file.
+    store, other = zeek2es.CheckpointStore(ck), zeek2es.CheckpointStore(ck)
+    for i in range(1, 10):
+        store.record("log", "conn.log", i)
+        other.record("other", "dns.log", i * 2)
+    with open(ck) as f:
+        assert len(f.read().splitlines()) == 18
+    store.record("log", "conn.log", 10)
+    with open(ck) as f:
+        assert [json.loads(line) for line in f] == [dict(log="log", filename="conn.log", line=10), dict(log="other", filename="dns.log", line=18)]
+    other.record("other", "dns.log", 20)
+    assert checkpoints(ck) == {"log": 10, "other": 20}
+    assert zeek2es.CheckpointStore(ck).lines == {"log": 10, "other": 20}
+
+@pytest.mark.parametrize("fileprocs", ["0", "2"])
+def test_compacted_while_sending(conn, tmp_path, capfd, monkeypatch, fileprocs):
+    monkeypatch.setattr(zeek2es, "checkpointcompact", 3)
+    ck = str(tmp_path / "ck.txt")
+    assert len(rundocs(capfd, conn, "--checkpoint", ck, "-l", "100", "--fileprocs", fileprocs)) == 2970
+    with open(ck) as f:
+        assert len(f.read().splitlines()) <= 3
+    assert checkpoints(ck) == {zeek2es.fileid(conn): headerlines + 3000}
+    zeek2es.checkpointstores.clear()
+    assert rundocs(capfd, conn, "--checkpoint", ck, "--resume") == []
@@ -0,0 +1,64 @@
+import glob
+
+import pytest
+
+pyarrow = pytest.importorskip("pyarrow")
+import pyarrow.ipc
+import pyarrow.parquet
+
+import zeek2es
+from conftest import zargs, rundocs
+
+# A function to read back every table written to an outdir.
+def readtables(outdir, outformat):
+    files = sorted(glob.glob(str(outdir / "*" / ("*.parquet" if outformat == "parquet" else "*.arrow"))))
+    if outformat == "parquet":
+        return [pyarrow.parquet.read_table(f) for f in files]
+    return [pyarrow.ipc.open_file(f).read_all() for f in files]
+
+@pytest.mark.parametrize("outformat", ["parquet", "arrow"])
+def test_every_batch_is_written(conn, tmp_path, outformat):
+    outdir = tmp_path / "out"
+    zeek2es.main(**zargs(conn, "--outdir", str(outdir), "--outformat", outformat, "-l", "1000"))
+    tables = readtables(outdir, outformat)
+    assert len(tables) == 1
+    assert tables[0].num_rows == 2970
+    assert glob.glob(str(outdir / "*" / "*.tmp")) == []
+
+@pytest.mark.parametrize("filters", [[], ["-a", "lambda x: True"], ["--filter", "local_orig == T"]])
+def test_rows_match_ndjson(conn, tmp_path, capfd, filters):
+    docs = rundocs(capfd, conn, *filters)
+    outdir = tmp_path / "out"
+    zeek2es.main(**zargs(conn, "--outdir", str(outdir), "--outformat", "parquet", "-l", "700", *filters))
+    rows = sum(t.num_rows for t in readtables(outdir, "parquet"))
+    assert rows == len(docs)
+    assert sorted(uid for t in readtables(outdir, "parquet") for uid in t.column("uid").to_pylist()) == sorted(d["uid"] for d in docs)
+
+# This stands in for a writer that fails, such as when the disk is full.
+class FailingWriter:
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write_table(self, table):
+        raise IOError("disk full")
+
+    def close(self):
+        self.writer.close()
+
+def test_failed_write_is_not_finished(tmp_path):
+    files = zeek2es.ColumnarFiles(zargs("x.log", "--outdir", str(tmp_path), "--outformat", "arrow"))
+    table = pyarrow.table({"a": [1, 2]})
+    files.write(table, "index")
+    files.files["index"][1] = FailingWriter(files.files["index"][1])
+    with pytest.raises(IOError):
+        files.write(table, "index")
+    files.close()
+    assert glob.glob(str(tmp_path / "index" / "*")) == []
+
+def test_new_schema_starts_a_new_file(tmp_path):
+    files = zeek2es.ColumnarFiles(zargs("x.log", "--outdir", str(tmp_path), "--outformat", "arrow"))
+    files.write(pyarrow.table({"a": [1, 2]}), "index")
+    files.write(pyarrow.table({"a": [3]}), "index")
+    files.write(pyarrow.table({"b": ["x"]}), "index")
+    files.close()
+    assert [t.num_rows for t in readtables(tmp_path, "arrow")] == [3, 1]
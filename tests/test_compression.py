@@ -0,0 +1,98 @@
+import bz2
+import gzip
+import shutil
+
+import pytest
+
+import zeek2es
+from conftest import connfields, conntypes, connrows, writetsv, rundocs, zargs
+
+# A function to compress a log with a compression module, as Zeek or logrotate would.
+def compress(src, dst, opener):
+    with open(src, "rb") as s, opener(dst, "wb") as d:
+        shutil.copyfileobj(s, d)
+    return str(dst)
+
+# A function to get the documents of a log, leaving out the name of the log.
+def docs(capfd, filename):
+    found = rundocs(capfd, filename)
+    for d in found:
+        del d["zeek_log_filename"]
+    return found
+
+def test_magic_bytes(conn, tmp_path):
+    assert zeek2es.compression(conn) is None
+    assert zeek2es.compression(compress(conn, tmp_path / "a.log.gz", gzip.open)) == "gzip"
+    assert zeek2es.compression(compress(conn, tmp_path / "a.log.bz2", bz2.open)) == "bz2"
+    # The name does not matter, only what is in the file.
+    assert zeek2es.compression(compress(conn, tmp_path / "b.log", gzip.open)) == "gzip"
+    shutil.copy(conn, tmp_path / "c.log.gz")
+    assert zeek2es.compression(str(tmp_path / "c.log.gz")) is None
+    (tmp_path / "empty.log").write_bytes(b"")
+    assert zeek2es.compression(str(tmp_path / "empty.log")) is None
+
+def test_compressed_logs_give_the_same_documents(conn, tmp_path, capfd):
+    plain = docs(capfd, conn)
+    assert len(plain) == 2970
+    assert docs(capfd, compress(conn, tmp_path / "conn.log.bz2", bz2.open)) == plain
+    assert docs(capfd, compress(conn, tmp_path / "conn.log.gz", gzip.open)) == plain
+
+def test_gzip_with_more_than_one_member(tmp_path, capfd):
+    rows = connrows(3000)
+    whole = writetsv(tmp_path / "whole.log", "conn", connfields, conntypes, rows)
+    with open(whole, "rb") as f:
+        data = f.read()
+    # A log that was appended to in pieces is read to the end.
+    cut = len(data) // 3
+    with open(tmp_path / "conn.log.gz", "wb") as f:
+        f.write(gzip.compress(data[:cut]))
+        f.write(gzip.compress(data[cut:2 * cut]))
+        f.write(gzip.compress(data[2 * cut:]))
+    assert docs(capfd, str(tmp_path / "conn.log.gz")) == docs(capfd, whole)
+
+def test_zstd_logs(conn, tmp_path, capfd):
+    zstandard = pytest.importorskip("zstandard")
+    filename = tmp_path / "conn.log.zst"
+    with open(conn, "rb") as f:
+        data = f.read()
+    # zstd logs can be written in more than one frame, too.
+    with open(filename, "wb") as f:
+        f.write(zstandard.ZstdCompressor().compress(data[:1000]))
+        f.write(zstandard.ZstdCompressor().compress(data[1000:]))
+    assert zeek2es.compression(str(filename)) == "zstd"
+    assert docs(capfd, str(filename)) == docs(capfd, conn)
+
+def test_lz4_logs(conn, tmp_path, capfd):
+    lz4frame = pytest.importorskip("lz4.frame")
+    filename = compress(conn, tmp_path / "conn.log.lz4", lz4frame.open)
+    assert zeek2es.compression(filename) == "lz4"
+    assert docs(capfd, filename) == docs(capfd, conn)
+
+def test_missing_library(conn, tmp_path, monkeypatch):
+    filename = str(tmp_path / "conn.log.zst")
+    with open(filename, "wb") as f:
+        f.write(b"\x28\xb5\x2f\xfd" + b"\0" * 20)
+    monkeypatch.setattr(zeek2es, "zstandard", None)
+    assert not zeek2es.candecompress(filename)
+    assert zeek2es.candecompress(conn)
+    with pytest.raises(SystemExit) as exc:
+        zeek2es.main(**zargs(filename, "--stdout", "--supresswarnings"))
+    assert exc.value.code == -18
+
+def test_close_before_the_end(conn, tmp_path, monkeypatch):
+    monkeypatch.setattr(zeek2es, "decompresschunk", 4096)
+    filename = compress(conn, tmp_path / "conn.log.gz", gzip.open)
+    raw = zeek2es.DecompressReader(zeek2es.decompressor(filename, "gzip"))
+    with zeek2es.io.BufferedReader(raw, 4096) as f:
+        assert f.readline().startswith(b"#separator")
+    # The thread decompressing the log stops, rather than waiting for its buffers to be read.
+    assert not raw.thread.is_alive()
+    assert raw.f.closed
+
+def test_find_compressed_logs(tmp_path):
+    (tmp_path / "d").mkdir()
+    for name in ["conn.log", "dns.log.gz", "d/conn.01.log.zst", "d/http.log.bz2", "d/ssl.log.lz4", "d/notes.txt", "d/conn.log.tmp"]:
+        (tmp_path / name).write_bytes(b"")
+    found = dict(zeek2es.findlogs([str(tmp_path)]))
+    assert sorted(found) == ["conn", "dns", "http", "ssl"]
+    assert [f[len(str(tmp_path)) + 1:] for f in found["conn"]] == ["conn.log", "d/conn.01.log.zst"]
@@ -0,0 +1,35 @@
+import pytest
+
+import zeek2es
+from conftest import runbaseline, jsonlines, zargs
+
+# The --numpy option is only checked when NumPy is installed.
+numpyoptions = [[], pytest.param(["--numpy"], marks=pytest.mark.skipif(zeek2es.numpy is None, reason="numpy is not installed"))]
+
+@pytest.mark.parametrize("options", numpyoptions)
+@pytest.mark.parametrize("name", ["types.log.sb", "conn.log.sb", "conn.log.sy", "conn.log.sa", "dns.log.sb", "http.log.sb", "files.log.sb"])
+def test_same_documents_as_before(capfd, monkeypatch, name, options):
+    out, before = runbaseline(capfd, monkeypatch, name, *options)
+    assert jsonlines(out) == jsonlines(before)
+
+def test_plan_columns():
+    fields = ["ts", "uid", "orig_bytes", "local_orig", "tunnel_parents"]
+    types = ["time", "string", "count", "bool", "set[string]"]
+    timeconv = zeek2es.TimeConverter()
+    plan = zeek2es.compileplan(fields, types, ["ts", "orig_bytes", "tunnel_parents"], timeconv, "|")
+    # Columns left out of -y are dropped from the plan.
+    assert [(i, name, ztype) for i, name, conv, ztype in plan] == [(0, "ts", "time"), (2, "orig_bytes", "count"), (4, "tunnel_parents", "set[string]")]
+    assert plan[1][2]("18446744073709551615") == 18446744073709551615
+    assert plan[2][2]("a|b") == ["a", "b"]
+    assert zeek2es.zeekbool("T") is True and zeek2es.zeekbool("F") is False
+
+@pytest.mark.parametrize("options", numpyoptions)
+def test_short_rows(tmp_path, capfd, options):
+    filename = tmp_path / "short.log"
+    with open(filename, "w") as f:
+        f.write("#separator \\x09\n#set_separator\t,\n#empty_field\t(empty)\n#unset_field\t-\n#path\tshort\n#open\t2021-06-01-12-00-00\n")
+        f.write("#fields\tts\ta\tb\n#types\ttime\tcount\tdouble\n1622548800.0\t1\t2.5\n1622548801.0\t3\n")
+    zeek2es.main(**zargs(str(filename), "--stdout", "--nobulk", *options))
+    docs = jsonlines(capfd.readouterr().out)
+    # Missing values at the end of a row are left out, like unset ones.
+    assert [(d.get("a"), d.get("b")) for d in docs] == [(1, 2.5), (3, None)]
@@ -0,0 +1,29 @@
+import json
+import os
+
+import pytest
+
+import zeek2es
+from conftest import datadir, runbaseline, jsonlines, zargs
+
+# A function to sort the documents printed, since the logs go to worker processes.
+def docs(text):
+    return sorted(jsonlines(text), key=lambda d: json.dumps(d, sort_keys=True))
+
+@pytest.mark.parametrize("options", [[], ["--procs", "1"], ["--keymemory", "0"]])
+def test_same_documents_as_two_runs(capfd, monkeypatch, options):
+    out, printed = runbaseline(capfd, monkeypatch, "conn.log.correlate", *options)
+    assert docs(out) == docs(printed)
+
+def test_runs_do_not_share_keys(capfd, monkeypatch):
+    out, printed = runbaseline(capfd, monkeypatch, "conn.log.correlate")
+    # No keys are kept by the primary logs here, so none of the related documents are either.
+    out, printed = runbaseline(capfd, monkeypatch, "conn.log.correlate", "-a", "lambda x: False")
+    assert jsonlines(out) == []
+
+def test_primary_log_types(capfd, monkeypatch):
+    # The primary logs can be picked with --logtypes, leaving out the others.
+    monkeypatch.chdir(datadir)
+    zeek2es.main(**zargs("conn.log", "dns.log", "http.log", "files.log", "-s", "-b", "-a", "lambda x: 'service' not in x", "--logtypes", "conn", "--correlate", "uid", "dns", "http"))
+    with open(os.path.join(datadir, "baseline", "conn.log.correlate")) as f:
+        assert docs(capfd.readouterr().out) == docs(f.read())
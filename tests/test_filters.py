@@ -0,0 +1,57 @@
+import pytest
+
+import zeek2es
+from conftest import connfields, conntypes, connrows, writetsv, writejson, rundocs
+
+# The same filters should keep the same rows of a TSV log and of the JSON log of the same data.
+filters = [
+    "local_orig == T",
+    "local_orig != T",
+    "local_orig == t",
+    "local_orig == True",
+    "local_orig == false",
+    "local_orig == F and service == dns",
+    "local_orig in {T}",
+    "local_orig in {F, dns}",
+    "not local_orig == T",
+    "local_orig == 1",
+    "local_orig != 1",
+    "service == dns or service == http",
+    "service != http",
+    "id.resp_p in {53, 443}",
+    "orig_bytes > 5000 and orig_bytes <= 20000",
+    "id.orig_h in 10.0.1.0/24",
+    "id.orig_h != 10.0.0.0/24",
+    "ts >= 1622549800",
+    "missing == 1",
+    "missing != 1",
+]
+
+@pytest.fixture
+def logs(tmp_path):
+    rows = connrows(1000)
+    (tmp_path / "tsv").mkdir()
+    (tmp_path / "json").mkdir()
+    tsv = writetsv(tmp_path / "tsv" / "conn.log", "conn", connfields, conntypes, rows)
+    json = writejson(tmp_path / "json" / "conn.log", connfields, conntypes, rows)
+    return tsv, json
+
+@pytest.mark.parametrize("expr", filters)
+def test_tsv_and_json_agree(logs, capfd, expr):
+    tsv, json = logs
+    tsvuids = sorted(d["uid"] for d in rundocs(capfd, tsv, "--filter", expr))
+    jsonuids = sorted(d["uid"] for d in rundocs(capfd, json, "-j", "--filter", expr))
+    assert tsvuids == jsonuids
+
+def test_bool_forms(logs, capfd):
+    tsv, json = logs
+    kept = [len(rundocs(capfd, tsv, "--filter", "local_orig == " + v)) for v in ("T", "t", "true", "True")]
+    assert kept == [100] * 4
+
+@pytest.mark.parametrize("expr", ["local_orig ==", "(service == dns", "service in {dns", "service ~ dns", "== dns"])
+def test_bad_filters(expr):
+    with pytest.raises(ValueError):
+        zeek2es.parsefilter(expr)
+
+def test_filterbool():
+    assert [zeek2es.filterbool(v) for v in ("T", "t", "TRUE", "F", "false", "x", 1)] == [True, True, True, False, False, None, None]
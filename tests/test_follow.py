@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import time
+import gzip
+import shutil
+import signal
+import subprocess
+
+from conftest import connfields, conntypes, connrows, writetsv
+
+# This runs zeek2es following a directory in its own process, since it stops on a signal.
+script = """
+import sys
+sys.path.insert(0, {root!r})
+import zeek2es
+zeek2es.followsettle = 0.5
+sys.argv = ["zeek2es.py", {logs!r}, "--follow", "--stdout", "--nobulk", "--procs", "1"]
+zeek2es.main(**vars(zeek2es.parseargs()))
+"""
+
+# A function to wait for the documents written so far to have as many as we want.
+def waitfor(out, n):
+    for _ in range(100):
+        with open(out) as f:
+            docs = [json.loads(line) for line in f if len(line.strip()) > 0]
+        if len(docs) >= n:
+            return docs
+        time.sleep(0.1)
+    return docs
+
+def test_follow_nested_and_compressed(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    logs = tmp_path / "logs"
+    (logs / "a" / "b").mkdir(parents=True)
+    rows = connrows(300)
+    # A log that was there before we started is left alone.
+    writetsv(logs / "a" / "conn.2021-06-01-11-00-00.log", "conn", connfields, conntypes, rows[:10])
+    current = writetsv(logs / "a" / "b" / "conn.log", "conn", connfields, conntypes, rows[:10])
+    out = tmp_path / "out.json"
+    with open(out, "w") as f:
+        p = subprocess.Popen([sys.executable, "-c", script.format(root=root, logs=str(logs))], stdout=f)
+    try:
+        time.sleep(1.5)
+        # New lines of a current log in a directory below are sent.
+        with open(current, "a") as f:
+            for row in rows[10:20]:
+                f.write("\t".join(row) + "\n")
+        assert len(waitfor(out, 10)) == 10
+
+        # A compressed log put in a new directory is sent whole once it settles.
+        (logs / "c").mkdir()
+        plain = writetsv(tmp_path / "copy.log", "conn", connfields, conntypes, rows[100:300])
+        with open(plain, "rb") as src, gzip.open(logs / "c" / "conn.2021-06-01-12-00-00.log.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        assert len(waitfor(out, 208)) == 208
+
+        # A current log that is rotated is not sent again under its new name.
+        os.rename(current, logs / "a" / "b" / "conn.2021-06-01-13-00-00.log")
+        time.sleep(2)
+    finally:
+        p.send_signal(signal.SIGINT)
+        p.wait(30)
+
+    docs = waitfor(out, 0)
+    uids = [d["uid"] for d in docs]
+    assert len(uids) == len(set(uids)) == 208
+    assert set(uids) == set(r[1] for r in rows[10:20] + rows[100:300] if r[0] != "-")
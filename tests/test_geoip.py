@@ -0,0 +1,105 @@
+import ipaddress
+import json
+
+import pytest
+
+import zeek2es
+from conftest import runbaseline, runesbaseline, bulksplit, jsonlines
+
+# The records of the fake City database, by network.
+cityrecords = {
+    "19.248.42.0/24": {"continent": {"names": {"en": "North America"}}, "country": {"iso_code": "US", "names": {"en": "United States"}},
+                       "subdivisions": [{"iso_code": "WA", "names": {"en": "Washington"}}], "city": {"names": {"en": "Seattle"}},
+                       "location": {"latitude": 47.6, "longitude": -122.3}},
+    "54.196.0.0/16": {"continent": {"names": {"en": "Europe"}}, "country": {"iso_code": "SE", "names": {"en": "Sweden"}}},
+}
+
+# What the geoip processor of the ingest pipeline adds for those records.
+citylocations = {
+    "19.248.42.217": {"continent_name": "North America", "country_iso_code": "US", "country_name": "United States", "region_iso_code": "US-WA",
+                      "region_name": "Washington", "city_name": "Seattle", "location": {"lat": 47.6, "lon": -122.3}},
+    "54.196.89.102": {"continent_name": "Europe", "country_iso_code": "SE", "country_name": "Sweden"},
+}
+
+# This stands in for a maxminddb reader of a database, counting its lookups.
+class Reader:
+    def __init__(self, records, database_type):
+        self.records = {ipaddress.ip_network(k): v for k, v in records.items()}
+        self.database_type = database_type
+        self.lookups = 0
+
+    def metadata(self):
+        return self
+
+    def get_with_prefix_len(self, ip):
+        self.lookups += 1
+        address = ipaddress.ip_address(ip)
+        for network, record in self.records.items():
+            if address in network:
+                return record, network.prefixlen
+        return None, 0
+
+# This stands in for the maxminddb module, with a City and an ASN database.
+class MaxMindDB:
+    MODE_MMAP = 1
+
+    def __init__(self):
+        self.readers = {"city.mmdb": Reader(cityrecords, "GeoLite2-City"),
+                        "asn.mmdb": Reader({"19.248.0.0/16": {"autonomous_system_number": 64500, "autonomous_system_organization": "Example"}}, "GeoLite2-ASN")}
+
+    def open_database(self, filename, mode):
+        return self.readers[filename]
+
+@pytest.fixture
+def maxminddb(monkeypatch):
+    fake = MaxMindDB()
+    monkeypatch.setattr(zeek2es, "maxminddb", fake)
+    zeek2es.geoipreaders.clear()
+    yield fake
+    zeek2es.geoipreaders.clear()
+
+# A function to take out what --geoip added to a document, returning the locations found.
+def unenrich(d):
+    found = {}
+    for field, target in (("id.orig_h", "geoip_orig"), ("id.resp_h", "geoip_resp")):
+        if target in d:
+            found[d[field]] = d.pop(target)
+    if "service" in d:
+        assert isinstance(d["service"], list)
+        d["service"] = ",".join(d["service"])
+    return found
+
+def test_same_documents_with_locations(capfd, monkeypatch, maxminddb):
+    out, printed = runbaseline(capfd, monkeypatch, "conn.log.sb", "--geoip", "city.mmdb")
+    docs, found = jsonlines(out), {}
+    for d in docs:
+        found.update(unenrich(d))
+    assert docs == jsonlines(printed)
+    assert found == citylocations
+    # Flows repeat the same IPs, which are only looked up once.
+    assert maxminddb.readers["city.mmdb"].lookups == len(set(ip for d in docs for ip in (d["id.orig_h"], d["id.resp_h"])))
+
+def test_asn_database(capfd, monkeypatch, maxminddb):
+    out, printed = runbaseline(capfd, monkeypatch, "conn.log.sb", "--geoip", "asn.mmdb")
+    found = {}
+    for d in jsonlines(out):
+        found.update(unenrich(d))
+    assert found == {"19.248.42.217": {"asn": 64500, "organization_name": "Example", "network": "19.248.0.0/16"}}
+
+def test_no_ingest_pipeline(monkeypatch, maxminddb):
+    requests, before, stats = runesbaseline(monkeypatch, "conn.log.es", "--geoip", "city.mmdb")
+    setup, pairs = bulksplit(requests)
+    # Unlike -g, nothing is left for an ingest pipeline to do.
+    assert not any(path.startswith("/_ingest/") for method, path, body in setup)
+    docs = [body[1::2] for method, path, body in requests if path == "/_bulk"]
+    actions = [body[0::2] for method, path, body in requests if path == "/_bulk"]
+    assert all("pipeline" not in a["create"] for batch in actions for a in batch)
+    for batch in docs:
+        for d in batch:
+            unenrich(d)
+    assert sorted(json.dumps(d, sort_keys=True) for batch in docs for d in batch) == sorted(json.dumps(d, sort_keys=True) for r in before if r[1] == "/_bulk" for d in r[2][1::2])
+
+def test_invalid_ips(maxminddb):
+    geoip = zeek2es.GeoIP("city.mmdb", 16)
+    assert geoip("19.248.42.217") == citylocations["19.248.42.217"]
+    assert geoip("10.0.0.1") is None and geoip("not an ip") is None
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from conftest import runesbaseline
+
+# A function to get the documents of the Humio requests, sorted, since requests can be sent at the same time.
+def messages(requests):
+    docs = []
+    for method, path, body in requests:
+        assert method == "POST" and path == "/api/v1/ingest/humio-unstructured"
+        docs += [json.loads(m) for m in body[0][0]["messages"]]
+    return sorted(docs, key=lambda d: json.dumps(d, sort_keys=True))
+
+@pytest.mark.parametrize("options", [[], ["--senders", "1"], ["--nokeepalive"]])
+@pytest.mark.parametrize("name", ["conn.log.humio", "conn.log.humion", "dns.log.humio"])
+def test_same_messages_as_before(monkeypatch, name, options):
+    requests, before, stats = runesbaseline(monkeypatch, name, *options)
+    assert messages(requests) == messages(before)
+    # Every request is compressed.
+    assert set(encoding for method, path, encoding, body in stats.requests) == {"gzip"}
+
+@pytest.mark.parametrize("name", ["conn.log.humio", "dns.log.humio"])
+def test_structured_events(monkeypatch, name):
+    requests, before, stats = runesbaseline(monkeypatch, name, "--humiostructured")
+    events = []
+    for method, path, body in requests:
+        assert path == "/api/v1/ingest/humio-structured"
+        events += body[0][0]["events"]
+    # The documents are sent as they are, with their ts as the event time.
+    assert all(e["timestamp"] == e["attributes"]["ts"] for e in events)
+    assert sorted((e["attributes"] for e in events), key=lambda d: json.dumps(d, sort_keys=True)) == messages(before)
+
+def test_batches_by_size(monkeypatch):
+    # All of a log fits in one request, however many lines the documents were built in.
+    requests, before, stats = runesbaseline(monkeypatch, "dns.log.humio", "--senders", "1", "-l", "500")
+    assert len(requests) == 1 and len(before) == 3
+    assert messages(requests) == messages(before)
@@ -0,0 +1,63 @@
+import os
+import shutil
+
+import pytest
+
+import zeek2es
+from conftest import datadir, sendmock, requestlines, bulksplit, zargs
+
+# A function to copy a log of the data directory to two files of a directory, so they go to the same index.
+def twologs(tmp_path, name, jsonlogs=False):
+    src = os.path.join(datadir, "json" if jsonlogs else "", name)
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    for i in range(2):
+        shutil.copy(src, logs / "dns.{}.log".format(i))
+    return [str(logs / "dns.{}.log".format(i)) for i in range(2)], str(logs)
+
+@pytest.mark.parametrize("options", [[], ["-j"], ["-d", "10"]])
+def test_mappings_sent_once(tmp_path, monkeypatch, options):
+    files, logs = twologs(tmp_path, "dns.log", "-j" in options)
+    monkeypatch.chdir(tmp_path)
+    setup, pairs = bulksplit(requestlines(sendmock(logs, "--procs", "2", "-l", "10", *options)))
+    index = "/logs-zeek-dns" if "-d" in options else "/zeek_dns_2021-06-01"
+    assert [path for method, path, body in setup].count(index) == 1
+    # The documents are the same as when each file is sent on its own.
+    before = []
+    for filename in files:
+        before += bulksplit(requestlines(sendmock(filename, "-l", "10", *options)))[1]
+    assert pairs == sorted(before)
+
+def test_mappings_of_every_header_are_sent(tmp_path, monkeypatch):
+    files, logs = twologs(tmp_path, "dns.log")
+    # The second file has a field the first does not, and its index gets that field up front.
+    with open(files[1]) as f:
+        lines = f.read().splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith("#fields"):
+            lines[i] = line + "\textra"
+        elif line.startswith("#types"):
+            lines[i] = line + "\tstring"
+        elif not line.startswith("#"):
+            lines[i] = line + "\tx"
+    with open(files[1], "w") as f:
+        f.write("\n".join(lines) + "\n")
+    monkeypatch.chdir(tmp_path)
+    setup, pairs = bulksplit(requestlines(sendmock(logs, "--procs", "2", "-l", "10")))
+    mappings = [body for method, path, body in setup if path == "/zeek_dns_2021-06-01"]
+    assert len(mappings) == 1 and "extra" in mappings[0][0]["mappings"]["properties"]
+    assert len(pairs) == 40
+
+def test_split_log_mappings_sent_once(conn, monkeypatch):
+    monkeypatch.setattr(zeek2es, "splitchunk", 4096)
+    requests = requestlines(sendmock(conn, "--fileprocs", "4", "-l", "100"))
+    setup, pairs = bulksplit(requests)
+    assert [path for method, path, body in setup] == ["/zeek_conn_2021-06-01"]
+    # The documents are the same as when the log is not split.
+    assert pairs == bulksplit(requestlines(sendmock(conn, "-l", "100")))[1]
+
+def test_split_json_log(monkeypatch):
+    monkeypatch.chdir(datadir)
+    with pytest.raises(SystemExit) as exc:
+        zeek2es.main(**zargs("json/conn.log", "-j", "--stdout", "--fileprocs", "2", "--supresswarnings"))
+    assert exc.value.code == -20
@@ -0,0 +1,50 @@
+import json
+import time
+
+import pytest
+
+import zeek2es
+from conftest import runbaseline, runesbaseline, bulksplit, jsonlines, rundocs
+
+names = ["conn.json.s", "conn.json.sb", "conn.json.st", "conn.json.str", "conn.json.sy", "conn.json.sa", "dns.json.sb", "dns.json.st"]
+
+# A function to run a JSON log baseline in UTC, which the -t baselines were made in.
+def runutc(capfd, monkeypatch, name, *options):
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    try:
+        return runbaseline(capfd, monkeypatch, name, *options)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+@pytest.mark.parametrize("name", names)
+def test_same_output_as_before(capfd, monkeypatch, name):
+    out, printed = runutc(capfd, monkeypatch, name)
+    assert out == printed
+
+# With orjson, lines that only need their ts converted have it spliced into their bytes.
+@pytest.mark.parametrize("name", names)
+def test_orjson_same_documents(capfd, monkeypatch, name):
+    pytest.importorskip("orjson")
+    out, printed = runutc(capfd, monkeypatch, name, "--serializer", "orjson")
+    assert jsonlines(out) == jsonlines(printed)
+
+@pytest.mark.parametrize("options", [[], ["--serializer", "json"]])
+def test_same_requests_as_before(monkeypatch, options):
+    requests, before, stats = runesbaseline(monkeypatch, "conn.json.es", *options)
+    assert bulksplit(requests) == bulksplit(before)
+
+@pytest.mark.parametrize("serializer", ["json", "orjson"])
+def test_big_integers(tmp_path, capfd, serializer):
+    if serializer == "orjson":
+        pytest.importorskip("orjson")
+    filename = tmp_path / "big.log"
+    values = [2**64 - 1, 2**64, -2**63, -2**63 - 1, 10**30]
+    with open(filename, "w") as f:
+        for v in values:
+            # A line that does not start with its ts is parsed whole.
+            f.write(json.dumps({"n": v, "ts": 1622548800.5}) + "\n")
+    docs = rundocs(capfd, str(filename), "-j", "--serializer", serializer)
+    assert [d["n"] for d in docs] == values
+    assert zeek2es.orjsonloads(b'{"n": 18446744073709551616}') == {"n": 2**64}
@@ -0,0 +1,64 @@
+import pytest
+
+import zeek2es
+from conftest import connrows, rundocs, zargs
+
+# A function to make a builder that spills a run to disk every few keys.
+def spilling(limit):
+    builder = zeek2es.KeyIndexBuilder()
+    builder.limit = limit
+    return builder
+
+@pytest.mark.parametrize("tofile", [False, True])
+def test_spilled_runs_are_merged(tmp_path, tofile):
+    keys = ["C{:08d}".format(i) for i in range(5000)]
+    builder = spilling(300)
+    # Every key is added twice, in different runs.
+    for key in keys + keys[::-1]:
+        builder.add(key)
+    assert len(builder.runs) > 10
+    index = builder.build(str(tmp_path / "keys.keyidx") if tofile else "")
+    assert len(index) == 5000
+    assert all(key in index for key in keys)
+    assert not any("D{:08d}".format(i) in index for i in range(5000))
+    assert 5 not in index and None not in index
+    assert builder.runs == [] and len(builder.keys) == 0
+
+def test_take_and_addpairs(tmp_path):
+    # Worker processes hand their keys back as pairs, which the parent adds up.
+    parent = spilling(1000)
+    for part in range(3):
+        worker = spilling(100)
+        for i in range(part * 500, part * 500 + 700):
+            worker.add(str(i))
+        parent.addpairs(worker.take())
+        assert len(worker.keys) == 0 and worker.runs == []
+    index = parent.build()
+    assert len(index) == 1700
+    assert "0" in index and "1699" in index and "1700" not in index
+
+def test_key_index_files(tmp_path):
+    keyfile = tmp_path / "uids.txt"
+    keyfile.write_text("a\nb\r\nc\n")
+    built = zeek2es.buildkeyindex(str(keyfile), str(tmp_path / "uids.txt.keyidx"))
+    assert zeek2es.iskeyindex(str(tmp_path / "uids.txt.keyidx"))
+    assert not zeek2es.iskeyindex(str(keyfile))
+    mapped = zeek2es.openkeyindex(str(tmp_path / "uids.txt.keyidx"))
+    assert len(built) == len(mapped) == 3
+    assert "b" in mapped and "d" not in mapped
+
+@pytest.mark.parametrize("contents", [b"", b"Z2EKEYS1", b"Z2EKEYS1" + b"\0" * 40, b"not a key index at all!!"])
+def test_bad_key_index_files(tmp_path, contents):
+    (tmp_path / "bad.keyidx").write_bytes(contents)
+    with pytest.raises(ValueError):
+        zeek2es.openkeyindex(str(tmp_path / "bad.keyidx"))
+
+def test_filter_keys_from_an_index(conn, tmp_path, capfd):
+    uids = [r[1] for r in connrows(3000)[::7]]
+    keyfile = tmp_path / "uids.txt"
+    keyfile.write_text("\n".join(uids) + "\n")
+    zeek2es.main(**zargs(str(keyfile), "--keyindex", "--keymemory", "1"))
+    fromkeys = rundocs(capfd, conn, "-e", "uid", str(keyfile))
+    fromindex = rundocs(capfd, conn, "-e", "uid", str(keyfile) + ".keyidx")
+    assert fromkeys == fromindex
+    assert sorted(d["uid"] for d in fromindex) == sorted(r[1] for r in connrows(3000)[::7] if r[0] != "-")
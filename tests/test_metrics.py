@@ -0,0 +1,59 @@
+import multiprocessing
+import os
+import shutil
+
+import zeek2es
+from conftest import datadir, zargs
+
+# A function run by a worker process that takes the locks a parent thread could have held.
+def count(n):
+    zeek2es.metrics.add(rows=n)
+    with zeek2es.batchsize.lock, zeek2es.deadletterlock:
+        pass
+    return zeek2es.metrics.take()
+
+def test_worker_does_not_inherit_held_locks():
+    # The locks are held while the pool forks, like they can be by the metrics writer or a sender thread.
+    with zeek2es.metrics.lock, zeek2es.batchsize.lock, zeek2es.deadletterlock:
+        pool = multiprocessing.get_context("fork").Pool(1, initializer=zeek2es.initworker, initargs=(multiprocessing.Lock(),))
+    try:
+        result = pool.apply_async(count, (5,)).get(timeout=10)
+    finally:
+        pool.terminate()
+    assert result["counters"]["rows"] == 5
+
+def test_merge_adds_up():
+    zeek2es.metrics.reset()
+    zeek2es.metrics.add(rows=3, docs=2)
+    taken = zeek2es.metrics.take()
+    zeek2es.metrics.add(rows=1)
+    zeek2es.metrics.merge(taken)
+    assert zeek2es.metrics.counters["rows"] == 4
+    assert zeek2es.metrics.counters["docs"] == 2
+
+def test_each_run_counts_its_own(conn, capfd):
+    for i in range(2):
+        zeek2es.main(**zargs(conn, "--stdout"))
+        capfd.readouterr()
+        assert zeek2es.metrics.counters["docs"] == 2970
+
+# A function run in place of sendbulk by a worker process, telling if the stdout lock it has is held by the parent.
+def sendlocked(args, body, es_index, filename, stats=None):
+    print("shared" if not zeek2es.stdoutlock.acquire(block=False) else "own", flush=True)
+
+def test_workers_share_the_stdout_lock(tmp_path, capfd, monkeypatch):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    for i in range(2):
+        shutil.copy(os.path.join(datadir, "dns.log"), logs / "dns.{}.log".format(i))
+    # The lock made by the run is held here while the workers write.
+    created = []
+    def lock():
+        created.append(multiprocessing.get_context().Lock())
+        created[-1].acquire()
+        return created[-1]
+    monkeypatch.setattr(multiprocessing, "Lock", lock)
+    monkeypatch.setattr(zeek2es, "sendbulk", sendlocked)
+    zeek2es.main(**zargs(str(logs), "--stdout", "--procs", "2", "-l", "5"))
+    out = capfd.readouterr().out.split()
+    assert len(created) == 1 and out == ["shared"] * 8
@@ -0,0 +1,57 @@
+import pytest
+
+import zeek2es
+from conftest import baselines, runbaseline, jsonlines, rundocs
+
+@pytest.mark.parametrize("name", ["conn.log.s", "conn.log.sb", "conn.log.gz.sb", "dns.log.sb", "http.log.sb", "files.log.sb"])
+def test_same_documents_as_before(capfd, monkeypatch, name):
+    out, before = runbaseline(capfd, monkeypatch, name)
+    assert jsonlines(out) == jsonlines(before)
+
+# A function to write a log with more than one header block, from lines of tab separated text.
+def writeblocks(filename, *blocks):
+    with open(filename, "w") as f:
+        for fields, types, rows in blocks:
+            f.write("#separator \\x09\n#set_separator\t,\n#empty_field\t(empty)\n#unset_field\t-\n#path\ttest\n#open\t2021-06-01-12-00-00\n")
+            f.write("#fields\t" + "\t".join(fields) + "\n#types\t" + "\t".join(types) + "\n")
+            for row in rows:
+                f.write("\t".join(row) + "\n")
+            f.write("#close\t2021-06-01-13-00-00\n")
+    return str(filename)
+
+@pytest.mark.parametrize("fileprocs", ["0", "2"])
+def test_blocks_with_new_fields(tmp_path, capfd, fileprocs):
+    filename = writeblocks(tmp_path / "test.log", (["ts", "uid", "a"], ["time", "string", "count"], [["1622548800.0", "C1", "5"], ["1622548801.0", "C2", "6"]]))
+    # A new block can start with just the fields, right after the rows of the last one.
+    with open(filename) as f:
+        text = f.read().replace("#close\t2021-06-01-13-00-00\n", "")
+    with open(filename, "w") as f:
+        f.write(text + "#fields\tts\tuid\tb\n#types\ttime\tstring\tcount\n1622548802.0\tC3\t7\n")
+        f.write("#fields\tts\tuid\tc\n1622548803.0\tC4\t8\n")
+    docs = rundocs(capfd, filename, "--fileprocs", fileprocs)
+    # Split logs are not printed in file order.
+    assert sorted((d["uid"], d.get("a"), d.get("b"), d.get("c")) for d in docs) == [("C1", 5, None, None), ("C2", 6, None, None), ("C3", None, 7, None), ("C4", None, None, 8)]
+
+def test_block_with_a_new_separator(tmp_path, capfd):
+    filename = tmp_path / "test.log"
+    header = "#set_separator,;\n#empty_field,(empty)\n#unset_field,-\n#path,test\n#open,2021-06-01-12-00-00\n#fields,ts,uid,a\n#types,time,string,set[string]\n"
+    with open(filename, "w") as f:
+        f.write("#separator \\x09\n#set_separator\t;\n#empty_field\t(empty)\n#unset_field\t-\n#path\ttest\n#open\t2021-06-01-12-00-00\n")
+        f.write("#fields\tts\tuid\ta\n#types\ttime\tstring\tset[string]\n")
+        f.write("1622548800.0\tC1\tx;y\n")
+        # Only the separators change, but the rows after them are split the new way.
+        f.write("#separator \\x2c\n" + header.replace(";", "|"))
+        f.write("1622548801.0,C2,x|y\n")
+    docs = rundocs(capfd, str(filename))
+    assert [(d["uid"], d["a"]) for d in docs] == [("C1", ["x", "y"]), ("C2", ["x", "y"])]
+
+def test_reader_blocks(tmp_path):
+    filename = writeblocks(tmp_path / "test.log",
+                           (["ts", "a"], ["time", "count"], [["1.0", "1"]]),
+                           (["ts", "a"], ["time", "count"], [["2.0", "2"]]),
+                           (["ts", "b"], ["time", "count"], [["3.0", "3"], ["4.0", "4"]]))
+    with zeek2es.ZeekLogReader(filename) as reader:
+        blocks = [(list(reader.fields), list(rows)) for rows in reader.blocks()]
+    # A header block with the same fields and types carries on with the rows of the last one.
+    assert blocks == [(["ts", "a"], [["1.0", "1"], ["2.0", "2"]]), (["ts", "b"], [["3.0", "3"], ["4.0", "4"]])]
+    assert reader.path == "test"
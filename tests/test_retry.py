@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+import zeek2es
+from conftest import runesbaseline, bulksplit, zargs
+
+@pytest.fixture(autouse=True)
+def nobackoff(monkeypatch):
+    monkeypatch.setattr(zeek2es, "retrybackoff", lambda attempt: 0)
+
+# A function to get the documents of bulk requests, without repeats.
+def documents(requests):
+    return sorted(set(json.dumps(doc, sort_keys=True) for r in requests if r[1] == "/_bulk" for doc in r[2][1::2]))
+
+@pytest.mark.parametrize("reject, rejectbulk", [(0.3, 0.0), (0.0, 0.3), (0.3, 0.3)])
+def test_busy_es_gets_every_document(monkeypatch, tmp_path, reject, rejectbulk):
+    deadletter = str(tmp_path / "dead.json")
+    requests, before, stats = runesbaseline(monkeypatch, "conn.log.es", "--retries", "50", "--deadletter", deadletter, reject=reject, rejectbulk=rejectbulk)
+    assert stats.docs == 30 and stats.rejected > 0
+    assert documents(requests) == documents(before)
+    # Only the documents that were rejected are sent again.
+    assert sum(len(r[2]) // 2 for r in requests if r[1] == "/_bulk") == 30 + stats.rejected
+    assert not (tmp_path / "dead.json").exists()
+
+def test_retries_run_out(monkeypatch, tmp_path, capfd):
+    deadletter = str(tmp_path / "dead.json")
+    requests, before, stats = runesbaseline(monkeypatch, "conn.log.es", "--retries", "2", "--deadletter", deadletter, reject=1.0)
+    assert stats.docs == 0
+    assert len([r for r in requests if r[1] == "/_bulk"]) == 3 * 3
+    with open(deadletter) as f:
+        dead = [json.loads(line) for line in f]
+    assert all(d["status"] == 429 and d["error"] == "retries exhausted" and d["_index"] == "zeek_conn_2021-06-01" for d in dead)
+    assert sorted(json.dumps(d["document"], sort_keys=True) for d in dead) == documents(before)
+    assert "Gave up sending" in capfd.readouterr().out
+
+# This stands in for the response of an ES bulk request.
+class Response:
+    def __init__(self, status_code, result):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.result = result
+        self.text = json.dumps(result)
+
+    def json(self):
+        return self.result
+
+def test_items_are_sorted_out(monkeypatch, tmp_path):
+    body = b"".join(b'{"create": {}}\n' + json.dumps({"n": n}).encode("UTF-8") + b"\n" for n in range(4))
+    sent = []
+    def bulk(self, body):
+        sent.append(bytes(body))
+        if len(sent) > 1:
+            return Response(200, {"errors": False, "items": []})
+        statuses = [201, 409, 400, 429]
+        items = [{"create": {"status": s, "error": {"type": "mapper_parsing_exception"} if s == 400 else None}} for s in statuses]
+        return Response(200, {"errors": True, "items": items})
+    monkeypatch.setattr(zeek2es.ESClient, "bulk", bulk)
+    args = zargs("conn.log", "--deadletter", str(tmp_path / "dead.json"))
+    stats = zeek2es.BulkStats()
+    zeek2es.sendesbulk(args, body, "zeek_conn", "conn.log", stats)
+    # The document already indexed counts as sent, the one ES is busy with is sent again, and the bad one is dead.
+    assert sent[1] == b'{"create": {}}\n{"n": 3}\n'
+    assert (stats.sent, stats.retried, stats.dropped) == (3, 1, 1)
+    with open(tmp_path / "dead.json") as f:
+        dead = [json.loads(line) for line in f]
+    assert dead == [{"_index": "zeek_conn", "filename": "conn.log", "status": 400, "error": {"type": "mapper_parsing_exception"}, "document": {"n": 2}}]
+
+def test_a_bad_request_is_not_retried(monkeypatch, tmp_path, capfd):
+    sent = []
+    def bulk(self, body):
+        sent.append(body)
+        return Response(400, {"error": {"type": "illegal_argument_exception"}})
+    monkeypatch.setattr(zeek2es.ESClient, "bulk", bulk)
+    stats = zeek2es.BulkStats()
+    zeek2es.sendesbulk(zargs("conn.log"), b'{"create": {}}\n{"n": 1}\n', "zeek_conn", "conn.log", stats)
+    assert len(sent) == 1 and (stats.sent, stats.dropped) == (0, 1)
+    assert "did not return OK" in capfd.readouterr().out
@@ -0,0 +1,58 @@
+import collections
+
+import pytest
+
+import zeek2es
+from conftest import connrows, rundocs
+
+def test_distinct_counts_are_exact_when_small():
+    counter = zeek2es.DistinctCounter()
+    for i in range(zeek2es.distinctsparse):
+        counter.add(i)
+        counter.add(str(i))
+    assert counter.count() == zeek2es.distinctsparse
+    assert counter.registers is None
+
+@pytest.mark.parametrize("n", [100, 5000, 200000])
+def test_distinct_counts_are_close_when_large(n):
+    counter = zeek2es.DistinctCounter()
+    for _ in range(2):
+        for i in range(n):
+            counter.add("10.0.{}.{}".format(i // 256, i % 256))
+    assert abs(counter.count() - n) <= 0.05 * n
+
+# A function to sum up the rows of the test conn log by ten minute bucket and service.
+def expected(rows):
+    groups = collections.defaultdict(list)
+    for r in rows:
+        if r[0] != "-":
+            groups[((int(r[0].split(".")[0]) // 600) * 600, r[7])].append(r)
+    return groups
+
+def test_rollup_sums(conn, capfd):
+    docs = rundocs(capfd, conn, "--rollup", "service", "--rollupfields", "orig_bytes", "--rollupdistinct", "id.resp_h", "--rollupinterval", "600")
+    groups = expected(connrows(3000))
+    assert len(docs) == len(groups)
+    for d in docs:
+        rows = groups[(int(zeek2es.datetime.datetime.fromisoformat(d["ts"]).replace(tzinfo=zeek2es.datetime.timezone.utc).timestamp()), d.get("service", "-"))]
+        assert d["rollup_interval"] == 600
+        assert d["count"] == len(rows)
+        assert d["orig_bytes_sum"] == sum(int(r[8]) for r in rows)
+        assert d["orig_bytes_min"] == min(int(r[8]) for r in rows)
+        assert d["orig_bytes_max"] == max(int(r[8]) for r in rows)
+        assert d["id.resp_h_distinct"] == len(set(r[4] for r in rows))
+        assert d["@timestamp"] == d["ts"]
+
+def test_capped_groups_still_add_up(conn, capfd):
+    docs = rundocs(capfd, conn, "--rollup", "id.resp_h", "--rollupfields", "orig_bytes", "--rollupinterval", "3600", "--rollupgroups", "3")
+    full = rundocs(capfd, conn, "--rollup", "id.resp_h", "--rollupfields", "orig_bytes", "--rollupinterval", "3600")
+    assert len(full) == 7
+    assert len(docs) > 100
+    assert sum(d["count"] for d in docs) == sum(d["count"] for d in full) == 2970
+    assert sum(d["orig_bytes_sum"] for d in docs) == sum(d["orig_bytes_sum"] for d in full)
+
+def test_rollup_with_raw_documents(conn, capfd):
+    docs = rundocs(capfd, conn, "--rollup", "service", "--rollupraw")
+    summaries = [d for d in docs if "rollup_interval" in d]
+    assert len(docs) - len(summaries) == 2970
+    assert sum(d["count"] for d in summaries) == 2970
@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+import zeek2es
+from conftest import runesbaseline, bulksplit, zargs
+
+@pytest.mark.parametrize("options", [["--senders", "0"], ["--senders", "4"], ["--senders", "2", "--queuesize", "1"]])
+@pytest.mark.parametrize("name", ["conn.log.es", "conn.log.esd"])
+def test_same_requests_as_before(monkeypatch, name, options):
+    requests, before, stats = runesbaseline(monkeypatch, name, *options, latency=0.02)
+    assert bulksplit(requests) == bulksplit(before)
+
+def test_bulk_requests_are_sent_at_the_same_time(monkeypatch):
+    barrier = threading.Barrier(3, timeout=10)
+    sent = []
+    def sendbulk(args, body, es_index, filename, stats):
+        # This only gets past the barrier once three sender threads are sending at once.
+        barrier.wait()
+        sent.append(body)
+    monkeypatch.setattr(zeek2es, "sendbulk", sendbulk)
+    done = []
+    with zeek2es.BulkSender(zargs("conn.log"), threads=3, queuesize=3) as sender:
+        for i in range(6):
+            sender.send(b"body %d\n" % i, "zeek_conn", "conn.log", done=lambda i=i: done.append(i))
+    assert sorted(sent) == [b"body %d\n" % i for i in range(6)]
+    assert sorted(done) == list(range(6))
+
+def test_parsing_waits_for_a_full_queue(monkeypatch):
+    go = threading.Event()
+    def sendbulk(args, body, es_index, filename, stats):
+        go.wait(10)
+    monkeypatch.setattr(zeek2es, "sendbulk", sendbulk)
+    sender = zeek2es.BulkSender(zargs("conn.log"), threads=1, queuesize=1)
+    try:
+        # One body is being sent, and one waits in the queue.  The next one waits for room.
+        sender.send(b"1\n", "zeek_conn", "conn.log")
+        sender.send(b"2\n", "zeek_conn", "conn.log")
+        third = threading.Thread(target=sender.send, args=(b"3\n", "zeek_conn", "conn.log"))
+        third.start()
+        third.join(0.3)
+        assert third.is_alive()
+        go.set()
+        third.join(10)
+        assert not third.is_alive()
+    finally:
+        go.set()
+        sender.close()
+
+def test_a_failed_send_does_not_stop_the_others(monkeypatch, capfd):
+    sent = []
+    def sendbulk(args, body, es_index, filename, stats):
+        if body == b"2\n":
+            raise ConnectionError("refused")
+        sent.append(body)
+    monkeypatch.setattr(zeek2es, "sendbulk", sendbulk)
+    with zeek2es.BulkSender(zargs("conn.log"), threads=2) as sender:
+        for i in range(1, 5):
+            sender.send(b"%d\n" % i, "zeek_conn", "conn.log")
+    assert sorted(sent) == [b"1\n", b"3\n", b"4\n"]
+    assert "Bulk send failed" in capfd.readouterr().out
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+import zeek2es
+from conftest import runbaseline, jsonlines, zargs
+
+@pytest.mark.parametrize("name", ["conn.log.s", "conn.log.sb", "conn.log.sa", "types.log.sb", "dns.log.sb"])
+def test_same_output_as_before(capfd, monkeypatch, name):
+    # The output of --stdout is the same, byte for byte, whether orjson is installed or not.
+    out, printed = runbaseline(capfd, monkeypatch, name)
+    assert out == printed
+
+def test_orjson_output(capfd, monkeypatch):
+    pytest.importorskip("orjson")
+    out, printed = runbaseline(capfd, monkeypatch, "conn.log.s", "--serializer", "orjson")
+    assert out != printed
+    assert jsonlines(out) == jsonlines(printed)
+
+def test_bulk_buffer():
+    docs = [{"ts": "2021-06-01T12:00:00", "uid": "C1", "n": 1}, {"uid": "C2", "s": "café", "v": [1.5, None]}]
+    bulk = zeek2es.BulkBuffer("zeek_conn_2021-06-01", pipeline="zeekgeoip")
+    for d in docs:
+        bulk.add(d)
+    bulk.add(docs[0], docid="abc")
+    assert len(bulk) > 0 and bulk.n == 3
+    # This is how bulk bodies were put together before.
+    action = {"create": {"_index": "zeek_conn_2021-06-01", "pipeline": "zeekgeoip"}}
+    expected = "".join(json.dumps(action) + "\n" + json.dumps(d) + "\n" for d in docs)
+    expected += json.dumps({"create": dict(action["create"], _id="abc")}) + "\n" + json.dumps(docs[0]) + "\n"
+    assert bytes(bulk.take()) == expected.encode("UTF-8")
+    assert len(bulk) == 0 and bulk.n == 0
+
+    nobulk = zeek2es.BulkBuffer("zeek_conn_2021-06-01", nobulk=True)
+    nobulk.add(docs[1], docid="abc")
+    assert bytes(nobulk.take()) == (json.dumps(docs[1]) + "\n").encode("UTF-8")
+
+@pytest.mark.parametrize("name", ["json", "orjson"])
+def test_serializers_agree(name):
+    if name == "orjson":
+        pytest.importorskip("orjson")
+    dumps = zeek2es.jsonserializer(name)
+    # Integers beyond 64 bits are more than orjson handles, so these fall back to the json module.
+    for d in [{"a": 1, "b": "café", "c": [True, None, 0.1]}, {"big": 2 ** 64}, {"big": -2 ** 63 - 1}]:
+        assert json.loads(dumps(d)) == d
@@ -0,0 +1,23 @@
+import pytest
+
+from conftest import runesbaseline, bulksplit
+
+@pytest.mark.parametrize("options", [[], ["--gzip"], ["--nokeepalive"], ["--poolsize", "1"]])
+@pytest.mark.parametrize("name", ["conn.log.es", "conn.log.esg", "conn.log.esd"])
+def test_same_requests_as_before(monkeypatch, name, options):
+    requests, before, stats = runesbaseline(monkeypatch, name, *options)
+    assert bulksplit(requests) == bulksplit(before)
+
+@pytest.mark.parametrize("gzip", [False, True])
+def test_gzip_bulk_requests(monkeypatch, gzip):
+    requests, before, stats = runesbaseline(monkeypatch, "conn.log.es", *(["--gzip"] if gzip else []))
+    encodings = set(encoding for method, path, encoding, body in stats.requests if path == "/_bulk")
+    assert encodings == ({"gzip"} if gzip else {None})
+    # Setup requests are small, and never compressed.
+    assert all(encoding is None for method, path, encoding, body in stats.requests if path != "/_bulk")
+
+def test_connections_are_kept_open(monkeypatch):
+    requests, before, stats = runesbaseline(monkeypatch, "conn.log.es", "--poolsize", "1")
+    assert len(requests) == 4 and stats.connections == 1
+    requests, before, stats = runesbaseline(monkeypatch, "conn.log.es", "--nokeepalive")
+    assert stats.connections == len(requests) == 4
@@ -0,0 +1,60 @@
+import time
+import random
+import datetime
+
+import pytest
+
+import zeek2es
+from conftest import runbaseline, jsonlines
+
+# A function to convert a time the way zeek2es did before it had a time converter.
+def before(value, timestamp=False, origtime=False):
+    dt = datetime.datetime.fromtimestamp(float(value), datetime.timezone.utc).replace(tzinfo=None)
+    if not timestamp:
+        return "{}T{}".format(dt.date(), dt.time())
+    return dt.timestamp() if origtime else dt.timestamp() * 1000
+
+# A function to make time values like Zeek writes, and some it does not.
+def timevalues():
+    rand = random.Random(1)
+    values = ["0", "0.0", "1622548800", "1622548800.000000", "1622548800.999999", "1622591999.9999996",
+              "1622548800.5", "86399.9999995", "1.5e9", "1622548800.1234567", "-1.25", "2147483648.000001"]
+    for _ in range(3000):
+        sec = rand.randrange(0, 2 ** 31)
+        values.append("{}.{}".format(sec, "".join(rand.choices("0123456789", k=rand.randint(0, 6)))).rstrip("."))
+    return values
+
+@pytest.fixture(params=["UTC", "America/New_York"])
+def timezone(request, monkeypatch):
+    monkeypatch.setenv("TZ", request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
+
+@pytest.mark.parametrize("timestamp, origtime", [(False, False), (True, False), (True, True)])
+def test_same_times_as_before(timezone, timestamp, origtime):
+    conv = zeek2es.TimeConverter(timestamp, origtime)
+    values = timevalues()
+    expected = [before(v, timestamp, origtime) for v in values]
+    assert [conv(v) for v in values] == expected
+    # Going through a float, or a whole NumPy array, gives the same values.
+    assert [conv(float(v)) for v in values] == expected
+    if zeek2es.numpy is not None:
+        assert conv.convertbatch(values) == expected
+
+def test_dates():
+    conv = zeek2es.TimeConverter()
+    assert conv.date("1622591999.999999") == datetime.date(2021, 6, 1)
+    assert conv.date("1622592000") == datetime.date(2021, 6, 2)
+
+@pytest.mark.parametrize("name", ["types.log.st", "types.log.str", "conn.log.st", "conn.log.str", "dns.log.st", "files.log.str"])
+def test_same_documents_as_before(capfd, monkeypatch, name):
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    try:
+        out, printed = runbaseline(capfd, monkeypatch, name)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert jsonlines(out) == jsonlines(printed)
@@ -1,23 +1,134 @@
 import sys
-import subprocess
 import json
-import csv
 import io
+import gzip
+import bz2
 import requests
 from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
 from urllib3.exceptions import InsecureRequestWarning
 import datetime
 import re
 import argparse
 import random
 import time
+import itertools
+import queue
+import threading
+import multiprocessing
+import mmap
+import functools
+import select
+import signal
+import collections
+import glob
+import hashlib
+import math
+import bisect
+import heapq
+import array
+import struct
+import tempfile
+import cProfile
+import contextlib
+from operator import methodcaller
+import operator
 # Making these available for lambda filter input.
 import ipaddress
 import os
 
+# orjson is optional, and used to serialize JSON faster when it is installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# zstandard is optional, and only used to compress the bulk files of --outdir with zstd.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# lz4 is optional, and only used to read logs compressed with lz4.
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# rapidgzip is optional, and used to decompress gzip logs with more than one thread when it is installed.
+try:
+    import rapidgzip
+except ImportError:
+    rapidgzip = None
+
+# isal is optional, and used to decompress gzip logs faster than zlib when rapidgzip is not installed.
+try:
+    from isal import igzip
+except ImportError:
+    igzip = None
+
+# maxminddb is optional, and only used to look up the locations of IPs in the client with --geoip.
+try:
+    import maxminddb
+except ImportError:
+    maxminddb = None
+
+# pyarrow is optional, and only used to write Parquet and Arrow files with --outformat.
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# NumPy is optional, and only used to convert whole columns at a time with --numpy.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# fcntl is only on Unix, and used to lock a checkpoint file while it is compacted.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 # The number of bits to use in a random hash.
 hashbits = 128
 
+# The first day and time of Zeek time.
+epoch = datetime.date(1970, 1, 1)
+epochdatetime = datetime.datetime(1970, 1, 1)
+
+# The number of rows converted at once with --numpy.
+numpyblock = 1000
+
+# The number of bytes of a log a worker process reads at a time with --fileprocs.
+splitchunk = 16 * 1024 * 1024
+
+# The number of lines a process adds to a checkpoint file before it is rewritten with only the last line of each log.
+checkpointcompact = 1000
+
+# The first bytes of the compressed log formats we can read.
+compressmagic = [(b"\x1f\x8b", "gzip"), (b"\x28\xb5\x2f\xfd", "zstd"), (b"BZh", "bz2"), (b"\x04\x22\x4d\x18", "lz4")]
+
+# The number of bytes a compressed log is decompressed at a time in the background, and the number of buffers filled ahead.
+decompresschunk = 4 * 1024 * 1024
+decompressbuffers = 4
+
+# The number of threads to decompress a gzip log with when rapidgzip is installed, set by --decompressthreads.
+decompressthreads = 0
+
+# The most seconds to wait between checks of the logs with --follow, and the seconds to let a write finish.
+followwait = 1.0
+followbatch = 0.2
+
+# The seconds a log that is not a current one must be left alone with --follow before it is sent whole.
+followsettle = 5.0
+
+# The names of the log files found in directories, uncompressed or compressed.
+logfilename = re.compile(r"\.log(\.(gz|zst|bz2|lz4))?$")
+
 # Disable SSL warnings.
 requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
 
@@ -35,192 +146,1634 @@ class MyParser(argparse.ArgumentParser):
 # This takes care of arg parsing
 def parseargs():
     parser = MyParser(description='Process Zeek ASCII logs into ElasticSearch.', formatter_class=argparse.RawTextHelpFormatter)
-    parser.add_argument('filename', 
-                        help='The Zeek log in *.log or *.gz format.  Include the full path.')
+    parser.add_argument('filename', nargs='+',
+                        help='The Zeek log in *.log format, or compressed with gzip, zstd, bzip2 or lz4.  Include the full path.\nMore than one log, directories or globs are processed with a pool of worker processes.')
+    parser.add_argument('--logtypes', nargs="+", default=[], help='Only process these log types, such as conn dns http, in this order. (default: all)')
+    parser.add_argument('--follow', action="store_true", help='Follow the current logs in the given directories, sending lines as they are written, until stopped.')
+    parser.add_argument('--fromstart', action="store_true", help='With --follow, also send the lines already in the logs when we start.')
+    parser.add_argument('--decompressthreads', default=0, type=int, help='The number of threads to decompress a gzip log with, if the rapidgzip Python library is installed. (default: 0 - the number of CPUs)')
+    parser.add_argument('--fileprocs', default=0, type=int, help='The number of worker processes to split a single large TSV log across.\nCannot be used with --jsonlogs. (default: 0 - no splitting)')
+    parser.add_argument('--procs', default=0, type=int, help='The number of worker processes for more than one log. (default: 0 - the number of CPUs)')
+    parser.add_argument('--filterdir', default="", help='A directory of filter files named by log type, such as conn_filter.txt, used like --filterfile.\n(default: empty string - disabled)')
     parser.add_argument('-i', '--esindex', help='The Elasticsearch index/data stream name.')
     parser.add_argument('-u', '--esurl', default="http://localhost:9200", help='The Elasticsearch URL.  Use ending slash.  Use https for Elastic v8+. (default: http://localhost:9200)')
     parser.add_argument('--user', default="", help='The Elasticsearch user. (default: disabled)')
     parser.add_argument('--passwd', default="", help='The Elasticsearch password. Note this will put your password in this shell history file.  (default: disabled)')
+    parser.add_argument('--poolsize', default=10, type=int, help='The number of pooled connections to keep open to Elasticsearch. (default: 10)')
+    parser.add_argument('--nokeepalive', action="store_true", help='Close the connection to Elasticsearch after every request.')
+    parser.add_argument('--gzip', action="store_true", help='Gzip compress the bulk requests sent to Elasticsearch.')
+    parser.add_argument('--provisioncache', default="", help='A file that remembers the mappings, templates, pipelines and policies already sent to ES,\nso they are not sent again by later runs. (default: empty string - disabled)')
+    parser.add_argument('--refresh', action="store_true", help='Send the mappings, templates, pipelines and policies to ES even if they were already sent.')
     parser.add_argument('-l', '--lines', default=10000, type=int, help='Lines to buffer for RESTful operations. (default: 10,000)')
+    parser.add_argument('--bulksize', default=50, type=int, help='The most MB in a bulk request.  Documents are sent at -l lines or this size, whichever comes first.\n0 sends them only at -l lines.  (default: 50)')
+    parser.add_argument('--adaptive', default=0.0, type=float, help='Adapt the documents in a bulk request, starting at -l lines.  They grow while bulk requests take\nless than this many seconds, and are cut when requests take longer or ES is busy.  (default: 0 - disabled)')
+    parser.add_argument('--senders', default=1, type=int, help='The number of threads sending bulk requests while parsing continues.\n0 sends them from the parsing thread.  (default: 1)')
+    parser.add_argument('--queuesize', default=2, type=int, help='The number of bulk requests that can wait for a sender thread. (default: 2)')
+    parser.add_argument('--ids', action="store_true", help='Give documents an _id from the log and line they came from, so sending a log again does not duplicate them.')
+    parser.add_argument('--checkpoint', default="", help='A file to record how many lines of every log were sent, after every bulk request.')
+    parser.add_argument('--resume', action="store_true", help='With --checkpoint, skip the lines of a log that were already sent.')
+    parser.add_argument('--retries', default=5, type=int, help='The number of times to retry bulk documents ES rejected because it was busy. (default: 5)')
+    parser.add_argument('--deadletter', default="", help='A file to append documents that could not be indexed to, as JSON lines. (default: empty string - disabled)')
+    parser.add_argument('--stats', action="store_true", help='Print the rows, documents, bulk requests and the time spent in every stage to stderr at the end.')
+    parser.add_argument('--statsfile', default="", help='A file to append the stats to as a JSON line every --statsinterval seconds. (default: empty string - disabled)')
+    parser.add_argument('--promfile', default="", help='A Prometheus textfile to write the stats to every --statsinterval seconds. (default: empty string - disabled)')
+    parser.add_argument('--statsinterval', default=10.0, type=float, help='The seconds between writes of the stats file and Prometheus textfile. (default: 10)')
+    parser.add_argument('--profile', default="", help='A file to write a cProfile profile of the main process to at the end, or on SIGUSR1. (default: empty string - disabled)')
     parser.add_argument('-n', '--name', default="", help='The name of the system to add to the index for uniqueness. (default: empty string)')
     parser.add_argument('-k', '--keywords', nargs="+", default="service", help='A list of text fields to add a keyword subfield. (default: service)')
+    parser.add_argument('--filter', default="", help='A filter expression checked on the raw values of each row before it is converted.  Example: "service == dns and id.orig_h in 10.0.0.0/8".  (default: empty string - disabled)')
     parser.add_argument('-a', '--lambdafilter', default="", help='A Python lambda function, when eval\'d will filter your output JSON dict. (default: empty string)')
     parser.add_argument('-f', '--filterfile', default="", help='A Python function file, when eval\'d will filter your output JSON dict. (default: empty string)')
     parser.add_argument('-y', '--outputfields', nargs="+", default="", help='A list of fields to keep for the output.  Must include ts. (default: empty string)')
     parser.add_argument('-d', '--datastream', default=0, type=int, help='Instead of an index, use a data stream that will rollover at this many GB.\nRecommended is 50 or less.  (default: 0 - disabled)')
     parser.add_argument('--compress', action="store_true", help='If a datastream is used, enable best compression.')
     parser.add_argument('-o', '--logkey', nargs=2, action='append', metavar=('fieldname','filename'), default=[], help='A field to log to a file.  Example: uid uid.txt.  \nWill append to the file!  Delete file before running if appending is undesired.  \nThis option can be called more than once.  (default: empty - disabled)')
-    parser.add_argument('-e', '--filterkeys', nargs=2, metavar=('fieldname','filename'), default="", help='A field to filter with keys from a file.  Example: uid uid.txt.  (default: empty string - disabled)')
-    parser.add_argument('-g', '--ingestion', action="store_true", help='Use the ingestion pipeline to do things like geolocate IPs and split services.  Takes longer, but worth it.')
-    parser.add_argument('-p', '--splitfields', nargs="+", default="", help='A list of additional fields to split with the ingestion pipeline, if enabled.\n(default: empty string - disabled)')
+    parser.add_argument('-e', '--filterkeys', nargs=2, metavar=('fieldname','filename'), default="", help='A field to filter with keys from a file.  Example: uid uid.txt.\nThe file can be a key index built with --keyindex.  (default: empty string - disabled)')
+    parser.add_argument('--correlate', nargs="+", default=[], metavar=('fieldname', 'logtype'), help='Ingest the logs filtered with --filter, -a or -f, collecting this field from the documents kept,\nthen only the documents of these related log types with one of those keys.  Example: uid ssl http.\nThe other log types, or --logtypes, are the primary logs.  (default: empty - disabled)')
+    parser.add_argument('--keyindex', action="store_true", help='Build a key index for -e from every key file given as a filename argument, written to the same name with .keyidx added.')
+    parser.add_argument('--keymemory', default=256, type=int, help='The MB of memory to use for keys while a key index or the keys of --correlate are built,\nbefore sorting them on disk. (default: 256)')
+    parser.add_argument('--rollup', nargs="+", default=[], help='Send summaries of the documents to their own index instead, for every bucket of --rollupinterval seconds\nand every value of these fields.  Example: service id.resp_p.  (default: empty - disabled)')
+    parser.add_argument('--rollupinterval', default=60, type=int, help='The seconds of a --rollup time bucket. (default: 60)')
+    parser.add_argument('--rollupfields', nargs="+", default=[], help='Numeric fields to sum, and keep the minimum and maximum of, in the --rollup summaries. (default: none)')
+    parser.add_argument('--rollupdistinct', nargs="+", default=[], help='Fields to estimate the number of distinct values of in the --rollup summaries. (default: none)')
+    parser.add_argument('--rollupindex', default="", help='The index or data stream of the --rollup summaries. (default: the index name with _rollup added)')
+    parser.add_argument('--rollupgroups', default=100000, type=int, help='The most --rollup groups to hold before they are all summarized. (default: 100,000)')
+    parser.add_argument('--rollupraw', action="store_true", help='With --rollup, send the documents too.')
+    parser.add_argument('-g', '--ingestion', action="store_true", help='Use the ingestion pipeline to do things like geolocate IPs and split services.  Takes longer, but worth it.\n--geoip does the same in the client.')
+    parser.add_argument('--geoip', default="", help='A MaxMind City or ASN mmdb file to locate id.orig_h and id.resp_h with in the client, instead of -g.\nService and -p fields are split too.  Requires the maxminddb Python library.  (default: empty string - disabled)')
+    parser.add_argument('--geoipcache', default=65536, type=int, help='The number of IPs to keep the locations of with --geoip. (default: 65,536)')
+    parser.add_argument('-p', '--splitfields', nargs="+", default="", help='A list of additional fields to split with the ingestion pipeline or --geoip, if enabled.\n(default: empty string - disabled)')
     parser.add_argument('-j', '--jsonlogs', action="store_true", help='Assume input logs are JSON.')
     parser.add_argument('-r', '--origtime', action="store_true", help='Keep the numerical time format, not milliseconds as ES needs.')
     parser.add_argument('-t', '--timestamp', action="store_true", help='Keep the time in timestamp format.')
     parser.add_argument('-s', '--stdout', action="store_true", help='Print JSON to stdout instead of sending to Elasticsearch directly.')
-    parser.add_argument('-b', '--nobulk', action="store_true", help='Remove the ES bulk JSON header.  Requires --stdout.')
+    parser.add_argument('-b', '--nobulk', action="store_true", help='Remove the ES bulk JSON header.  Requires --stdout or --outdir.')
+    parser.add_argument('--outdir', default="", help='A directory to write the bulk output to as files, one directory for every index, instead of sending it to ES.\nThe files can be sent to ES later with --load. (default: empty string - disabled)')
+    parser.add_argument('--outsize', default=1024, type=int, help='The size in MB a file in --outdir is rotated at. (default: 1024)')
+    parser.add_argument('--outcompress', default="none", choices=["none", "gzip", "zstd"], help='Compress the files in --outdir.  zstd requires the zstandard Python library. (default: none)')
+    parser.add_argument('--outformat', default="ndjson", choices=["ndjson", "parquet", "arrow"], help='The format of the files in --outdir.  parquet and arrow write typed columns from the #types of TSV logs,\n-l rows at a time, and require the pyarrow Python library.  (default: ndjson)')
+    parser.add_argument('--load', action="store_true", help='Send the bulk files written with --outdir to ES.  The filename arguments are --outdir directories or files.')
     parser.add_argument('--humio', nargs=2, default="", help='First argument is the Humio URL, the second argument is the ingest token.')
+    parser.add_argument('--humiostructured', action="store_true", help='Send to the Humio structured ingest endpoint, so Humio does not parse the JSON again.')
+    parser.add_argument('--humiosize', default=1, type=int, help='The most MB of documents in one Humio request. (default: 1)')
+    parser.add_argument('--serializer', default="auto", choices=["auto", "json", "orjson"], help='The JSON serializer for the output, and parser for JSON logs.  auto uses orjson if it is installed, otherwise json.\nWith --stdout, auto uses json, since orjson writes compact JSON and does not escape non-ASCII characters. (default: auto)')
+    parser.add_argument('--numpy', action="store_true", help='Convert the numeric and time columns of TSV logs a block of rows at a time with NumPy.\nRequires the numpy Python library.')
     parser.add_argument('-c', '--cython', action="store_true", help='Use Cython execution by loading the local zeek2es.so file through an import.\nRun python setup.py build_ext --inplace first to make your zeek2es.so file!')
     parser.add_argument('-w', '--hashdates', action="store_true", help='Use hashes instead of dates for the index name.')
     parser.add_argument('-z', '--supresswarnings', action="store_true", help='Supress any type of warning.  Die stoically and silently.')
     args = parser.parse_args()
     return args
 
-# A function to send data in bulk to ES.
-def sendbulk(args, outstring, es_index, filename):
-    # Elastic username and password auth
-    auth = None
-    if (len(args['user']) > 0):
-        auth = HTTPBasicAuth(args['user'], args['passwd'])
+# A function to serialize a dict into JSON bytes with the standard library.
+def jsondumps(d):
+    return json.dumps(d).encode('UTF-8')
+
+# A function to serialize a dict into JSON bytes with orjson.  Anything orjson
+# cannot serialize falls back to the standard library.
+def orjsondumps(d):
+    try:
+        return orjson.dumps(d)
+    except TypeError:
+        return jsondumps(d)
+
+# A function to get the JSON serializer we were asked for.  Every serializer takes a dict and returns bytes.
+def jsonserializer(name="auto"):
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        return orjsondumps
+    return jsondumps
+
+# orjson parses integers beyond 64 bits as floats, so lines with 19 digits in a row go to the standard library.
+longdigits = re.compile(r"\d{19}")
+longdigitsbytes = re.compile(rb"\d{19}")
+
+# A function to parse JSON with orjson.  Anything orjson cannot parse, or could turn
+# into a float, like integers beyond 64 bits, falls back to the standard library.
+def orjsonloads(s):
+    if (longdigitsbytes if isinstance(s, (bytes, bytearray)) else longdigits).search(s) is not None:
+        return json.loads(s)
+    try:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
+        return json.loads(s)
+
+# A function to get the JSON parser that goes with a serializer.  Every parser takes str or bytes.
+def jsonparser(name="auto"):
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        return orjsonloads
+    return json.loads
+
+# This collects a bulk body as bytes.  The bulk action line never changes within an index,
+# so it is serialized once and every document is appended straight into a bytearray.
+class BulkBuffer:
+    def __init__(self, es_index, pipeline=None, nobulk=False, dumps=jsondumps):
+        self.dumps = dumps
+        self.action = b""
+        self.create = None
+        if not nobulk:
+            i = dict(create=dict(_index=es_index))
+            if pipeline:
+                i["create"]["pipeline"] = pipeline
+            self.create = i["create"]
+            self.action = dumps(i)+b"\n"
+        self.buf = bytearray()
+        self.n = 0
+
+    def __len__(self):
+        return len(self.buf)
+
+    # Add a document, with its own _id if one is given.
+    def add(self, d, docid=None):
+        self.addraw(self.dumps(d), docid)
+
+    # Add a document that is already serialized.
+    def addraw(self, doc, docid=None):
+        if docid is not None and self.create is not None:
+            self.buf += self.dumps(dict(create=dict(self.create, _id=docid)))
+            self.buf += b"\n"
+        else:
+            self.buf += self.action
+        self.buf += doc
+        self.buf += b"\n"
+        self.n += 1
+
+    # Take the body collected so far, leaving the buffer empty.
+    def take(self):
+        body = self.buf
+        self.buf = bytearray()
+        self.n = 0
+        return body
+
+# This holds one pooled, keep-alive HTTP session for our Elasticsearch requests.
+class ESClient:
+    def __init__(self, esurl, user="", passwd="", poolsize=10, keepalive=True, gzipbulk=False):
+        self.esurl = esurl[:-1] if esurl.endswith('/') else esurl
+        self.gzipbulk = gzipbulk
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=poolsize, pool_maxsize=poolsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Elastic username and password auth
+        if (len(user) > 0):
+            self.session.auth = HTTPBasicAuth(user, passwd)
+        self.session.verify = False
+        self.session.headers.update({'Content-Type': 'application/json'})
+        if not keepalive:
+            self.session.headers.update({'Connection': 'close'})
+
+    # PUT a dict as JSON to a path on the ES server.
+    def put(self, path, data):
+        return self.session.put(self.esurl+path, data=json.dumps(data).encode('UTF-8'))
+
+    # PUT a bulk body, compressing it if we were asked to.
+    def bulk(self, body):
+        headers = None
+        if self.gzipbulk:
+            body = gzip.compress(body, compresslevel=1)
+            headers = {'Content-Encoding': 'gzip'}
+        return self.session.put(self.esurl+'/_bulk', data=body, headers=headers)
+
+# The ES clients in this process, so every file and thread shares one connection pool.
+esclients = {}
+
+# This holds one pooled, keep-alive HTTP session for our Humio requests, which are always gzip compressed.
+class HumioClient:
+    def __init__(self, url, token, poolsize=10, keepalive=True):
+        self.url = url[:-1] if url.endswith('/') else url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=poolsize, pool_maxsize=poolsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({'Authorization': 'Bearer '+token, 'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+        if not keepalive:
+            self.session.headers.update({'Connection': 'close'})
+
+    # POST a request body to an ingest endpoint.
+    def ingest(self, path, body):
+        return self.session.post(self.url+path, data=gzip.compress(body, compresslevel=1))
+
+# The Humio clients in this process.
+humioclients = {}
+
+# The fingerprints of the ES setup requests already applied by this process, its parent, or an earlier
+# run through the provisioning cache file.
+provisioned = set()
+
+# The indices whose mappings the parent process already sent, for the files it handed to this worker process.
+preparedindices = set()
+
+# A function to fingerprint an ES setup request, from the ES URL, the path and the body.
+def fingerprint(args, path, data):
+    return hashlib.sha256("{} {} {}".format(args['esurl'].rstrip('/'), path, json.dumps(data, sort_keys=True)).encode('UTF-8')).hexdigest()
+
+# A function to load the fingerprints in the provisioning cache file, if we have one.
+def loadprovisioncache(args):
+    if len(args['provisioncache']) > 0 and os.path.isfile(args['provisioncache']):
+        with open(args['provisioncache'], "r") as f:
+            provisioned.update(line.split(" ", 1)[0] for line in f.read().splitlines() if len(line) > 0)
+
+# A function to PUT an ES setup request (a mapping, template, pipeline or policy), unless the same
+# request was already applied.  The --refresh option sends it anyway.
+def sendonce(args, path, data):
+    fp = fingerprint(args, path, data)
+    if fp in provisioned and not args['refresh']:
+        return None
+    # With --outdir, the request is written down to be sent by --load.
+    if len(args['outdir']) > 0:
+        provisioned.add(fp)
+        writesetup(args['outdir'], path, data)
+        return None
+    res = esclient(args).put(path, data)
+    # An index that already exists has its mappings already.
+    if (res.ok or (res.status_code == 400 and "resource_already_exists_exception" in res.text)) and fp not in provisioned:
+        provisioned.add(fp)
+        if len(args['provisioncache']) > 0:
+            # One short line per write, so worker processes can append at the same time.
+            with open(args['provisioncache'], "a") as f:
+                f.write("{} {}\n".format(fp, path))
+    return res
+
+# The name of the file in an --outdir directory that holds the ES setup requests, one JSON line each.
+setupfile = "_setup.ndjson"
+
+# A function to write an ES setup request to an --outdir directory.  The line is written in one write
+# to a file opened for appending, so the lines of worker processes do not mix.
+def writesetup(outdir, path, data):
+    os.makedirs(outdir, exist_ok=True)
+    fd = os.open(os.path.join(outdir, setupfile), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, jsondumps(dict(path=path, body=data)) + b"\n")
+    finally:
+        os.close(fd)
+
+# The lock that keeps the stdout output of sender threads from mixing.  main() replaces it with a
+# multiprocessing lock that its worker processes are given, so their output does not mix either.
+stdoutlock = threading.Lock()
+
+# A function to get the ES client for our arguments.
+def esclient(args):
+    key = (args['esurl'], args['user'], args['passwd'], args['poolsize'], args['nokeepalive'], args['gzip'])
+    if key not in esclients:
+        esclients[key] = ESClient(args['esurl'], args['user'], args['passwd'], args['poolsize'], not args['nokeepalive'], args['gzip'])
+    return esclients[key]
+
+# A function to get the Humio client for our arguments.
+def humioclient(args):
+    key = (args['humio'][0], args['humio'][1], args['poolsize'], args['nokeepalive'])
+    if key not in humioclients:
+        humioclients[key] = HumioClient(args['humio'][0], args['humio'][1], args['poolsize'], not args['nokeepalive'])
+    return humioclients[key]
+
+# These are the bulk statuses that are worth sending again after a while.
+retrystatuses = (429, 502, 503, 504)
+
+# This counts what happened to the documents we sent in bulk.  It is shared by the sender threads.
+class BulkStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+
+    # Count documents.  Counts from a worker process are already in the metrics it handed back.
+    def add(self, sent=0, retried=0, dropped=0, counted=False):
+        with self.lock:
+            self.sent += sent
+            self.retried += retried
+            self.dropped += dropped
+        if not counted:
+            metrics.add(sent=sent, retried=retried, dropped=dropped)
+
+# The upper bounds of the bulk latency histogram buckets, in seconds.
+latencybuckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The stages the time of the thread reading logs is split into.  Idle is waiting for followed logs to change.
+stages = ("read", "parse", "filter", "convert", "serialize", "send", "idle", "other")
+
+# This counts what a process did, for --stats, --statsfile and --promfile.  The counters are added
+# a block of rows or a bulk request at a time.  With timing on, the time of the thread reading logs goes
+# to the stage it is in.  Stages nest, so the time spent reading lines while parsing them is read time.
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timing = False
+        self.started = time.time()
+        self.reset()
+
+    def reset(self):
+        self.counters = dict(rows=0, docs=0, sent=0, retried=0, dropped=0, bulks=0, bytes=0)
+        self.seconds = dict.fromkeys(stages, 0.0)
+        self.latency = [0] * (len(latencybuckets) + 1)
+        self.latencysum = 0.0
+        self.stack = ["other"]
+        self.mark = time.perf_counter()
+
+    def add(self, **counts):
+        with self.lock:
+            for k, v in counts.items():
+                self.counters[k] += v
+
+    # Count a bulk request of nbytes that took seconds.
+    def observe(self, seconds, nbytes):
+        with self.lock:
+            self.counters["bulks"] += 1
+            self.counters["bytes"] += nbytes
+            self.latency[bisect.bisect_left(latencybuckets, seconds)] += 1
+            self.latencysum += seconds
+
+    # Start timing a stage, until leave() goes back to the stage before it.
+    def enter(self, stage):
+        now = time.perf_counter()
+        self.seconds[self.stack[-1]] += now - self.mark
+        self.mark = now
+        self.stack.append(stage)
+
+    def leave(self):
+        now = time.perf_counter()
+        self.seconds[self.stack.pop()] += now - self.mark
+        self.mark = now
+
+    # Wrap a function so its calls are timed as a stage.
+    def timed(self, func, stage):
+        def call(*args, **kwargs):
+            self.enter(stage)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.leave()
+        return call
+
+    # Time getting the items of an iterator as a stage.  They are taken a block at a time,
+    # so timing costs next to nothing per item.
+    def staged(self, items, stage, n=1000):
+        items = iter(items)
+        while True:
+            self.enter(stage)
+            try:
+                block = list(itertools.islice(items, n))
+            finally:
+                self.leave()
+            if len(block) == 0:
+                return
+            yield from block
+
+    # Take what was counted since the last time, for a worker process to hand back.
+    def take(self):
+        with self.lock:
+            snapshot = dict(counters=self.counters, seconds=self.seconds, latency=self.latency, latencysum=self.latencysum)
+            self.counters = dict.fromkeys(self.counters, 0)
+            self.seconds = dict.fromkeys(stages, 0.0)
+            self.latency = [0] * len(self.latency)
+            self.latencysum = 0.0
+        return snapshot
+
+    # Add what a worker process handed back.
+    def merge(self, snapshot):
+        with self.lock:
+            for k, v in snapshot["counters"].items():
+                self.counters[k] += v
+            for k, v in snapshot["seconds"].items():
+                self.seconds[k] += v
+            self.latency = [a + b for a, b in zip(self.latency, snapshot["latency"])]
+            self.latencysum += snapshot["latencysum"]
+
+    # The metrics as a dict, with the latency histogram counts by bucket bound.
+    def snapshot(self):
+        with self.lock:
+            d = dict(time=datetime.datetime.now(datetime.timezone.utc).isoformat(), uptime=round(time.time() - self.started, 3))
+            d.update(self.counters)
+            d["filtered"] = d["rows"] - d["docs"]
+            d["seconds"] = {k: round(v, 6) for k, v in self.seconds.items()}
+            d["latency"] = dict(zip([str(b) for b in latencybuckets] + ["+Inf"], self.latency))
+            d["latencysum"] = round(self.latencysum, 6)
+        return d
+
+    # The metrics in the Prometheus text format.
+    def prometheus(self):
+        d = self.snapshot()
+        out = []
+        def metric(name, kind, text, values):
+            out.append("# HELP zeek2es_{} {}\n# TYPE zeek2es_{} {}\n".format(name, text, name, kind))
+            for labels, value in values:
+                out.append("zeek2es_{}{} {}\n".format(name, labels, value))
+        metric("rows_total", "counter", "Log rows read.", [("", d["rows"])])
+        metric("rows_filtered_total", "counter", "Log rows filtered out.", [("", d["filtered"])])
+        metric("docs_total", "counter", "Documents made from log rows.", [("", d["docs"])])
+        metric("docs_sent_total", "counter", "Documents indexed or written.", [("", d["sent"])])
+        metric("docs_retried_total", "counter", "Documents sent again because ES was busy.", [("", d["retried"])])
+        metric("docs_dropped_total", "counter", "Documents that could not be indexed.", [("", d["dropped"])])
+        metric("bulk_bytes_total", "counter", "Bytes of bulk bodies sent or written.", [("", d["bytes"])])
+        metric("stage_seconds_total", "counter", "Seconds spent in every stage.", [('{{stage="{}"}}'.format(k), v) for k, v in d["seconds"].items()])
+        buckets = list(itertools.accumulate(d["latency"].values()))
+        metric("bulk_latency_seconds", "histogram", "Bulk request latency.",
+               [('_bucket{{le="{}"}}'.format(b), n) for b, n in zip(d["latency"], buckets)] +
+               [("_sum", d["latencysum"]), ("_count", buckets[-1])])
+        return "".join(out)
+
+    # A summary of the metrics for people.
+    def summary(self):
+        d = self.snapshot()
+        lines = ["Rows read: {rows}, filtered: {filtered}, documents: {docs}".format(**d),
+                 "Documents sent: {sent}, retried: {retried}, dropped: {dropped}, {bytes} bytes in {bulks} bulk requests".format(**d)]
+        if d["bulks"] > 0:
+            # The bucket holding the median and 99th percentile request.
+            buckets = list(itertools.accumulate(d["latency"].values()))
+            p50 = list(d["latency"])[bisect.bisect_left(buckets, buckets[-1] * 0.5)]
+            p99 = list(d["latency"])[bisect.bisect_left(buckets, buckets[-1] * 0.99)]
+            lines.append("Bulk latency: mean {:.3f}s, p50 <= {}s, p99 <= {}s".format(d["latencysum"] / d["bulks"], p50, p99))
+        total = sum(d["seconds"].values())
+        if self.timing and total > 0:
+            lines.append("Time by stage: " + ", ".join("{} {:.2f}s ({:.0f}%)".format(k, v, 100 * v / total) for k, v in d["seconds"].items()))
+        return "\n".join(lines)
+
+# The metrics of this process.
+metrics = Metrics()
+
+# A function to check if we were asked for stats, which turns on the timing of stages.
+def statson(args):
+    return args['stats'] or len(args['statsfile']) > 0 or len(args['promfile']) > 0
+
+# This writes the metrics to the stats file as a JSON line and to the Prometheus textfile, every
+# interval and once more when it is closed.  The textfile is replaced whole, so it is never read half written.
+class MetricsWriter:
+    def __init__(self, args):
+        self.args = args
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop.wait(self.args['statsinterval']):
+            self.write()
+
+    def write(self):
+        if len(self.args['statsfile']) > 0:
+            with open(self.args['statsfile'], "a") as f:
+                f.write(json.dumps(metrics.snapshot()) + "\n")
+        if len(self.args['promfile']) > 0:
+            tmp = self.args['promfile'] + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(metrics.prometheus())
+            os.replace(tmp, self.args['promfile'])
+
+    def close(self):
+        self.stop.set()
+        self.thread.join()
+        self.write()
+
+# This keeps writes to the dead letter file from different threads apart.
+deadletterlock = threading.Lock()
+
+# A function to write documents that could not be indexed to the dead letter file.
+# Every line holds the index, the status, the error and the document itself.
+def writedeadletter(args, es_index, filename, failed):
+    if len(args['deadletter']) == 0 or len(failed) == 0:
+        return
+    with deadletterlock:
+        with open(args['deadletter'], "ab") as f:
+            for status, error, doc in failed:
+                f.write(b'{"_index": ' + jsondumps(es_index) + b', "filename": ' + jsondumps(filename) + b', "status": ' +
+                        jsondumps(status) + b', "error": ' + jsondumps(error) + b', "document": ' + bytes(doc) + b'}\n')
+
+# This decides when a bulk body is sent: once it has the documents of -l or the MB of --bulksize.  With --adaptive,
+# the documents a request gets grow by a step while bulk requests take less than the target seconds, and are cut
+# when they take longer or ES rejects documents because it is busy, so every process finds the size ES handles best.
+class BatchSize:
+    def __init__(self):
+        self.config = None
+        self.lock = threading.Lock()
+
+    # Take the sizes from the arguments.  Processors for the same arguments keep what was learned so far.
+    def setup(self, args):
+        config = (args['lines'], args['bulksize'], args['adaptive'])
+        if config != self.config:
+            self.config = config
+            self.lines = args['lines']
+            self.bytes = args['bulksize'] * 1024 * 1024 if args['bulksize'] > 0 else math.inf
+            self.target = args['adaptive']
+            self.minlines = max(1, args['lines'] // 100)
+            self.maxlines = 10 * args['lines']
+            self.step = max(1, args['lines'] // 10)
+
+    def full(self, docs, nbytes):
+        return docs >= self.lines or nbytes >= self.bytes
+
+    # Grow or cut the documents of a request from how a bulk request of docs went.
+    def observe(self, seconds, docs, rejected):
+        if self.target <= 0:
+            return
+        with self.lock:
+            if rejected:
+                self.lines = max(self.minlines, self.lines // 2)
+            elif seconds > self.target:
+                self.lines = max(self.minlines, self.lines * 3 // 4)
+            elif docs >= self.lines // 2:
+                # Only requests near the size say anything about a bigger one.
+                self.lines = min(self.maxlines, self.lines + self.step)
+
+# The bulk request size of this process.
+batchsize = BatchSize()
+
+# A function to get the time to wait before a retry, with exponential backoff and full jitter.
+def retrybackoff(attempt):
+    return random.uniform(0, min(60.0, 0.5 * 2 ** attempt))
+
+# A function to send a bulk body to ES.  The response is checked item by item, and only the items
+# that were rejected because ES was busy are sent again.  Documents that could not be indexed
+# go to the dead letter file.
+def sendesbulk(args, body, es_index, filename, stats):
+    attempt = 0
+    while True:
+        res = None
+        start = time.perf_counter()
+        try:
+            res = esclient(args).bulk(body)
+        except requests.exceptions.RequestException as exc:
+            error = str(exc)
+        metrics.observe(time.perf_counter() - start, len(body))
+
+        lines = body.split(b"\n")
+        failed = []
+        retry = bytearray()
+        # The status the documents to retry got, for the dead letter file if we give up on them.
+        retrystatus = res.status_code if res is not None else 0
+        if res is not None and res.ok:
+            result = res.json()
+            if not result.get("errors", False):
+                stats.add(sent=len(lines) // 2)
+                batchsize.observe(time.perf_counter() - start, len(lines) // 2, False)
+                return
+            # Sort the items into indexed, retryable and failed.
+            sent = 0
+            for k, item in enumerate(result.get("items", [])):
+                info = next(iter(item.values()))
+                status = info.get("status", 0)
+                # A conflict means the document is already indexed, like when a log is sent again with --ids.
+                if status < 300 or status == 409:
+                    sent += 1
+                elif status in retrystatuses:
+                    retry += lines[2*k] + b"\n" + lines[2*k+1] + b"\n"
+                    retrystatus = status
+                else:
+                    failed.append((status, info.get("error"), lines[2*k+1]))
+            stats.add(sent=sent)
+        elif res is None or res.status_code in retrystatuses:
+            # The whole request can be sent again.
+            retry = body
+        else:
+            # The whole request failed, and sending it again will not help.
+            if not args['supresswarnings']:
+                print("WARNING! PUT did not return OK! Your index {} is incomplete.  Filename: {} Response: {} {}".format(es_index, filename, res, res.text))
+            failed = [(res.status_code, res.text, lines[k]) for k in range(1, len(lines), 2)]
+
+        if len(failed) > 0:
+            stats.add(dropped=len(failed))
+            writedeadletter(args, es_index, filename, failed)
+        batchsize.observe(time.perf_counter() - start, len(lines) // 2, len(retry) > 0)
+        if len(retry) == 0:
+            return
+
+        nretry = retry.count(b"\n") // 2
+        attempt += 1
+        if attempt > args['retries']:
+            if not args['supresswarnings']:
+                print("WARNING! Gave up sending {} documents after {} retries! Your index {} is incomplete.  Filename: {}".format(nretry, args['retries'], es_index, filename))
+            rlines = retry.split(b"\n")
+            failed = [(retrystatus, "retries exhausted" if res is not None else error, rlines[k]) for k in range(1, len(rlines), 2)]
+            stats.add(dropped=len(failed))
+            writedeadletter(args, es_index, filename, failed)
+            return
+        stats.add(retried=nretry)
+        time.sleep(retrybackoff(attempt))
+        body = retry
+
+# This finds the ts of a document in its JSON, so the structured Humio endpoint gets its timestamp without decoding it.
+humiots = re.compile(rb'"ts": ?("[^"]*")')
+humiozone = re.compile(rb'[+-]\d\d:?\d\d"$')
+
+# A function to make a Humio request from a batch of JSON lines.  The unstructured endpoint gets the lines
+# as messages for the repository parser.  The structured endpoint gets them as the attributes of events.
+def humiorequest(args, batch):
+    if not args['humiostructured']:
+        return "/api/v1/ingest/humio-unstructured", jsonserializer(args['serializer'])([{"messages": [line.decode('UTF-8') for line in batch]}])
+    events = []
+    for line in batch:
+        m = humiots.search(line)
+        ts = m.group(1) if m is not None else jsondumps(datetime.datetime.now(datetime.timezone.utc).isoformat())
+        # Zeek times are UTC.
+        if not ts.endswith(b'Z"') and humiozone.search(ts) is None:
+            ts = ts[:-1] + b'Z"'
+        events.append(b'{"timestamp":' + ts + b',"attributes":' + line + b'}')
+    return "/api/v1/ingest/humio-structured", b'[{"events":[' + b",".join(events) + b']}]'
+
+# A function to send a batch of JSON lines to Humio.  Requests that fail because Humio is busy or cannot be
+# reached are sent again with backoff, up to --retries times.  Lines that could not be sent go to the dead letter file.
+def sendhumiobatch(args, batch, es_index, filename, stats):
+    path, request = humiorequest(args, batch)
+    attempt = 0
+    while True:
+        res = None
+        start = time.perf_counter()
+        try:
+            res = humioclient(args).ingest(path, request)
+        except requests.exceptions.RequestException as exc:
+            error = str(exc)
+        metrics.observe(time.perf_counter() - start, len(request))
+
+        if res is not None and res.ok:
+            stats.add(sent=len(batch))
+            return
+        if res is not None and res.status_code not in retrystatuses:
+            # Sending it again will not help, like when the token is wrong.
+            if not args['supresswarnings']:
+                print("WARNING! Humio did not return OK! {} documents were not sent.  Filename: {} Response: {} {}".format(len(batch), filename, res, res.text))
+            stats.add(dropped=len(batch))
+            writedeadletter(args, es_index, filename, [(res.status_code, res.text, line) for line in batch])
+            return
 
+        attempt += 1
+        if attempt > args['retries']:
+            if not args['supresswarnings']:
+                print("WARNING! Gave up sending {} documents to Humio after {} retries!  Filename: {}".format(len(batch), args['retries'], filename))
+            status = res.status_code if res is not None else 0
+            stats.add(dropped=len(batch))
+            writedeadletter(args, es_index, filename, [(status, "retries exhausted" if res is not None else error, line) for line in batch])
+            return
+        stats.add(retried=len(batch))
+        time.sleep(retrybackoff(attempt))
+
+# A function to send a body of JSON lines to Humio, in batches of at most --humiosize MB.
+def sendhumio(args, body, es_index, filename, stats):
+    cap = args['humiosize'] * 1024 * 1024
+    batch, size = [], 0
+    for line in body.split(b"\n"):
+        if len(line) == 0:
+            continue
+        if size + len(line) > cap and len(batch) > 0:
+            sendhumiobatch(args, batch, es_index, filename, stats)
+            batch, size = [], 0
+        batch.append(line)
+        size += len(line) + 1
+    if len(batch) > 0:
+        sendhumiobatch(args, batch, es_index, filename, stats)
+
+# A function to get the number of threads sending bulk bodies.  Output to stdout is written in order from the parsing thread.
+def senderthreads(args):
+    return args['senders'] if not args['stdout'] or len(args['humio']) == 2 else 0
+
+# A function to send data in bulk to ES.
+def sendbulk(args, body, es_index, filename, stats=None):
     if len(args['humio']) != 2:
         if not args['stdout']:
-            esurl = args['esurl'][:-1] if args['esurl'].endswith('/') else args['esurl']
-
-            res = requests.put(esurl+'/_bulk', headers={'Content-Type': 'application/json'}, 
-                                data=outstring.encode('UTF-8'), auth=auth, verify=False)
-            if not res.ok:
-                if not args['supresswarnings']:
-                    print("WARNING! PUT did not return OK! Your index {} is incomplete.  Filename: {} Response: {} {}".format(es_index, filename, res, res.text))
+            sendesbulk(args, body, es_index, filename, stats if stats is not None else BulkStats())
         else:
-            print(outstring.strip())
+            with stdoutlock:
+                sys.stdout.flush()
+                sys.stdout.buffer.write(body)
+                sys.stdout.buffer.flush()
+            metrics.add(sent=body.count(b"\n") // (1 if args['nobulk'] else 2), bytes=len(body))
     else:
         # Send to Humio
-        Headers = { "Authorization" : "Bearer "+args['humio'][1] }
-        data = [{"messages" : outstring.strip().split('\n') }]
+        sendhumio(args, body, es_index, filename, stats if stats is not None else BulkStats())
+
+# The file name endings of the --outdir compression choices.
+outendings = dict(none=".ndjson", gzip=".ndjson.gz", zstd=".ndjson.zst")
+
+# This numbers the bulk files of this process, which can write many logs one after another.
+outcount = itertools.count()
+
+# This writes bulk bodies to files in a directory for every index, instead of sending them.  The files
+# are named for the time, the process and a count, so worker processes never share one, and a file is
+# rotated once it reaches the size cap on disk.  A file is written under a .tmp name and renamed when it is
+# complete, so only complete files are picked up by --load or shipped.  Every index has its own lock,
+# so the sender threads can compress bodies for different indices at the same time.
+class BulkFiles:
+    def __init__(self, args):
+        self.outdir = args['outdir']
+        self.compress = args['outcompress']
+        self.cap = args['outsize'] * 1024 * 1024
+        self.stamp = "{}-{}".format(datetime.datetime.now().strftime("%Y%m%d%H%M%S"), os.getpid())
+        self.lock = threading.Lock()
+        self.files = {}
+
+    # Open the next file for an index.
+    def _open(self, es_index):
+        directory = os.path.join(self.outdir, es_index)
+        os.makedirs(directory, exist_ok=True)
         while True:
+            path = os.path.join(directory, "{}-{:05d}{}".format(self.stamp, next(outcount), outendings[self.compress]))
+            if os.path.exists(path):
+                continue
             try:
-                r = requests.post(args['humio'][0]+'/api/v1/ingest/humio-unstructured', headers=Headers, json=data)
+                raw = open(path + ".tmp", "xb")
                 break
+            except FileExistsError:
+                continue
+        if self.compress == "gzip":
+            out = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+        elif self.compress == "zstd":
+            out = zstandard.ZstdCompressor(level=3).stream_writer(raw)
+        else:
+            out = raw
+        return [raw, out, path]
+
+    def _close(self, f):
+        raw, out, path = f
+        out.close()
+        raw.close()
+        os.replace(path + ".tmp", path)
+
+    # Write a bulk body to the file of its index.
+    def write(self, body, es_index):
+        with self.lock:
+            if es_index not in self.files:
+                self.files[es_index] = (threading.Lock(), [None])
+            lock, f = self.files[es_index]
+        with lock:
+            if f[0] is None:
+                f[0] = self._open(es_index)
+            f[0][1].write(body)
+            if f[0][0].tell() >= self.cap:
+                self._close(f[0])
+                f[0] = None
+
+    # Finish every file, so they can be loaded.  Writing more starts new files.
+    def close(self):
+        with self.lock:
+            files = list(self.files.values())
+        for lock, f in files:
+            with lock:
+                if f[0] is not None:
+                    self._close(f[0])
+                    f[0] = None
+
+# The file name endings of the columnar --outformat choices.  --load does not pick these up.
+columnarendings = dict(parquet=".parquet", arrow=".arrow")
+
+# This writes tables of rows to Parquet or Arrow IPC files in a directory for every index, named and rotated like
+# the bulk files.  A file has one schema, so a log block with other fields or types starts a new file.  Every
+# table written is a row group of a Parquet file or a record batch of an Arrow file.
+class ColumnarFiles:
+    def __init__(self, args):
+        self.outdir = args['outdir']
+        self.format = args['outformat']
+        self.compress = args['outcompress'] if args['outcompress'] != "none" else None
+        self.cap = args['outsize'] * 1024 * 1024
+        self.stamp = "{}-{}".format(datetime.datetime.now().strftime("%Y%m%d%H%M%S"), os.getpid())
+        self.lock = threading.Lock()
+        self.files = {}
+
+    # Open the next file for an index.
+    def _open(self, es_index, schema):
+        directory = os.path.join(self.outdir, es_index)
+        os.makedirs(directory, exist_ok=True)
+        while True:
+            path = os.path.join(directory, "{}-{:05d}{}".format(self.stamp, next(outcount), columnarendings[self.format]))
+            if not os.path.exists(path) and not os.path.exists(path + ".tmp"):
+                break
+        sink = pyarrow.OSFile(path + ".tmp", "wb")
+        if self.format == "parquet":
+            writer = pyarrow.parquet.ParquetWriter(sink, schema, compression=self.compress or "none")
+        else:
+            writer = pyarrow.ipc.new_file(sink, schema, options=pyarrow.ipc.IpcWriteOptions(compression=self.compress))
+        # Arrow IPC writers do not keep their schema, so it is kept with the file.
+        return [sink, writer, path, schema]
+
+    def _close(self, f):
+        sink, writer, path, schema = f
+        writer.close()
+        sink.close()
+        os.replace(path + ".tmp", path)
+
+    # Throw away a file that failed to be written, so it never gets a finished name.
+    def _abort(self, f):
+        sink, writer, path, schema = f
+        try:
+            writer.close()
+        except Exception:
+            pass
+        sink.close()
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+
+    # Write a table to the file of its index.
+    def write(self, table, es_index):
+        with self.lock:
+            f = self.files.get(es_index)
+            if f is not None and not f[3].equals(table.schema):
+                self._close(f)
+                f = None
+            if f is None:
+                f = self._open(es_index, table.schema)
+                self.files[es_index] = f
+            try:
+                f[1].write_table(table)
+            except Exception:
+                del self.files[es_index]
+                self._abort(f)
+                raise
+            if f[0].tell() >= self.cap:
+                self._close(f)
+                del self.files[es_index]
+
+    # Finish every file.  Writing more starts new files.
+    def close(self):
+        with self.lock:
+            for f in self.files.values():
+                self._close(f)
+            self.files = {}
+
+# This sends bulk bodies to ES from worker threads fed through a bounded queue, so we can keep
+# parsing while ES indexes earlier batches.  When the queue is full the parser waits, which caps
+# the memory held in batches to the queue size plus one batch per thread.  With no threads,
+# the batches are sent in the calling thread.
+class BulkSender:
+    def __init__(self, args, threads=1, queuesize=2):
+        self.args = args
+        self.queue = queue.Queue(maxsize=max(queuesize, 1))
+        self.stats = BulkStats()
+        self.files = None
+        if len(args['outdir']) > 0:
+            self.files = BulkFiles(args) if args['outformat'] == "ndjson" else ColumnarFiles(args)
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(threads)]
+        for t in self.threads:
+            t.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Queue a bulk body to be sent.  If done is given, it is called once the body was sent.
+    def send(self, body, es_index, filename, done=None):
+        if len(self.threads) == 0:
+            self._send(body, es_index, filename)
+            if done is not None:
+                done()
+        else:
+            self.queue.put((body, es_index, filename, done))
+
+    # Send a bulk body, or write it to its file with --outdir.
+    def _send(self, body, es_index, filename):
+        if self.files is not None:
+            self.files.write(body, es_index)
+            self.stats.add(sent=body.count(b"\n") // (1 if self.args['nobulk'] else 2))
+            metrics.add(bytes=len(body))
+        else:
+            sendbulk(self.args, body, es_index, filename, self.stats)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                body, es_index, filename, done = item
+                self._send(body, es_index, filename)
+                if done is not None:
+                    done()
             except Exception as exc:
-                if not args['supresswarnings']:
-                    print("WARNING, Humio error: {}".format(exc))
-                time.sleep(1)
+                if not self.args['supresswarnings']:
+                    print("WARNING! Bulk send failed! Your index {} is incomplete.  Filename: {} Error: {}".format(item[1], item[2], exc))
+            finally:
+                self.queue.task_done()
+
+    # Wait for every queued body to be sent, then stop the threads.
+    def close(self):
+        for t in self.threads:
+            self.queue.put(None)
+        for t in self.threads:
+            t.join()
+        self.threads = []
+        if self.files is not None:
+            self.files.close()
+        if self.stats.dropped > 0 and not self.args['supresswarnings']:
+            print("WARNING! {} documents could not be indexed and {} were retried.".format(self.stats.dropped, self.stats.retried))
+
+# This records how many lines of every log were sent.  The file is appended to after every bulk
+# request, with one short JSON line each, and the last line for a log is the one that counts.
+class CheckpointStore:
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.lines = {}
+        # The lines this process added since the file was last compacted.
+        self.added = 0
+        if os.path.isfile(filename):
+            with self.filelock():
+                last, ended = readcheckpoints(filename)
+                # The lines we add do not go on the end of a line cut short.
+                if not ended:
+                    with open(filename, "a") as f:
+                        f.write("\n")
+            self.lines = {k: c["line"] for k, c in last.items()}
+
+    # The number of lines of a log that were sent, by its identity.
+    def get(self, key):
+        return self.lines.get(key, 0)
+
+    def record(self, key, filename, line):
+        with self.lock:
+            self.lines[key] = line
+            with self.filelock():
+                with open(self.filename, "a") as f:
+                    f.write(json.dumps(dict(log=key, filename=filename, line=line)) + "\n")
+                self.added += 1
+                if self.added >= checkpointcompact and fcntl is not None:
+                    self.compact()
+
+    # Rewrite the file with only the last line of each log, including those added by other processes.
+    # The new file replaces the old one whole, so it is never read half written.
+    def compact(self):
+        last, ended = readcheckpoints(self.filename)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.filename)), prefix=".checkpoint")
+        try:
+            with os.fdopen(fd, "w") as f:
+                for c in last.values():
+                    f.write(json.dumps(c) + "\n")
+            os.replace(tmp, self.filename)
+        except:
+            os.unlink(tmp)
+            raise
+        self.lines.update({k: c["line"] for k, c in last.items()})
+        self.added = 0
+
+    # A lock on the file shared by every process using it, so a process does not add a line to a file
+    # that is being replaced.  Without fcntl the file is never compacted, so lines can be added at any time.
+    @contextlib.contextmanager
+    def filelock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.filename + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+# A function to read a checkpoint file, returning the last line of each log by its identity, and
+# whether the file ends with a whole line.
+def readcheckpoints(filename):
+    last = {}
+    line = "\n"
+    with open(filename, "r") as f:
+        for line in f:
+            try:
+                c = json.loads(line)
+            except ValueError:
+                # A line cut short when we were stopped.
+                continue
+            last[c["log"]] = c
+    return last, line.endswith("\n")
+
+# The checkpoint stores of this process, by file name.
+checkpointstores = {}
+
+# A function to get the checkpoint store for our arguments, or None if we are not keeping checkpoints.
+def checkpointstore(args):
+    if len(args['checkpoint']) == 0:
+        return None
+    if args['checkpoint'] not in checkpointstores:
+        checkpointstores[args['checkpoint']] = CheckpointStore(args['checkpoint'])
+    return checkpointstores[args['checkpoint']]
+
+# This tracks the lines of one log that were sent.  Bulk requests can finish out of order, so the
+# checkpoint only moves past a line once every line before it was sent too.
+class LogProgress:
+    def __init__(self, store, key, filename, line=0):
+        self.store = store
+        self.key = key
+        self.filename = filename
+        self.lock = threading.Lock()
+        # The lines sent so far, and the first line not yet in a bulk request.
+        self.line = line
+        self.next = line + 1
+        self.done = {}
+
+    # Claim the lines up to last for a bulk request.  This returns the function to call once it was
+    # sent, or None if there are no new lines.
+    def claim(self, last):
+        if last < self.next:
+            return None
+        done = functools.partial(self.ack, self.next, last)
+        self.next = last + 1
+        return done
+
+    # Mark the lines from first to last as sent, and record how far we are.
+    def ack(self, first, last):
+        with self.lock:
+            self.done[first] = last
+            line = self.line
+            while line + 1 in self.done:
+                line = self.done.pop(line + 1)
+            if line > self.line:
+                self.line = line
+                if self.store is not None:
+                    self.store.record(self.key, self.filename, line)
 
 # A function to send the datastream info to ES.
 def senddatastream(args, es_index, mappings):
-    # Elastic username and password auth
-    auth = None
-    if (len(args['user']) > 0):
-        auth = HTTPBasicAuth(args['user'], args['passwd'])
-
-    esurl = args['esurl'][:-1] if args['esurl'].endswith('/') else args['esurl']
-
     lifecycle_policy = {"policy": {"phases": {"hot": {"actions": {"rollover": {"max_primary_shard_size": "{}GB".format(args['datastream'])}}}}}}
-    res = requests.put(esurl+"/_ilm/policy/zeek-lifecycle-policy", headers={'Content-Type': 'application/json'},
-                        data=json.dumps(lifecycle_policy).encode('UTF-8'), auth=auth, verify=False)
+    res = sendonce(args, "/_ilm/policy/zeek-lifecycle-policy", lifecycle_policy)
     index_template = {"index_patterns": [es_index], "data_stream": {}, "composed_of": [], "priority": 500, 
                         "template": {"settings": {"index.lifecycle.name": "zeek-lifecycle-policy"}, "mappings": mappings["mappings"]}}
     if (args['compress']):
         index_template["template"]["settings"]["index"] = {"codec": "best_compression"}
-    res = requests.put(esurl+"/_index_template/"+es_index, headers={'Content-Type': 'application/json'},
-                        data=json.dumps(index_template).encode('UTF-8'), auth=auth, verify=False)
+    res = sendonce(args, "/_index_template/"+es_index, index_template)
 
 # A function to send mappings to ES.
 def sendmappings(args, es_index, mappings):
-    # Elastic username and password auth
-    auth = None
-    if (len(args['user']) > 0):
-        auth = HTTPBasicAuth(args['user'], args['passwd'])
-
-    esurl = args['esurl'][:-1] if args['esurl'].endswith('/') else args['esurl']
+    res = sendonce(args, "/"+es_index, mappings)
 
-    res = requests.put(esurl+"/"+es_index, headers={'Content-Type': 'application/json'},
-                        data=json.dumps(mappings).encode('UTF-8'), auth=auth, verify=False)
+# A function to add new fields to the mappings of an existing index.
+def sendmappingupdate(args, es_index, properties):
+    res = sendonce(args, "/"+es_index+"/_mapping", {"properties": properties})
 
 # A function to send the ingest pipeline to ES.
 def sendpipeline(args, ingest_pipeline):
-    # Elastic username and password auth
-    auth = None
-    if (len(args['user']) > 0):
-        auth = HTTPBasicAuth(args['user'], args['passwd'])
-
-    esurl = args['esurl'][:-1] if args['esurl'].endswith('/') else args['esurl']
-
-    res = requests.put(esurl+"/_ingest/pipeline/zeekgeoip", headers={'Content-Type': 'application/json'},
-                        data=json.dumps(ingest_pipeline).encode('UTF-8'), auth=auth, verify=False)
-
-# Everything important is in here.
-def main(**args):
-
-    # Takes care of the fields we want to output, if not all.
-    outputfields = []
-    if (len(args['outputfields']) > 0):
-        outputfields = args['outputfields']
-
-    # Takes care of logging keys to a file.
-    logkeyfields = []
-    logkeys_fds = []
-    if (len(args['logkey']) > 0):
-        for lk in args['logkey']:
-            thefield, thefile = lk[0], lk[1]
-            f = open(thefile, "a+")
-            logkeyfields.append(thefield)
-            logkeys_fds.append(f)
-
-    # Takes care of loading keys from a file to use in a filter.
-    filterkeys = set()
-    filterkeys_field = None
-    if (len(args['filterkeys']) > 0):
-        filterkeys_field = args['filterkeys'][0]
-        filterkeys_file = args['filterkeys'][1]
-        with open(filterkeys_file, "r") as infile:
-            filterkeys = set(infile.read().splitlines())
-
-    # This takes care of fields where we want to add the keyword field.
-    keywords = []
-    if (len(args['keywords']) > 0):
-        keywords = args['keywords']
-
-    # Error checking
-    if args['esindex'] and args['stdout']:
-        if not args['supresswarnings']:
-            print("Cannot write to Elasticsearch and stdout at the same time.")
-        exit(-1)
-
-    # Error checking
-    if args['nobulk'] and not args['stdout']:
-        if not args['supresswarnings']:
-            print("The nobulk option can only be used with the stdout option.")
-        exit(-2)
-
-    # Error checking
-    if len(args['humio']) > 0 and (not args['stdout'] or not args['nobulk'] or args['timestamp']):
-        if not args['supresswarnings']:
-            print("The Humio option can only be used with the stdout and nobulk options, and cannot have the timestamp option.")
-        exit(-5)
-
-    # Error checking
-    if not args['timestamp'] and args['origtime']:
-        if not args['supresswarnings']:
-            print("The origtime option can only be used with the timestamp option.")
-        exit(-3)
-
-    # Error checking
-    if len(args['lambdafilter']) > 0 and len(args['filterfile']) > 0:
-        if not args['supresswarnings']:
-            print("The lambdafilter option cannot be used with the filterfile option.")
-        exit(-7)
-
-    # This takes care of loading the Python filters.
-    filterfilter = None
-    if len(args['lambdafilter']) > 0:
-        filterfilter = eval(args['lambdafilter'])
-
-    if len(args['filterfile']) > 0:
-        with open(args['filterfile'], "r") as ff:
-            filterfilter = eval(ff.read())
-
-    # The file we are processing.
-    filename = args['filename']
-                    
-    # Detect if the log is compressed or not.
-    if filename.split(".")[-1].lower() == "gz":
-        # This works on Linux and MacOs
-        zcat_name = ["gzip", "-d", "-c"]
+    res = sendonce(args, "/_ingest/pipeline/zeekgeoip", ingest_pipeline)
+
+# This times the reads of a log file as the read stage, which is where it is decompressed.
+class TimedReader(io.BufferedIOBase):
+    def __init__(self, f):
+        self.f = f
+        self.read = metrics.timed(f.read, "read")
+        self.read1 = metrics.timed(f.read1, "read")
+        self.peek = metrics.timed(f.peek, "read")
+
+    def readable(self):
+        return True
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        self.f.close()
+        super().close()
+
+# A function to find how a log is compressed from its first bytes.  It returns None if the log is not compressed.
+def compression(filename):
+    with open(filename, "rb") as f:
+        start = f.read(4)
+    for magic, kind in compressmagic:
+        if start.startswith(magic):
+            return kind
+    return None
+
+# A function to open a stream that decompresses a log.  gzip logs with more than one member, like logs that were
+# appended to, are read to the end by all of these, and are decompressed by more than one thread with rapidgzip.
+def decompressor(filename, kind):
+    if kind == "gzip":
+        if rapidgzip is not None and decompressthreads != 1:
+            return rapidgzip.open(filename, parallelization=decompressthreads)
+        if igzip is not None:
+            return igzip.open(filename, "rb")
+        return gzip.open(filename, "rb")
+    if kind == "bz2":
+        return bz2.open(filename, "rb")
+    if kind == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), read_across_frames=True)
+    if kind == "lz4" and lz4 is not None:
+        return lz4.frame.open(filename, "rb")
+    raise RuntimeError("Reading {} logs requires the {} Python library.".format(kind, "zstandard" if kind == "zstd" else kind))
+
+# A function to check that the Python library to decompress a log is installed.
+def candecompress(filename):
+    kind = compression(filename)
+    return not (kind == "zstd" and zstandard is None or kind == "lz4" and lz4 is None)
+
+# A function to set how gzip logs are decompressed from the args.
+def decompression(args):
+    global decompressthreads
+    decompressthreads = args['decompressthreads']
+
+# This decompresses a log in a background thread, so the next block is decompressed while the last one is parsed.
+# The thread fills a few large buffers in turn, and each one is handed back to it once it has been read.
+class DecompressReader(io.RawIOBase):
+    def __init__(self, f):
+        self.f = f
+        self.full = queue.Queue()
+        self.free = queue.Queue()
+        for _ in range(decompressbuffers):
+            self.free.put(bytearray(decompresschunk))
+        self.buf = None
+        self.view = None
+        self.pos = 0
+        self.end = 0
+        self.eof = False
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.fill, daemon=True)
+        self.thread.start()
+
+    # Decompress into the free buffers until the end of the log, or until we are closed.
+    def fill(self):
+        try:
+            for buf in iter(self.free.get, None):
+                if self.stop.is_set():
+                    break
+                view = memoryview(buf)
+                n = 0
+                while n < len(buf):
+                    got = self.f.readinto(view[n:])
+                    if not got:
+                        break
+                    n += got
+                view.release()
+                self.full.put((buf, n))
+                if n == 0:
+                    break
+        except Exception as exc:
+            self.full.put(exc)
+        finally:
+            self.f.close()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self.pos == self.end:
+            if self.eof:
+                return 0
+            if self.buf is not None:
+                self.view.release()
+                self.free.put(self.buf)
+                self.buf = None
+            item = self.full.get()
+            if isinstance(item, Exception):
+                self.eof = True
+                raise item
+            self.buf, self.end = item
+            self.view = memoryview(self.buf)
+            self.pos = 0
+            self.eof = self.end == 0
+        n = min(len(b), self.end - self.pos)
+        b[:n] = self.view[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def close(self):
+        if not self.closed and self.thread.is_alive():
+            self.stop.set()
+            self.free.put(None)
+            self.thread.join()
+        super().close()
+
+# A function to open a log file for binary reading.  A compressed log is found by its first bytes and
+# decompressed in the background.
+def openlog(filename):
+    kind = compression(filename)
+    if kind is None:
+        f = open(filename, "rb")
     else:
-        zcat_name = ["cat"]
-
-    # Setup the ingest pipeline
+        f = io.BufferedReader(DecompressReader(decompressor(filename, kind)), decompresschunk)
+    return TimedReader(f) if metrics.timing else f
+
+# A function to identify a log by what is in it, so it is the same log wherever it is found.  This hashes
+# the lines up to the first row, which hold the open time and the first uid.  It returns None if the
+# first row is not written yet.
+def fileid(filename):
+    h = hashlib.sha256()
+    with openlog(filename) as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                return None
+            h.update(line)
+            if not line.startswith(b"#"):
+                return h.hexdigest()[:hashbits // 4]
+    return None
+
+# A function to skip the first lines of a log stream, returning the header lines found in them.  The
+# stream is read a buffer at a time with peek, so it is left right after the last line skipped.
+def skiplines(f, n):
+    header = ""
+    partial = b""
+    while n > 0:
+        buf = f.peek(splitchunk)
+        if len(buf) == 0:
+            break
+        end = len(buf)
+        count = buf.count(b"\n")
+        if count >= n:
+            end = 0
+            for _ in range(n):
+                end = buf.index(b"\n", end) + 1
+            count = n
+        data = partial + f.read(end)
+        cut = data.rfind(b"\n") + 1
+        header = headerblocks(data, header, 0, cut)[1]
+        partial = data[cut:]
+        n -= count
+    return header
+
+# A function to read the lines of a stream a large block at a time.  The lines are bytes without their newline.
+def blocklines(f):
+    partial = b""
+    while True:
+        chunk = f.read(splitchunk)
+        if len(chunk) == 0:
+            break
+        lines = (partial + chunk).split(b"\n")
+        partial = lines.pop()
+        yield from lines
+    if len(partial) > 0:
+        yield partial
+
+# This reads a Zeek TSV log in a single pass.  The header block is parsed in-process,
+# then the rows are split and yielded from the same stream.  Zeek can write more than one
+# header block to a file, so rows are grouped into blocks that share the same fields and types.
+class ZeekLogReader:
+    def __init__(self, filename, stream=None, skip=0):
+        self.filename = filename
+        self.separator = "\t"
+        self.set_separator = ","
+        self.empty_field = "(empty)"
+        self.unset_field = "-"
+        self.path = ""
+        self.opened = ""
+        self.closed = ""
+        self.fields = []
+        self.types = []
+        # The stream can be given, such as the header text handed to a worker process.  Lines can
+        # be skipped, like when resuming, but the header lines in them are still read.
+        header = ""
+        if stream is None:
+            f = openlog(filename)
+            if skip > 0:
+                header = skiplines(f, skip)
+            stream = io.TextIOWrapper(f, encoding="UTF-8")
+        self._stream = stream
+        self._lines = itertools.chain(io.StringIO(header), stream) if len(header) > 0 else iter(stream)
+        # The number of lines read before the pending one.
+        self.lineno = skip - header.count("\n")
+        self._pending = None
+        self._readheader()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._stream.close()
+
+    # Parse one header line, returning True if the fields, types or how the values are written changed.
+    def _headerline(self, line):
+        line = line.rstrip("\r\n")
+        if line.startswith("#separator"):
+            separator = line.split(" ", 1)[1].encode("UTF-8").decode("unicode_escape")
+            changed = separator != self.separator
+            self.separator = separator
+            return changed
+        key, _, value = line.partition(self.separator)
+        if key == "#set_separator":
+            changed = value != self.set_separator
+            self.set_separator = value
+            return changed
+        elif key == "#empty_field":
+            changed = value != self.empty_field
+            self.empty_field = value
+            return changed
+        elif key == "#unset_field":
+            changed = value != self.unset_field
+            self.unset_field = value
+            return changed
+        elif key == "#path":
+            self.path = value
+        elif key == "#open":
+            self.opened = value
+        elif key == "#close":
+            self.closed = value
+        elif key == "#fields":
+            fields = value.split(self.separator)
+            changed = fields != self.fields
+            self.fields = fields
+            return changed
+        elif key == "#types":
+            types = value.split(self.separator)
+            changed = types != self.types
+            self.types = types
+            return changed
+        return False
+
+    # Read header lines until the first data line, which is kept for rows().
+    def _readheader(self):
+        changed = False
+        self._pending = None
+        for line in self._lines:
+            if not line.startswith("#"):
+                self._pending = line
+                break
+            self.lineno += 1
+            if self._headerline(line):
+                changed = True
+        return changed
+
+    # Yield the split rows of the current block.  This stops when a new header block
+    # changes the fields, types or separators, so the caller can pick up the new schema.
+    def rows(self):
+        sep = self.separator
+        line = self._pending
+        self._pending = None
+        while line is not None:
+            yield line[:-1].split(sep) if line.endswith("\n") else line.split(sep)
+            self.lineno += 1
+            line = next(self._lines, None)
+            if line is not None and line.startswith("#"):
+                self.lineno += 1
+                changed = self._headerline(line)
+                if self._readheader() or changed:
+                    return
+                sep = self.separator
+                line = self._pending
+                self._pending = None
+
+    # Yield a row iterator for every block of rows, updating fields and types as we go.
+    def blocks(self):
+        while self._pending is not None:
+            yield self.rows()
+
+# A function to add the mappings for a set of Zeek fields and types.
+def addmappings(properties, fields, types, keywords):
+    for i in range(len(fields)):
+        if types[i] == "time":
+            properties[fields[i]] = {"type": "date"}
+        elif types[i] == "addr":
+            properties[fields[i]] = {"type": "ip"}
+        elif types[i] == "string":
+            # Special cases
+            if fields[i] in keywords:
+                properties[fields[i]] = {"type": "text", "fields": { "keyword": { "type": "keyword" }}}
+            else:
+                properties[fields[i]] = {"type": "text"}
+
+# This converts Zeek times into the output time format of the --timestamp and --origtime options,
+# with the same output as going through datetime.datetime.utcfromtimestamp().  Decimal strings
+# are split with integer arithmetic, and since Zeek times are nearly monotonic the formatted day
+# and second are cached.
+class TimeConverter:
+    def __init__(self, timestamp=False, origtime=False):
+        self.timestamp = timestamp
+        self.origtime = origtime
+        self._day = None
+        self._daystr = None
+        self._sec = None
+        self._secval = None
+
+    # Split a time value into whole seconds and microseconds.
+    def split(self, value):
+        if isinstance(value, str):
+            sec, _, frac = value.partition(".")
+            # Up to 6 decimal places is exact, anything else takes the float path.
+            if len(frac) <= 6 and 0 < len(sec) <= 10 and sec.isdigit() and (frac == "" or frac.isdigit()):
+                return int(sec), int(frac.ljust(6, "0"))
+        return self.splitfloat(float(value))
+
+    # Split a float time value into whole seconds and microseconds, rounding like datetime does.
+    def splitfloat(self, value):
+        frac, whole = math.modf(value)
+        us = round(frac * 1e6)
+        if us >= 1000000:
+            whole += 1
+            us -= 1000000
+        elif us < 0:
+            whole -= 1
+            us += 1000000
+        return int(whole), us
+
+    # The value of a whole second in the output format.  This is cached since most rows share it.
+    def second(self, sec):
+        if sec != self._sec:
+            if not self.timestamp:
+                day, rem = divmod(sec, 86400)
+                if day != self._day:
+                    self._day = day
+                    self._daystr = (epoch + datetime.timedelta(days=day)).isoformat()
+                self._secval = "{}T{:02d}:{:02d}:{:02d}".format(self._daystr, rem // 3600, rem // 60 % 60, rem % 60)
+            else:
+                # The naive UTC time is turned into a timestamp as a local time, as it always has been.
+                self._secval = int((epochdatetime + datetime.timedelta(seconds=sec)).timestamp())
+            self._sec = sec
+        return self._secval
+
+    # Format whole seconds and microseconds in the output format.
+    def format(self, sec, us):
+        secval = self.second(sec)
+        if not self.timestamp:
+            if us == 0:
+                return secval
+            return "{}.{:06d}".format(secval, us)
+        if self.origtime:
+            return secval + us / 1e6
+        # ES uses ms
+        return (secval + us / 1e6)*1000
+
+    def __call__(self, value):
+        sec, us = self.split(value)
+        return self.format(sec, us)
+
+    # Convert a whole NumPy array of float times at once.
+    def convertarray(self, values):
+        frac, whole = numpy.modf(values)
+        us = numpy.rint(frac * 1e6)
+        whole = numpy.where(us >= 1000000, whole + 1, numpy.where(us < 0, whole - 1, whole))
+        us = numpy.where(us >= 1000000, us - 1000000, numpy.where(us < 0, us + 1000000, us))
+        fmt = self.format
+        return [fmt(sec, u) for sec, u in zip(whole.astype(numpy.int64).tolist(), us.astype(numpy.int64).tolist())]
+
+    # Convert a list of time values, using NumPy if it is available.
+    def convertbatch(self, values):
+        if numpy is not None:
+            try:
+                return self.convertarray(numpy.array(values).astype(numpy.float64))
+            except (ValueError, OverflowError):
+                pass
+        return [self(v) for v in values]
+
+    # The UTC date of a time value.
+    def date(self, value):
+        return epoch + datetime.timedelta(days=self.split(value)[0] // 86400)
+
+# A function to convert a Zeek bool.
+def zeekbool(col):
+    return col == "T"
+
+# A function to compile the Zeek fields and types into a conversion plan.  Every kept column
+# gets a (column index, field name, converter, Zeek type) entry, and columns that are not
+# in the output fields are dropped up front.
+def compileplan(fields, types, outputfields, timeconv, set_separator=","):
+    plan = []
+    for i in range(min(len(fields), len(types))):
+        if len(outputfields) > 0 and fields[i] not in outputfields:
+            continue
+        if types[i] == "time":
+            conv = timeconv
+        elif types[i] == "interval" or types[i] == "double":
+            conv = float
+        elif types[i] == "bool":
+            conv = zeekbool
+        elif types[i] == "port" or types[i] == "count" or types[i] == "int":
+            conv = int
+        elif types[i].startswith("vector") or types[i].startswith("set"):
+            conv = methodcaller("split", set_separator)
+        else:
+            conv = str
+        plan.append((i, fields[i], conv, types[i]))
+    return plan
+
+# A function to convert a whole column with NumPy.  Returns the values and a list that is
+# True where the value is unset or empty, or None if the column cannot be converted this way.
+def numpycolumn(col, ztype, nulls, conv):
+    a = numpy.array(col)
+    mask = numpy.isin(a, nulls)
+    a[mask] = "0"
+    try:
+        if ztype == "interval" or ztype == "double":
+            values = a.astype(numpy.float64).tolist()
+        elif ztype == "port" or ztype == "count":
+            values = a.astype(numpy.uint64).tolist()
+        elif ztype == "int":
+            values = a.astype(numpy.int64).tolist()
+        elif ztype == "bool":
+            values = (a == "T").tolist()
+        elif ztype == "time":
+            values = conv.convertarray(a.astype(numpy.float64))
+        else:
+            return None, None
+    except (ValueError, OverflowError):
+        return None, None
+    return values, mask.tolist()
+
+# A function to get the Arrow type of a Zeek type for --outformat.  Anything not numeric, a time or a bool is a string.
+def arrowtype(ztype):
+    if ztype.startswith("vector[") or ztype.startswith("set["):
+        return pyarrow.list_(arrowtype(ztype[ztype.index("[") + 1:-1]))
+    if ztype == "time":
+        return pyarrow.timestamp("us", tz="UTC")
+    if ztype == "count" or ztype == "port":
+        return pyarrow.uint64()
+    if ztype == "int":
+        return pyarrow.int64()
+    if ztype == "interval" or ztype == "double":
+        return pyarrow.float64()
+    if ztype == "bool":
+        return pyarrow.bool_()
+    return pyarrow.string()
+
+# A function to convert a column of TSV values into an Arrow array.  The values are cast by Arrow, and
+# the elements of vectors and sets are converted as a column of their own.
+def arrowcolumn(col, ztype, nulls, set_separator=","):
+    if ztype.startswith("vector[") or ztype.startswith("set["):
+        lists = pyarrow.array([None if c in nulls else c.split(set_separator) for c in col], pyarrow.list_(pyarrow.string()))
+        values = arrowcolumn(lists.flatten().to_pylist(), ztype[ztype.index("[") + 1:-1], nulls, set_separator)
+        return pyarrow.ListArray.from_arrays(lists.offsets, values, mask=lists.is_null())
+    if ztype == "bool":
+        return pyarrow.array([None if c in nulls else c == "T" for c in col], pyarrow.bool_())
+    strings = pyarrow.array([None if c in nulls else c for c in col], pyarrow.string())
+    if ztype == "time":
+        # Times are seconds with six decimals, rounded to whole microseconds.
+        micros = pyarrow.compute.round(pyarrow.compute.multiply(strings.cast(pyarrow.float64()), 1e6))
+        return micros.cast(pyarrow.int64()).cast(arrowtype(ztype))
+    return strings.cast(arrowtype(ztype))
+
+# A function to convert TSV rows into an Arrow table with the columns of a conversion plan.
+def arrowtable(plan, rows, nulls, set_separator=","):
+    columns = [arrowcolumn([row[i] if i < len(row) else "" for row in rows], ztype, nulls, set_separator) for i, name, conv, ztype in plan]
+    return pyarrow.Table.from_arrays(columns, names=[name for i, name, conv, ztype in plan])
+
+# A function to convert a block of TSV rows at once, a column at a time.
+def convertblock(plan, rows, nulls, base):
+    docs = [base.copy() for _ in rows]
+    nulllist = list(nulls)
+    for i, name, conv, ztype in plan:
+        col = [row[i] if i < len(row) else "" for row in rows]
+        values, mask = numpycolumn(col, ztype, nulllist, conv)
+        if values is None:
+            for d, c in zip(docs, col):
+                if c not in nulls:
+                    d[name] = conv(c)
+        else:
+            for d, v, m in zip(docs, values, mask):
+                if not m:
+                    d[name] = v
+    return docs
+
+# A generator to convert TSV rows into dicts using a conversion plan.  Every dict starts as a copy of base.
+def tsvdocs(plan, rows, nulls, base, usenumpy=False):
+    if usenumpy:
+        while True:
+            block = list(itertools.islice(rows, numpyblock))
+            if len(block) == 0:
+                return
+            yield from convertblock(plan, block, nulls, base)
+    else:
+        ncols = plan[-1][0] + 1 if len(plan) > 0 else 0
+        for row in rows:
+            # Short rows are padded with empty values.
+            if len(row) < ncols:
+                row += [""] * (ncols - len(row))
+            d = base.copy()
+            for i, name, conv, ztype in plan:
+                col = row[i]
+                if col not in nulls:
+                    d[name] = conv(col)
+            yield d
+
+# This looks up IPs in a MaxMind database for --geoip, giving what the geoip processor of the ingest pipeline would add
+# to a document.  The database is mapped into memory, and lookups are cached, since flows repeat the same IPs a lot.
+class GeoIP:
+    def __init__(self, filename, cachesize=65536):
+        self.reader = maxminddb.open_database(filename, maxminddb.MODE_MMAP)
+        self.asn = "ASN" in self.reader.metadata().database_type
+        self.lookup = functools.lru_cache(maxsize=cachesize)(self.find)
+
+    def __call__(self, ip):
+        return self.lookup(ip)
+
+    # Look up an IP, returning None if it is not in the database.
+    def find(self, ip):
+        try:
+            record, prefix = self.reader.get_with_prefix_len(ip)
+        except ValueError:
+            return None
+        if not isinstance(record, dict):
+            return None
+        if self.asn:
+            geo = dict(asn=record.get("autonomous_system_number"), organization_name=record.get("autonomous_system_organization"),
+                       network=str(ipaddress.ip_network("{}/{}".format(ip, prefix), strict=False)))
+        else:
+            country = record.get("country", {})
+            geo = dict(continent_name=geoname(record.get("continent")), country_iso_code=country.get("iso_code"),
+                       country_name=geoname(country))
+            if len(record.get("subdivisions", [])) > 0:
+                region = record["subdivisions"][0]
+                if "iso_code" in country and "iso_code" in region:
+                    geo["region_iso_code"] = "{}-{}".format(country["iso_code"], region["iso_code"])
+                geo["region_name"] = geoname(region)
+            geo["city_name"] = geoname(record.get("city"))
+            location = record.get("location", {})
+            if "latitude" in location and "longitude" in location:
+                geo["location"] = dict(lat=location["latitude"], lon=location["longitude"])
+        geo = {k: v for k, v in geo.items() if v is not None}
+        return geo if len(geo) > 0 else None
+
+# A function to get the English name of a place in a MaxMind record.
+def geoname(place):
+    return place.get("names", {}).get("en") if place is not None else None
+
+# The GeoIP databases opened in this process.
+geoipreaders = {}
+
+# A function to get the GeoIP database for our arguments.
+def geoipreader(args):
+    key = (args['geoip'], args['geoipcache'])
+    if key not in geoipreaders:
+        geoipreaders[key] = GeoIP(args['geoip'], args['geoipcache'])
+    return geoipreaders[key]
+
+# A function to build the ingest pipeline for our arguments.  It has no processors if we are not using one.
+def buildpipeline(args):
     ingest_pipeline = {"description": "Zeek Log Ingestion Pipeline.", "processors": [ ]}
 
     if args['ingestion']:
@@ -234,383 +1787,2227 @@ def main(**args):
         ingest_pipeline["processors"] += [{"geoip": {"field": "id.orig_h", "target_field": "geoip_orig", "ignore_missing": True}}]
         ingest_pipeline["processors"] += [{"geoip": {"field": "id.resp_h", "target_field": "geoip_resp", "ignore_missing": True}}]
 
-    # This section takes care of TSV logs.  Skip ahead for the JSON logic.
-    if not args['jsonlogs']:
-        # Get the date
-
-        zcat_process = subprocess.Popen(zcat_name+[filename], 
-                                        stdout=subprocess.PIPE)
+    return ingest_pipeline
 
-        head_process = subprocess.Popen(['head'], 
-                                        stdin=zcat_process.stdout,
-                                        stdout=subprocess.PIPE)
-
-        grep_process = subprocess.Popen(['grep', '#open'], 
-                                        stdin=head_process.stdout,
-                                        stdout=subprocess.PIPE)
+# A function to build the ES index name for a TSV log.
+def indexname(args, zeek_log_path, log_date):
+    if not args['esindex']:
+        if args['datastream'] > 0:
+            es_index = "logs-zeek-{}".format(zeek_log_path)
+        else:
+            sysname = ""
+            if (len(args['name']) > 0):
+                sysname = "{}_".format(args['name'])
+            # We allow for hashes instead of dates in the index name.
+            if not args['hashdates']:
+                es_index = "zeek_"+sysname+"{}_{}".format(zeek_log_path, log_date.date())
+            else:
+                es_index = "zeek_"+sysname+"{}_{}".format(zeek_log_path, random.getrandbits(hashbits))
+    else:
+        es_index = args['esindex']
 
-        try:
-            log_date = datetime.datetime.strptime(grep_process.communicate()[0].decode('UTF-8').strip().split('\t')[1], "%Y-%m-%d-%H-%M-%S")
-        except:
-            if not args['supresswarnings']:
-                print("Date not found from Zeek log! {}".format(filename))
-            exit(-4)
+    return es_index.replace(':', '_').replace("/", "_")
 
-        # Get the Zeek log path
+# A function to guess the Zeek log path of a JSON log from its file name, since the JSON logs do not include it.
+# It returns None if it cannot be found.
+def jsonlogpath(filename):
+    m = re.search(r".*/([^\._]+).*", filename)
+    return m.group(1).lower() if m is not None else None
 
-        zcat_process = subprocess.Popen(zcat_name+[filename], 
-                                        stdout=subprocess.PIPE)
+# A function to build the ES index name for a JSON log, from the time of its first document.
+def jsonindexname(args, zeek_log_path, rawts):
+    sysname = ""
+    if (len(args['name']) > 0):
+        sysname = "{}_".format(args['name'])
 
-        head_process = subprocess.Popen(['head'], 
-                                        stdin=zcat_process.stdout,
-                                        stdout=subprocess.PIPE)
+    # We allow for hashes instead of dates in our index name.
+    if not args['hashdates']:
+        es_index = "zeek_{}{}_{}".format(sysname, zeek_log_path, TimeConverter().date(rawts))
+    else:
+        es_index = "zeek_{}{}_{}".format(sysname, zeek_log_path, random.getrandbits(hashbits))
+
+    return es_index.replace(':', '_').replace("/", "_")
+
+# A function to build the mappings for a JSON log.
+def jsonmappings():
+    mappings = {"mappings": {"properties": dict(ts=dict(type="date"), geoip_orig=dict(properties=dict(location=dict(type="geo_point"))),
+                                                                             geoip_resp=dict(properties=dict(location=dict(type="geo_point"))))}}
+    mappings["mappings"]["properties"]["id.orig_h"] = {"type": "ip"}
+    mappings["mappings"]["properties"]["id.resp_h"] = {"type": "ip"}
+    return mappings
+
+# A function to build the mappings for a TSV log.
+def tsvmappings(fields, types, keywords):
+    mappings = {"mappings": {"properties": dict(geoip_orig=dict(properties=dict(location=dict(type="geo_point"))), geoip_resp=dict(properties=dict(location=dict(type="geo_point"))))}}
+    addmappings(mappings["mappings"]["properties"], fields, types, keywords)
+    return mappings
+
+# The keys loaded for filtering in this process, so a worker loads each key file once.
+filterkeycache = {}
+
+# A key index file starts with this, a number to check the byte order with and the number of keys.
+keyindexmagic = b"Z2EKEYS1"
+keyindexorder = 0x0102030405060708
+keyindexheader = 24
+
+# About how many bytes of memory a key takes while a key index is built, to keep to --keymemory.
+keyindexkeybytes = 100
+
+# The number of keys read from or written to a key index file at a time.
+keyindexchunk = 65536
+
+# A function to hash a key into the 128 bit number a key index keeps for it.
+def keydigest(key):
+    if isinstance(key, str):
+        key = key.encode("UTF-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=16).digest(), "big")
+
+# This is a sorted array of 128 bit key digests, 16 bytes a key no matter how long the keys are.  The digests are
+# kept as pairs of 64 bit numbers, in memory or mapped from a key index file that all worker processes share.
+class KeyIndex:
+    def __init__(self, pairs):
+        self.high = pairs[0::2]
+        self.low = pairs[1::2]
+        self.n = len(self.high)
+
+    def __len__(self):
+        return self.n
+
+    def __contains__(self, key):
+        if not isinstance(key, (str, bytes)):
+            return False
+        digest = keydigest(key)
+        high, low = digest >> 64, digest & 0xffffffffffffffff
+        i = bisect.bisect_left(self.high, high)
+        while i < self.n and self.high[i] == high:
+            if self.low[i] == low:
+                return True
+            i += 1
+        return False
+
+# This builds a key index from keys added one at a time.  Keys are deduplicated in memory, and once there
+# are more than fit in the memory given in MB, they are sorted into a run in a temporary file and merged at the end.
+class KeyIndexBuilder:
+    def __init__(self, memory=256):
+        self.setmemory(memory)
+        self.keys = set()
+        self.runs = []
+
+    def setmemory(self, memory):
+        self.limit = max(1, memory * 1024 * 1024 // keyindexkeybytes)
+
+    def add(self, key):
+        self.keys.add(keydigest(key))
+        if len(self.keys) >= self.limit:
+            self.spill()
+
+    # Add the digests of an array of pairs from take().
+    def addpairs(self, pairs):
+        for i in range(0, len(pairs), 2):
+            self.keys.add((pairs[i] << 64) | pairs[i + 1])
+            if len(self.keys) >= self.limit:
+                self.spill()
+
+    # Write the keys so far to a run file, sorted.
+    def spill(self):
+        run = tempfile.TemporaryFile(prefix="zeek2es-keys-")
+        for pairs in chunkpairs(sorted(self.keys)):
+            pairs.tofile(run)
+        run.seek(0)
+        self.runs.append(run)
+        self.keys = set()
+
+    # The sorted, unique digests of all the keys.
+    def digests(self):
+        if len(self.runs) == 0:
+            return iter(sorted(self.keys))
+        if len(self.keys) > 0:
+            self.spill()
+        return uniquedigests(heapq.merge(*[readpairs(run) for run in self.runs]))
+
+    # Take the digests so far as a sorted array of pairs, which is small enough to hand to another process.
+    def take(self):
+        try:
+            pairs = array.array("Q")
+            for chunk in chunkpairs(self.digests()):
+                pairs.extend(chunk)
+            return pairs
+        finally:
+            self.clear()
+
+    # Build the index, in memory or written to a file that is then mapped.
+    def build(self, filename=""):
+        if len(filename) == 0:
+            return KeyIndex(memoryview(self.take()))
+        try:
+            n = 0
+            with open(filename + ".tmp", "wb") as f:
+                f.write(keyindexmagic + struct.pack("=QQ", keyindexorder, 0))
+                for pairs in chunkpairs(self.digests()):
+                    pairs.tofile(f)
+                    n += len(pairs) // 2
+                f.seek(len(keyindexmagic))
+                f.write(struct.pack("=QQ", keyindexorder, n))
+            os.replace(filename + ".tmp", filename)
+            return openkeyindex(filename)
+        finally:
+            self.clear()
+
+    # Forget the keys so far.
+    def clear(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.keys = set()
+
+# The keys of the primary logs of --correlate collected in this process.  Worker processes hand theirs back
+# with their results.
+correlatekeys = KeyIndexBuilder()
+
+# A function to cut sorted digests into arrays of 64 bit (high, low) pairs.
+def chunkpairs(digests):
+    pairs = array.array("Q")
+    for d in digests:
+        pairs.append(d >> 64)
+        pairs.append(d & 0xffffffffffffffff)
+        if len(pairs) >= 2 * keyindexchunk:
+            yield pairs
+            pairs = array.array("Q")
+    if len(pairs) > 0:
+        yield pairs
+
+# A function to drop the repeats from sorted digests.
+def uniquedigests(digests):
+    last = None
+    for d in digests:
+        if d != last:
+            yield d
+            last = d
+
+# A function to read the digests back from a run file.
+def readpairs(f):
+    while True:
+        data = f.read(16 * keyindexchunk)
+        if len(data) == 0:
+            return
+        pairs = array.array("Q")
+        pairs.frombytes(data)
+        for i in range(0, len(pairs), 2):
+            yield (pairs[i] << 64) | pairs[i + 1]
+
+# A function to map a key index file into memory.  The pages are shared with every process that maps it.
+def openkeyindex(filename):
+    with open(filename, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    order, n = struct.unpack("=QQ", mm[len(keyindexmagic):keyindexheader]) if len(mm) >= keyindexheader else (0, 0)
+    if mm[:len(keyindexmagic)] != keyindexmagic or order != keyindexorder or len(mm) != keyindexheader + 16 * n:
+        raise ValueError("{} is not a key index file for this machine".format(filename))
+    return KeyIndex(memoryview(mm)[keyindexheader:].cast("Q"))
+
+# A function to check if a file is a key index file.
+def iskeyindex(filename):
+    with open(filename, "rb") as f:
+        return f.read(len(keyindexmagic)) == keyindexmagic
+
+# A function to build a key index from a file of keys, one per line.
+def buildkeyindex(filename, outfile="", memory=256):
+    builder = KeyIndexBuilder(memory)
+    with open(filename, "rb") as infile:
+        for line in infile:
+            builder.add(line.rstrip(b"\r\n"))
+    return builder.build(outfile)
+
+# A function to load the keys from a file to use in a filter.  A key index file is mapped, and a file of keys
+# is built into a key index in memory.
+def loadfilterkeys(filename, memory=256):
+    if filename not in filterkeycache:
+        if iskeyindex(filename):
+            filterkeycache[filename] = openkeyindex(filename)
+        else:
+            filterkeycache[filename] = buildkeyindex(filename, memory=memory)
+    return filterkeycache[filename]
+
+# A function to ingest the primary logs of --correlate, collecting the keys of the documents kept from them, and
+# then the related logs, keeping only the documents with one of those keys.  The keys are mapped from a key index
+# file, so the worker processes share them.
+def correlatelogs(args, inputs):
+    field, related = args['correlate'][0], args['correlate'][1:]
+    primary = args['logtypes'] if len(args['logtypes']) > 0 else [t for t, files in findlogs(inputs) if t not in related]
+    correlatekeys.setmemory(args['keymemory'])
+    summary = ingestfiles(dict(args, logtypes=primary), inputs)
+
+    fd, keyfile = tempfile.mkstemp(prefix="zeek2es-keys-", suffix=".keyidx")
+    os.close(fd)
+    try:
+        keys = correlatekeys.build(keyfile)
+        if not args['supresswarnings']:
+            print("Collected {} {} keys from the primary logs.".format(len(keys), field), file=sys.stderr)
+        # The filters only pick the documents of the primary logs.
+        relatedargs = dict(args, logtypes=related, correlate=[], filterkeys=[field, keyfile], filter="", lambdafilter="", filterfile="")
+        summary += ingestfiles(relatedargs, inputs)
+    finally:
+        filterkeycache.pop(keyfile, None)
+        os.remove(keyfile)
+    return summary
+
+# A function to build the key index files of --keyindex, one next to every key file.
+def buildkeyindexes(args, inputs):
+    for filename in inputs:
+        start = time.time()
+        index = buildkeyindex(filename, filename + ".keyidx", args['keymemory'])
+        if not args['supresswarnings']:
+            print("Wrote {} keys to {}.keyidx in {:.1f} seconds.".format(len(index), filename, time.time() - start), file=sys.stderr)
+
+# The filter language of --filter.  An expression compares fields to values, like
+#   service == dns and id.resp_p in {53, 5353} and not id.orig_h in 10.0.0.0/8
+# with ==, !=, <, <=, > and >=, set and CIDR membership with in, and, or, not and parentheses.
+# Values are numbers, words or quoted strings.  Unset fields only match !=.
+filtertoken = re.compile(r'\s*(?:([(){}\[\],]|==|!=|<=|>=|<|>)|"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'|([^\s(){}\[\],=!<>"\']+))\s*')
+
+# A function to split a filter expression into (kind, text) tokens.
+def tokenizefilter(expr):
+    tokens = []
+    pos = 0
+    while pos < len(expr):
+        m = filtertoken.match(expr, pos)
+        if m is None or m.end() == pos:
+            raise ValueError("cannot read the filter at: {}".format(expr[pos:]))
+        pos = m.end()
+        if m.group(1) is not None:
+            tokens.append(("op", m.group(1)))
+        elif m.group(2) is not None or m.group(3) is not None:
+            text = m.group(2) if m.group(2) is not None else m.group(3)
+            tokens.append(("str", re.sub(r"\\(.)", r"\1", text)))
+        else:
+            tokens.append(("word", m.group(4)))
+    return tokens
+
+# A function to parse a filter expression into a tree of tuples: ("or", a, b), ("and", a, b), ("not", a),
+# ("cmp", field, op, value) and ("in", field, values).
+def parsefilter(expr):
+    tokens = tokenizefilter(expr)
+    pos = [0]
+
+    def peek():
+        return tokens[pos[0]] if pos[0] < len(tokens) else (None, None)
+
+    def take(kind=None, text=None):
+        tok = peek()
+        if tok[0] is None or (kind is not None and tok[0] != kind) or (text is not None and tok[1] != text):
+            expected = text or {"word": "a field", "op": "an operator"}.get(kind, "a value")
+            raise ValueError("expected {} but found {}".format(expected, tok[1] if tok[0] else "the end"))
+        pos[0] += 1
+        return tok
+
+    def keyword(word):
+        return peek() == ("word", word)
+
+    def value():
+        kind, text = take()
+        if kind == "op":
+            raise ValueError("expected a value but found {}".format(text))
+        if kind == "word":
+            for conv in (int, float):
+                try:
+                    return conv(text)
+                except ValueError:
+                    pass
+        return text
+
+    def orexpr():
+        node = andexpr()
+        while keyword("or"):
+            take()
+            node = ("or", node, andexpr())
+        return node
+
+    def andexpr():
+        node = notexpr()
+        while keyword("and"):
+            take()
+            node = ("and", node, notexpr())
+        return node
+
+    def notexpr():
+        if keyword("not"):
+            take()
+            return ("not", notexpr())
+        if peek() == ("op", "("):
+            take()
+            node = orexpr()
+            take("op", ")")
+            return node
+        field = take("word")[1]
+        if keyword("in"):
+            take()
+            if peek() in (("op", "{"), ("op", "[")):
+                close = "}" if take()[1] == "{" else "]"
+                values = [value()]
+                while peek() == ("op", ","):
+                    take()
+                    values.append(value())
+                take("op", close)
+            else:
+                values = [value()]
+            return ("in", field, values)
+        op = take("op")[1]
+        if op not in ("==", "!=", "<", "<=", ">", ">="):
+            raise ValueError("expected a comparison after {} but found {}".format(field, op))
+        return ("cmp", field, op, value())
+
+    node = orexpr()
+    if pos[0] != len(tokens):
+        raise ValueError("unexpected {}".format(tokens[pos[0]][1]))
+    return node
+
+# A function to split set membership values into CIDR networks and plain values.
+def filternetworks(values):
+    nets, plain = [], []
+    for v in values:
+        if isinstance(v, str) and "/" in v:
+            try:
+                nets.append(ipaddress.ip_network(v, strict=False))
+                continue
+            except ValueError:
+                pass
+        plain.append(v)
+    return nets, plain
+
+# A function to check if a raw value is an IP address in any of some networks.
+def ipin(value, nets):
+    try:
+        ip = ipaddress.ip_address(value)
+    except ValueError:
+        return False
+    return any(ip in n for n in nets)
+
+# A function to read a filter value as a bool, written the way Zeek writes them (T and F) or as true and false
+# in any case.  It returns None for values that are not bools.  Both filter compilers use it, so a filter keeps
+# the same rows of a TSV log and the JSON log of the same data.
+def filterbool(v):
+    if isinstance(v, str):
+        v = v.lower()
+        if v in ("t", "true"):
+            return True
+        if v in ("f", "false"):
+            return False
+    return None
+
+# A function to turn a filter tree into the source of a Python expression, with leaf making the source
+# for every comparison.  Values the expression needs are put in consts.
+def filtersource(node, leaf, consts):
+    if node[0] == "or" or node[0] == "and":
+        return "({} {} {})".format(filtersource(node[1], leaf, consts), node[0], filtersource(node[2], leaf, consts))
+    if node[0] == "not":
+        return "(not {})".format(filtersource(node[1], leaf, consts))
+    return leaf(node, consts)
+
+# A function to add a value to the constants of a compiled filter, returning its name.
+def filterconst(consts, value):
+    consts["c{}".format(len(consts))] = value
+    return "c{}".format(len(consts) - 1)
+
+# A function to compile a filter tree against the fields and types of a TSV header.  The filter takes a
+# row of raw strings, so rows are kept or dropped before they are converted.  Numbers are only converted
+# for <, <=, > and >=, and for comparisons with double, interval and time fields.
+def compiletsvfilter(node, fields, types, set_separator, nulls):
+    consts = dict(ipin=ipin, N=nulls, SEP=set_separator)
+    ncols = [0]
+
+    def leaf(node, consts):
+        field = node[1]
+        if field not in fields:
+            # Fields that are not in the log are unset.
+            return "True" if node[0] == "cmp" and node[2] == "!=" else "False"
+        i = fields.index(field)
+        ncols[0] = max(ncols[0], i + 1)
+        t = types[i]
+        container = t.startswith("set") or t.startswith("vector")
+        if container:
+            t = t[t.index("[")+1:-1]
+        integer = t in ("count", "int", "port")
+        number = integer or t in ("double", "interval", "time")
+
+        # A raw value as the type of the field, or a string for strings.
+        def raw(v):
+            b = filterbool(v) if t == "bool" else None
+            if b is not None:
+                return "T" if b else "F"
+            return str(v)
+
+        # The source to test one raw value x.
+        def test(x):
+            if node[0] == "in":
+                nets, plain = filternetworks(node[2]) if t in ("addr", "subnet") else ([], node[2])
+                parts = []
+                if len(plain) > 0:
+                    if number and not integer:
+                        floats = set()
+                        for v in plain:
+                            if isinstance(v, (int, float)):
+                                floats.add(float(v))
+                        parts.append("({0} not in N and float({0}) in {1})".format(x, filterconst(consts, frozenset(floats))))
+                    else:
+                        parts.append("{} in {}".format(x, filterconst(consts, frozenset(raw(v) for v in plain))))
+                if len(nets) > 0:
+                    parts.append("ipin({}, {})".format(x, filterconst(consts, nets)))
+                return "({})".format(" or ".join(parts)) if len(parts) > 0 else "False"
+            op, v = node[2], node[3]
+            if op in ("==", "!=") and t in ("addr", "subnet") and isinstance(v, str) and "/" in v:
+                nets = filternetworks([v])[0]
+                if len(nets) > 0:
+                    return "{}ipin({}, {})".format("not " if op == "!=" else "", x, filterconst(consts, nets))
+            if number and isinstance(v, (int, float)) and (op not in ("==", "!=") or not integer or not isinstance(v, int)):
+                conv = "int" if integer and isinstance(v, int) else "float"
+                if op == "!=":
+                    return "({0} in N or {1}({0}) != {2})".format(x, conv, filterconst(consts, v))
+                return "({0} not in N and {1}({0}) {2} {3})".format(x, conv, op, filterconst(consts, v))
+            if op in ("==", "!="):
+                return "{} {} {}".format(x, op, filterconst(consts, raw(v)))
+            return "({0} not in N and {0} {1} {2})".format(x, op, filterconst(consts, raw(v)))
+
+        if container:
+            if node[0] == "cmp" and node[2] == "!=":
+                return "(r[{}] in N or all({} for e in r[{}].split(SEP)))".format(i, test("e"), i)
+            return "(r[{}] not in N and any({} for e in r[{}].split(SEP)))".format(i, test("e"), i)
+        return test("r[{}]".format(i))
+
+    source = filtersource(node, leaf, consts)
+    rowfilter = eval("lambda r: " + source, consts)
+    rowfilter.ncols = ncols[0]
+    return rowfilter
+
+# A function to compile a filter tree for the dicts of a JSON log, before their times are converted.
+def compilejsonfilter(node):
+    consts = {}
+
+    def leaf(node, consts):
+        field = node[1]
+        if node[0] == "in":
+            nets, plain = filternetworks(node[2])
+            plain = frozenset(plain)
+            bools = frozenset(b for b in map(filterbool, plain) if b is not None)
+
+            def test(x):
+                # Bools are only in the bool values, so true is not in {1}.
+                if isinstance(x, bool):
+                    return x in bools
+                return (x in plain) or (len(nets) > 0 and isinstance(x, str) and ipin(x, nets))
+        else:
+            op, v = node[2], node[3]
+            nets = filternetworks([v])[0] if isinstance(v, str) else []
+            b = filterbool(v)
+            compare = {"==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}[op]
+
+            def test(x):
+                if isinstance(x, bool):
+                    return compare(x, b) if b is not None else op == "!="
+                if len(nets) > 0 and op in ("==", "!=") and isinstance(x, str):
+                    return ipin(x, nets) == (op == "==")
+                try:
+                    return compare(x, v)
+                except TypeError:
+                    return False
+
+        def match(x):
+            if x is None:
+                return node[0] == "cmp" and node[2] == "!="
+            if isinstance(x, list):
+                if node[0] == "cmp" and node[2] == "!=":
+                    return all(test(e) for e in x)
+                return any(test(e) for e in x)
+            return test(x)
+
+        return "{}(d.get({}))".format(filterconst(consts, match), filterconst(consts, field))
+
+    return eval("lambda d: " + filtersource(node, leaf, consts), consts)
+
+# The number of HyperLogLog registers of a distinct count is 2 to this power, for about 3% error.
+distinctbits = 10
+
+# The number of distinct values counted exactly before a distinct count turns into registers.
+distinctsparse = 64
+
+# This estimates the number of distinct values it is given with a HyperLogLog sketch.  The first values are
+# kept as hashes and counted exactly, so the many groups with few values do not each need the registers.
+class DistinctCounter:
+    def __init__(self):
+        self.hashes = set()
+        self.registers = None
+
+    def add(self, value):
+        h = int.from_bytes(hashlib.blake2b(str(value).encode("UTF-8"), digest_size=8).digest(), "big")
+        if self.registers is None:
+            self.hashes.add(h)
+            if len(self.hashes) <= distinctsparse:
+                return
+            self.registers = bytearray(1 << distinctbits)
+            for old in self.hashes:
+                self.register(old)
+            self.hashes = None
+        else:
+            self.register(h)
+
+    # Keep the longest run of leading zeros after the register bits, plus one, in the register of a hash.
+    def register(self, h):
+        i = h >> (64 - distinctbits)
+        rank = 64 - distinctbits - (h & ((1 << (64 - distinctbits)) - 1)).bit_length() + 1
+        if rank > self.registers[i]:
+            self.registers[i] = rank
+
+    def count(self):
+        if self.registers is None:
+            return len(self.hashes)
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Small counts are better estimated from the empty registers.
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+# This sums up documents for --rollup by buckets of --rollupinterval seconds and the values of the --rollup fields.
+# Every group counts its documents, sums the --rollupfields and keeps their minimum and maximum, and counts the
+# distinct values of the --rollupdistinct fields.  A bucket is summarized once documents are two buckets past it,
+# and everything is summarized when there are more than --rollupgroups groups, so memory stays bounded.  A group
+# summarized early gets more than one summary.  Those still add up in ES, apart from their distinct counts.
+class Rollup:
+    def __init__(self, args, timeconv):
+        self.keys = args['rollup']
+        self.fields = args['rollupfields'] if len(args['rollupfields']) > 0 else []
+        self.distinct = args['rollupdistinct'] if len(args['rollupdistinct']) > 0 else []
+        self.interval = max(1, args['rollupinterval'])
+        self.limit = args['rollupgroups']
+        self.timeconv = timeconv
+        self.buckets = {}
+        self.groups = 0
+        self.latest = None
+
+    # Add a document with a time of sec seconds.  Returns True when there are summaries ready to take.
+    def add(self, d, sec):
+        bucket = sec - sec % self.interval
+        if self.latest is None or bucket > self.latest:
+            self.latest = bucket
+        groups = self.buckets.get(bucket)
+        if groups is None:
+            groups = self.buckets[bucket] = {}
+        key = tuple(tuple(v) if isinstance(v, list) else v for v in (d.get(k) for k in self.keys))
+        # A group is its count, then the sum, minimum and maximum of every field, then the distinct counters.
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = [0, [0] * len(self.fields), [None] * len(self.fields), [None] * len(self.fields),
+                               [DistinctCounter() for _ in self.distinct]]
+            self.groups += 1
+        g[0] += 1
+        for j, f in enumerate(self.fields):
+            v = d.get(f)
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                g[1][j] += v
+                if g[2][j] is None or v < g[2][j]:
+                    g[2][j] = v
+                if g[3][j] is None or v > g[3][j]:
+                    g[3][j] = v
+        for j, f in enumerate(self.distinct):
+            v = d.get(f)
+            if v is not None:
+                g[4][j].add(v)
+        # Only two buckets can be within a bucket of the latest, so a third one is ready.
+        return len(self.buckets) > 2 or self.groups > self.limit
+
+    # Take the summaries of the buckets that are ready, or of everything.
+    def take(self, final=False):
+        if final or self.groups > self.limit:
+            ready = sorted(self.buckets)
+        else:
+            ready = sorted(b for b in self.buckets if b < self.latest - self.interval)
+        summaries = []
+        for bucket in ready:
+            groups = self.buckets.pop(bucket)
+            self.groups -= len(groups)
+            ts = self.timeconv.format(bucket, 0)
+            for key, g in groups.items():
+                d = dict(ts=ts, rollup_interval=self.interval, count=g[0])
+                for k, v in zip(self.keys, key):
+                    if v is not None:
+                        d[k] = list(v) if isinstance(v, tuple) else v
+                for j, f in enumerate(self.fields):
+                    if g[2][j] is not None:
+                        d[f + "_sum"], d[f + "_min"], d[f + "_max"] = g[1][j], g[2][j], g[3][j]
+                for j, f in enumerate(self.distinct):
+                    d[f + "_distinct"] = g[4][j].count()
+                d["@timestamp"] = ts
+                summaries.append(d)
+        return summaries
+
+# A function to build the mappings of the --rollup summaries.
+def rollupmappings(args):
+    properties = {"ts": {"type": "date"}, "@timestamp": {"type": "date"}, "count": {"type": "long"}, "rollup_interval": {"type": "long"}}
+    for k in args['rollup']:
+        properties[k] = {"type": "keyword"}
+    for f in args['rollupfields']:
+        for stat in ("sum", "min", "max"):
+            properties[f + "_" + stat] = {"type": "double"}
+    for f in args['rollupdistinct']:
+        properties[f + "_distinct"] = {"type": "long"}
+    return {"mappings": {"properties": properties}}
+
+# This holds the setup every document of a log goes through on its way out: the output fields,
+# the key filter, the Python filter, the key logging, the time format and the serializer.
+class LogProcessor:
+    def __init__(self, args, filename, sender):
+        self.args = args
+        self.filename = filename
+        self.sender = sender
+        self.items = 0
+        self.putmapping = False
+        self.putpipeline = False
+        self.es_index = ""
+        self.bulk = None
+
+        # The identity of the log and the current line, for --ids, and the lines sent, for --checkpoint.
+        self.fileid = None
+        self.progress = None
+        self.line = 0
+
+        # Takes care of the fields we want to output, if not all.
+        self.outputfields = []
+        if (len(args['outputfields']) > 0):
+            self.outputfields = args['outputfields']
+
+        # Takes care of logging keys to a file.
+        self.logkeyfields = []
+        self.logkeys_fds = []
+        if (len(args['logkey']) > 0):
+            for lk in args['logkey']:
+                thefield, thefile = lk[0], lk[1]
+                f = open(thefile, "a+")
+                self.logkeyfields.append(thefield)
+                self.logkeys_fds.append(f)
+
+        # Takes care of collecting keys from the primary logs of --correlate.
+        self.correlatefield = None
+        if len(args['correlate']) > 0:
+            self.correlatefield = args['correlate'][0]
+            correlatekeys.setmemory(args['keymemory'])
+
+        # Takes care of loading keys from a file to use in a filter.
+        self.filterkeys = set()
+        self.filterkeys_field = None
+        if (len(args['filterkeys']) > 0):
+            self.filterkeys_field = args['filterkeys'][0]
+            self.filterkeys = loadfilterkeys(args['filterkeys'][1], args['keymemory'])
+
+        # This takes care of fields where we want to add the keyword field.
+        self.keywords = []
+        if (len(args['keywords']) > 0):
+            self.keywords = args['keywords']
+
+        # This takes care of loading the Python filters.
+        self.filterfilter = None
+        if len(args['lambdafilter']) > 0:
+            self.filterfilter = eval(args['lambdafilter'])
+
+        if len(args['filterfile']) > 0:
+            with open(args['filterfile'], "r") as ff:
+                self.filterfilter = eval(ff.read())
+
+        # This takes care of the filter expression, which is compiled for the fields of every log.
+        self.filtertree = parsefilter(args['filter']) if len(args['filter']) > 0 else None
+
+        # This converts Zeek times into the output time format.
+        self.timeconv = TimeConverter(args['timestamp'], args['origtime'])
+
+        # This takes care of summing documents up for --rollup, which are sent to their own index.
+        self.rollup = Rollup(args, self.timeconv) if len(args['rollup']) > 0 else None
+        self.rollupbulk = None
+        self.rollupindex = ""
+
+        # Setup the ingest pipeline
+        self.ingest_pipeline = buildpipeline(args)
+
+        # The bulk action lines name the pipeline, if there is one.
+        self.pipeline = "zeekgeoip" if len(self.ingest_pipeline["processors"]) > 0 else None
+
+        # This takes care of splitting fields and locating IPs in the client with --geoip, instead of the ingest pipeline.
+        self.geoip = None
+        self.splitfields = []
+        if len(args['geoip']) > 0:
+            self.geoip = geoipreader(args)
+            self.splitfields = ["service"] + list(args['splitfields'])
+
+        # This serializes the output documents.
+        self.dumps = jsonserializer(args['serializer'])
+
+        # This decides when the documents so far are sent.
+        batchsize.setup(args)
+
+        # With stats, the filters and sending are timed as stages.  Turning rows into documents is timed
+        # as serializing, apart from the stages timed inside it.
+        if metrics.timing:
+            if hasattr(self, "addrows"):
+                self.addrows = metrics.timed(self.addrows, "serialize")
+            if hasattr(self, "addlines"):
+                self.addlines = metrics.timed(self.addlines, "serialize")
+            if self.filterfilter is not None or self.filterkeys_field is not None:
+                self.keep = metrics.timed(self.keep, "filter")
+            if self.geoip is not None:
+                self.enrich = metrics.timed(self.enrich, "convert")
+            self.sendbatch = metrics.timed(self.sendbatch, "send")
+
+    # Check a document against the key filter and the Python filter.
+    def keep(self, d):
+        # If the filter keys are used we make sure our key exists.  A list of keys needs one of them.
+        if self.filterkeys_field:
+            value = d.get(self.filterkeys_field)
+            if isinstance(value, list):
+                if not any(v in self.filterkeys for v in value):
+                    return False
+            elif value not in self.filterkeys:
+                return False
+        # This is the Python function filtering logic.
+        if self.filterfilter:
+            output = list(filter(self.filterfilter, [d]))
+            if len(output) == 0:
+                return False
+        return True
+
+    # Split fields at commas and add the locations of the IPs, the way the ingest pipeline of -g does.
+    def enrich(self, d):
+        for f in self.splitfields:
+            if isinstance(d.get(f), str):
+                d[f] = d[f].split(",")
+        for field, target in (("id.orig_h", "geoip_orig"), ("id.resp_h", "geoip_resp")):
+            if field in d:
+                geo = self.geoip(d[field])
+                if geo is not None:
+                    d[target] = geo
+
+    # Log the keys of a document to a file, if desired.
+    def logkeys(self, d):
+        i = 0
+        for lkf in self.logkeyfields:
+            lkfd = self.logkeys_fds[i]
+            if lkf in d:
+                if isinstance(d[lkf], list):
+                    for z in d[lkf]:
+                        lkfd.write(z)
+                        lkfd.write("\n")
+                else:
+                    lkfd.write(d[lkf])
+                    lkfd.write("\n")
+            i += 1
+        # The keys of the primary logs of --correlate are collected too.
+        if self.correlatefield is not None:
+            value = d.get(self.correlatefield)
+            for v in (value if isinstance(value, list) else [value]):
+                if isinstance(v, str):
+                    correlatekeys.add(v)
+
+    # If we aren't using stdout, prepare the ES index and the pipeline.
+    def prepare(self, es_index, mappings):
+        if not self.args['stdout']:
+            if self.putmapping == False:
+                if es_index not in preparedindices:
+                    sendmappings(self.args, es_index, mappings)
+                self.putmapping = True
+            if self.putpipeline == False and self.pipeline:
+                sendpipeline(self.args, self.ingest_pipeline)
+                self.putpipeline = True
+
+    # Give documents ids from the log identity, and track the lines sent if progress is given.
+    def track(self, key, progress=None):
+        self.fileid = key
+        self.progress = progress
+
+    # The _id of the document from the current line, or None if documents do not get ids.
+    def docid(self):
+        if self.args['ids'] and self.fileid is not None:
+            return "{}-{}".format(self.fileid, self.line)
+        return None
+
+    # Send the documents so far, marking their lines as sent once they were.
+    def sendbatch(self):
+        done = self.progress.claim(self.line) if self.progress is not None else None
+        if self.bulk is not None and self.bulk.n != 0:
+            self.sender.send(self.bulk.take(), self.es_index, self.filename, done)
+        elif done is not None:
+            done()
+
+    # Add rollup summaries to their own bulk body, sending it every time we have enough.
+    def addsummaries(self, summaries):
+        if len(summaries) == 0:
+            return
+        if self.rollupbulk is None:
+            self.rollupindex = self.args['rollupindex'] if len(self.args['rollupindex']) > 0 else self.es_index + "_rollup"
+            self.rollupbulk = BulkBuffer(self.rollupindex, None, self.args['nobulk'], self.dumps)
+            if not self.args['stdout']:
+                mappings = rollupmappings(self.args)
+                if self.args['datastream'] > 0:
+                    senddatastream(self.args, self.rollupindex, mappings)
+                else:
+                    sendmappings(self.args, self.rollupindex, mappings)
+        for d in summaries:
+            d["zeek_log_path"] = self.zeek_log_path
+            self.rollupbulk.add(d)
+            self.items += 1
+            if batchsize.full(self.rollupbulk.n, len(self.rollupbulk)):
+                self.sender.send(self.rollupbulk.take(), self.rollupindex, self.filename)
+
+    # Send whatever is left.
+    def flush(self):
+        self.sendbatch()
+        if self.rollupbulk is not None and self.rollupbulk.n > 0:
+            self.sender.send(self.rollupbulk.take(), self.rollupindex, self.filename)
+        for lkfd in self.logkeys_fds:
+            lkfd.flush()
+
+    # Summarize what is left for --rollup and send everything, once there are no more rows to come.
+    def finish(self):
+        if self.rollup is not None:
+            self.addsummaries(self.rollup.take(final=True))
+        self.flush()
+
+    def close(self):
+        for lkfd in self.logkeys_fds:
+            lkfd.close()
+
+# This turns the rows of a TSV log into documents and sends them in bulk to one index.
+# It is used for whole logs, and for the parts of a log handed to worker processes.
+class TSVProcessor(LogProcessor):
+    def __init__(self, args, filename, sender, zeek_log_path, es_index, mappings):
+        super().__init__(args, filename, sender)
+        self.zeek_log_path = zeek_log_path
+        self.es_index = es_index
+        self.mappings = mappings
+        self.bulk = BulkBuffer(es_index, self.pipeline, args['nobulk'], self.dumps)
+        self.fields = None
+        self.types = None
+        self.newproperties = {}
+
+        # This is the dict every row starts with.
+        self.base = dict(zeek_log_filename=filename, zeek_log_path=zeek_log_path)
+        if (len(args['name']) > 0):
+            self.base["zeek_log_system_name"] = args['name']
+
+    # Pick up the fields and types of a block of rows from the reader.
+    def setschema(self, reader):
+        if reader.fields != self.fields or reader.types != self.types:
+            self.fields = reader.fields
+            self.types = reader.types
+            # Map any new fields, updating the index if the mappings were already sent.
+            properties = {}
+            addmappings(properties, self.fields, self.types, self.keywords)
+            properties = {k: v for k, v in properties.items() if k not in self.mappings["mappings"]["properties"]}
+            self.mappings["mappings"]["properties"].update(properties)
+            if self.putmapping and len(properties) > 0:
+                sendmappingupdate(self.args, self.es_index, properties)
+            elif len(properties) > 0:
+                # The index may already exist, so these are sent as an update once it is prepared.
+                self.newproperties.update(properties)
+
+        # Compile the conversion plan for this block.
+        self.plan = compileplan(self.fields, self.types, self.outputfields, self.timeconv, reader.set_separator)
+        self.nulls = frozenset([reader.unset_field, reader.empty_field, ""])
+
+        # Rollups need the time of a row as it was, so ts is converted after they see it.
+        if self.rollup is not None:
+            self.plan = [(i, name, str, "string") if name == "ts" else (i, name, conv, ztype) for i, name, conv, ztype in self.plan]
+
+        # Compile the filter expression for this block, so it can drop rows before they are converted.
+        self.rowfilter = None
+        if self.filtertree is not None:
+            self.rowfilter = compiletsvfilter(self.filtertree, self.fields, self.types, reader.set_separator, self.nulls)
+
+    # Yield the rows the filter expression keeps, queueing their line numbers.
+    def keptrows(self, rows, line, lines):
+        rowfilter = self.rowfilter
+        ncols = rowfilter.ncols
+        for row in rows:
+            # Short rows are padded with empty values.
+            if len(row) < ncols:
+                row += [""] * (ncols - len(row))
+            if rowfilter(row):
+                lines.append(line)
+                yield row
+            line += 1
+        self.lastline = line - 1
+
+    # Turn split rows into documents, sending them every time we have enough.  The rows
+    # are numbered from line, the number of the first one in the log.
+    def addrows(self, rows, line=1):
+        args = self.args
+        bulk = self.bulk
+        ids = args['ids'] and self.fileid is not None
+        items = self.items
+        self.line = line - 1
+        if metrics.timing:
+            rows = metrics.staged(rows, "parse")
+        # The filter expression drops rows before they are converted, so we keep the line numbers of the rest.
+        lines = None
+        if self.rowfilter is not None:
+            lines = collections.deque()
+            rows = self.keptrows(rows, line, lines)
+            if metrics.timing:
+                rows = metrics.staged(rows, "filter")
+        docs = tsvdocs(self.plan, rows, self.nulls, self.base, args['numpy'])
+        if metrics.timing:
+            docs = metrics.staged(docs, "convert")
+        # Iterate through every row in the TSV, converted into a dict.
+        for d in docs:
+            if lines is None:
+                self.line += 1
+            else:
+                self.line = lines.popleft()
+            if self.rollup is not None and "ts" in d:
+                sec = self.timeconv.split(d["ts"])[0]
+                d["ts"] = self.timeconv(d["ts"])
+            # Here we only add data if there is a timestamp.
+            if "ts" in d and self.keep(d):
+                self.logkeys(d)
+                if self.geoip is not None:
+                    self.enrich(d)
+                if self.rollup is not None:
+                    if self.rollup.add(d, sec):
+                        self.addsummaries(self.rollup.take())
+                    if not args['rollupraw']:
+                        continue
+
+                # Prepare the output and increment counters
+                if args['humio']:
+                    d['ts'] = d['ts'] + "Z"
+                    if "_write_ts" in d:
+                        d['_write_ts'] = d['_write_ts'] + "Z"
+                    else:
+                        d["_write_ts"] = d["ts"]
+                    if "_path" not in d:
+                        d["_path"] = self.zeek_log_path
+                    if (len(args['name'].strip()) > 0):
+                        d["_system_name"] = args['name'].strip()
+                d["@timestamp"] = d["ts"]
+                bulk.add(d, self.docid() if ids else None)
+                self.items += 1
+                self.prepare(self.es_index, self.mappings)
+
+            # Once we get more than "lines", or the bytes of a bulk request, we send it to ES
+            if batchsize.full(bulk.n, len(bulk)):
+                self.sendbatch()
+
+        # The rows after the last one kept were looked at too.
+        if lines is not None:
+            self.line = self.lastline
+        metrics.add(rows=self.line - line + 1, docs=self.items - items)
+
+    # Prepare the index, along with any fields found since the mappings were built.
+    def prepare(self, es_index, mappings):
+        if not self.args['stdout'] and self.putmapping == False and len(self.newproperties) > 0:
+            super().prepare(es_index, mappings)
+            sendmappingupdate(self.args, es_index, self.newproperties)
+            self.newproperties = {}
+        else:
+            super().prepare(es_index, mappings)
+
+# This writes the rows of a TSV log to Parquet or Arrow files with --outformat, typed from the #types header.
+# Rows are kept as they were read until there are -l of them, and then converted a column at a time.
+# Only the Python filters, keys and key logging need the rows as documents, which are then built as usual.
+class ColumnarProcessor(TSVProcessor):
+    def __init__(self, args, filename, sender, zeek_log_path, es_index, mappings):
+        super().__init__(args, filename, sender, zeek_log_path, es_index, mappings)
+        self.rows = []
+        self.set_separator = ","
+        self.needdocs = (self.filterfilter is not None or self.filterkeys_field is not None
+                         or len(self.logkeyfields) > 0 or self.correlatefield is not None)
+
+    # Write the rows of the last schema before taking a new one.
+    def setschema(self, reader):
+        if len(self.rows) > 0 and (reader.fields != self.fields or reader.types != self.types or reader.set_separator != self.set_separator):
+            self.sendbatch()
+        super().setschema(reader)
+        self.set_separator = reader.set_separator
+
+    # Keep the rows that pass the filters, writing them every time we have enough.  Rows are taken
+    # -l at a time, so only that many are held as documents when the filters need them.
+    def addrows(self, rows, line=1):
+        items = self.items
+        self.line = line - 1
+        if metrics.timing:
+            rows = metrics.staged(rows, "parse")
+        lines = None
+        if self.rowfilter is not None:
+            lines = collections.deque()
+            rows = self.keptrows(rows, line, lines)
+            if metrics.timing:
+                rows = metrics.staged(rows, "filter")
+        # Rows without a time are dropped, like they are from the documents.
+        tscol = next((i for i, name, conv, ztype in self.plan if name == "ts"), None)
+        while True:
+            block = list(itertools.islice(rows, max(self.args['lines'], 1)))
+            if len(block) == 0:
+                break
+            docs = itertools.repeat(None)
+            if self.needdocs:
+                docs = tsvdocs(self.plan, iter(block), self.nulls, self.base, self.args['numpy'])
+            for row, d in zip(block, docs):
+                if lines is None:
+                    self.line += 1
+                else:
+                    self.line = lines.popleft()
+                if d is not None:
+                    if "ts" not in d or not self.keep(d):
+                        continue
+                    self.logkeys(d)
+                elif tscol is None or tscol >= len(row) or row[tscol] in self.nulls:
+                    continue
+                self.rows.append(row)
+                self.items += 1
+                if len(self.rows) >= self.args['lines']:
+                    self.sendbatch()
+        if lines is not None:
+            self.line = self.lastline
+        metrics.add(rows=self.line - line + 1, docs=self.items - items)
+
+    # Nothing is set up in ES for files.
+    def prepare(self, es_index, mappings):
+        pass
+
+    # Write the rows so far as a table, marking their lines as done once they were.
+    def sendbatch(self):
+        done = self.progress.claim(self.line) if self.progress is not None else None
+        if len(self.rows) > 0:
+            self.sender.files.write(arrowtable(self.plan, self.rows, self.nulls, self.set_separator), self.es_index)
+            self.sender.stats.add(sent=len(self.rows))
+            self.rows = []
+        if done is not None:
+            done()
+
+# A function to get the processor class for TSV logs.
+def tsvprocessor(args):
+    return ColumnarProcessor if args['outformat'] != "ndjson" else TSVProcessor
+
+# This turns the lines of a JSON log into documents and sends them in bulk.  The index
+# is named when the first document with a timestamp is found.
+class JSONProcessor(LogProcessor):
+    def __init__(self, args, filename, sender):
+        super().__init__(args, filename, sender)
+        self.zeek_log_path = ""
+        self.putdatastream = False
+        self.docfilter = compilejsonfilter(self.filtertree) if self.filtertree is not None else None
+        self.loads = jsonparser(args['serializer'])
+
+        # Filters, key logging and the system name need whole documents.  Without them, lines only
+        # need their ts converted, which is spliced into their bytes unless the json serializer
+        # was asked for, and with -y only the output fields are decoded.
+        plain = (self.docfilter is None and self.filterfilter is None and self.filterkeys_field is None
+                 and len(self.logkeyfields) == 0 and self.correlatefield is None and self.geoip is None and self.rollup is None
+                 and len(args['name']) == 0)
+        self.splice = plain and len(self.outputfields) == 0 and args['serializer'] != "json"
+        self.projection = None
+        if plain and len(self.outputfields) > 0:
+            self.scan = json.JSONDecoder().scan_once
+            fields = [o for o in dict.fromkeys(["ts"] + list(self.outputfields)) if o != "@timestamp"]
+            self.projection = [(o, json.dumps(o) + ":") for o in fields]
+
+        # With stats, decoding is timed as parsing, and converting or splicing in the ts as converting.
+        self.convertts = self.timeconv
+        if metrics.timing:
+            self.convertts = metrics.timed(self.timeconv, "convert")
+            self.loads = metrics.timed(self.loads, "parse")
+            self.project = metrics.timed(self.project, "parse")
+            self.splicets = metrics.timed(self.splicets, "convert")
+            if self.docfilter is not None:
+                self.docfilter = metrics.timed(self.docfilter, "filter")
 
-        grep_process = subprocess.Popen(['grep', '#path'], 
-                                        stdin=head_process.stdout,
-                                        stdout=subprocess.PIPE)
+        # Put mappings
 
-        zeek_log_path = grep_process.communicate()[0].decode('UTF-8').strip().split('\t')[1]
+        self.mappings = jsonmappings()
+
+    # Name the index when the first document with a timestamp is found, and get it ready.
+    def setup(self, rawts):
+        # This happens when we go through this loop the first time and do not have an es_index name.
+        if self.es_index == "":
+            self.zeek_log_path = jsonlogpath(self.filename)
+            if self.zeek_log_path is None:
+                print("Log path cannot be found from filename: {}".format(self.filename))
+                exit(-5)
+            self.es_index = jsonindexname(self.args, self.zeek_log_path, rawts)
+            self.bulk = BulkBuffer(self.es_index, self.pipeline, self.args['nobulk'], self.dumps)
+
+        # If we are not sending the data to stdout, we prepare the ES index or datastream.
+        self.prepare(self.es_index, self.mappings)
+        if not self.args['stdout'] and self.args["datastream"] > 0 and self.putdatastream == False:
+            senddatastream(self.args, self.es_index, self.mappings)
+            self.putdatastream = True
+
+    # Decode only the output fields of a line.  Zeek writes flat objects with no space after a key, so
+    # a field is found by its quoted name and only its value is decoded.  Anything else decodes the whole line.
+    def project(self, line):
+        s = line.decode("UTF-8")
+        d = {}
+        try:
+            for o, key in self.projection:
+                i = s.find(key)
+                if i >= 0:
+                    d[o] = self.scan(s, i + len(key))[0]
+        except StopIteration:
+            return self.loads(line)
+        return d
+
+    # Add a line that only needs its ts converted.  The new ts is spliced into the bytes of the line,
+    # which start with the ts, and the line is never decoded or encoded again.
+    def splicets(self, line):
+        end = line.find(b",", 6)
+        if end < 0:
+            end = len(line) - 1
+        rawts = self.loads(line[6:end])
+        self.setup(rawts)
+        self.items += 1
+        ts = self.dumps(self.timeconv(rawts))
+        self.bulk.addraw(b"".join((b'{"ts":', ts, line[end:-1], b',"@timestamp":', ts, b"}")), self.docid())
+
+    # Turn lines into documents, sending them every time we have enough.  The lines are bytes,
+    # numbered from first, the number of the first one in the log.
+    def addlines(self, lines, first=1):
+        items = self.items
+        self.line = first - 1
+        if metrics.timing:
+            lines = metrics.staged(lines, "read")
+        for line in lines:
+            self.line += 1
+            if self.splice and line.startswith(b'{"ts":') and line.endswith(b"}"):
+                self.splicets(line)
+                # Here we output a set of lines to the ES server.
+                if batchsize.full(self.bulk.n, len(self.bulk)):
+                    self.sendbatch()
+                continue
 
-        # Build the ES index.
-        if not args['esindex']:
-            if args['datastream'] > 0:
-                es_index = "logs-zeek-{}".format(zeek_log_path)
+            # Load our data so we can process it.
+            if self.projection is not None:
+                j_data = self.project(line)
             else:
-                sysname = ""
-                if (len(args['name']) > 0):
-                    sysname = "{}_".format(args['name'])
-                # We allow for hashes instead of dates in the index name.
-                if not args['hashdates']:
-                    es_index = "zeek_"+sysname+"{}_{}".format(zeek_log_path, log_date.date())
-                else:
-                    es_index = "zeek_"+sysname+"{}_{}".format(zeek_log_path, random.getrandbits(hashbits))
-        else:
-            es_index = args['esindex']
+                j_data = self.loads(line)
 
-        es_index = es_index.replace(':', '_').replace("/", "_")
+            # The filter expression drops lines before anything else is done with them.
+            if self.docfilter is not None and not self.docfilter(j_data):
+                continue
 
-        # Get the Zeek fields from the log file.
+            # Only process data that has a timestamp field.
+            if "ts" in j_data:
+                # Here we deal with the time output format.
+                rawts = j_data["ts"]
+                j_data["ts"] = self.convertts(rawts)
+                self.setup(rawts)
 
-        zcat_process = subprocess.Popen(zcat_name+[filename], 
-                                        stdout=subprocess.PIPE)
+                # We add the system name, if desired.
+                if (len(self.args['name']) > 0):
+                    j_data["zeek_log_system_name"] = self.args['name']
+
+                # Here we are checking if the keys and the Python filters will filter the data in.
+                if self.keep(j_data):
+                    # We log the keys, if so desired.
+                    self.logkeys(j_data)
+
+                    # Rollups see the whole document, and the document itself is only sent if asked for.
+                    if self.rollup is not None:
+                        if self.rollup.add(j_data, self.timeconv.split(rawts)[0]):
+                            self.addsummaries(self.rollup.take())
+                        if not self.args['rollupraw']:
+                            continue
+                    self.items += 1
+
+                    j_data["@timestamp"] = j_data["ts"]
+                    # Here we only include the output fields identified via the command line.
+                    if len(self.outputfields) > 0:
+                        new_j_data = {}
+                        for o in self.outputfields:
+                            if o in j_data:
+                                new_j_data[o] = j_data[o]
+                        j_data = new_j_data
+                    if self.geoip is not None:
+                        self.enrich(j_data)
+                    self.bulk.add(j_data, self.docid())
 
-        head_process = subprocess.Popen(['head'], 
-                                        stdin=zcat_process.stdout,
-                                        stdout=subprocess.PIPE)
+                # Here we output a set of lines to the ES server.
+                if batchsize.full(self.bulk.n, len(self.bulk)):
+                    self.sendbatch()
+        metrics.add(rows=self.line - first + 1, docs=self.items - items)
+
+# A function to cut a buffer of log lines into the blocks of rows between header lines.  It returns a
+# list of (header, start, end) blocks and the header text so far, which carries over to the next buffer.
+# Every block gets all the header lines seen before it, so a worker can read the schema from it.
+def headerblocks(buf, header, start=0, end=None):
+    end = len(buf) if end is None else end
+    blocks = []
+    pos = start
+    while pos < end:
+        if buf[pos:pos+1] == b"#":
+            nl = buf.find(b"\n", pos, end)
+            nl = end if nl < 0 else nl + 1
+            header += bytes(buf[pos:nl]).decode("UTF-8")
+            pos = nl
+        else:
+            nl = buf.find(b"\n#", pos, end)
+            nl = end if nl < 0 else nl + 1
+            blocks.append((header, pos, nl))
+            pos = nl
+    return blocks, header
+
+# A function to split lines of text into rows.
+def splitrows(text, sep):
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return [line.split(sep) for line in lines]
+
+# Each worker process keeps one processor per file and header, so a block of rows
+# reuses the setup done for the last one.
+splitprocs = {}
+
+# A function run by a worker process to turn part of a log into documents and send them.
+# The part is a (start, end) range of an uncompressed log, or the bytes of some lines.
+def splitworker(task):
+    args, filename, setup, header, part, line, done, prepared = task
+    provisioned.update(done)
+    preparedindices.clear()
+    preparedindices.update(prepared)
+    metrics.timing = statson(args)
+    if (filename, header) not in splitprocs:
+        zeek_log_path, es_index, mappings, key = setup
+        reader = ZeekLogReader(filename, io.StringIO(header))
+        proc = tsvprocessor(args)(args, filename, BulkSender(args, 0), zeek_log_path, es_index, mappings)
+        proc.track(key)
+        proc.setschema(reader)
+        splitprocs[(filename, header)] = (proc, reader.separator)
+    proc, sep = splitprocs[(filename, header)]
+
+    if isinstance(part, bytes):
+        proc.addrows(splitrows(part.decode("UTF-8"), sep), line)
+    else:
+        # The range is read a piece at a time, cut at newlines.
+        start, end = part
+        with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            while start < end:
+                stop = mm.find(b"\n", min(start + splitchunk, end) - 1, end)
+                stop = end if stop < 0 else stop + 1
+                rows = splitrows(mm[start:stop].decode("UTF-8"), sep)
+                proc.addrows(rows, line)
+                line += len(rows)
+                start = stop
+    proc.finish()
+    # Bulk files are finished with every part, since a worker process is not told when it is done.
+    if proc.sender.files is not None:
+        proc.sender.files.close()
+
+    # Hand back what was done since the last part.
+    stats = proc.sender.stats
+    result = dict(items=proc.items, sent=stats.sent, retried=stats.retried, dropped=stats.dropped, metrics=metrics.take(), keys=correlatekeys.take())
+    proc.items = 0
+    stats.sent, stats.retried, stats.dropped = 0, 0, 0
+    return result
+
+# A function to read a compressed log in a thread, putting blocks of lines on a queue until the end.
+# Every block goes with the numbers of its first and last lines.  The first lines can be skipped.
+def readlogparts(filename, parts, stop, skip=0):
+    try:
+        with openlog(filename) as f:
+            header = skiplines(f, skip)
+            line = skip
+            while not stop.is_set():
+                data = b"".join(f.readlines(splitchunk))
+                if len(data) == 0:
+                    break
+                blocks, header = headerblocks(data, header)
+                pos = 0
+                for h, start, end in blocks:
+                    line += data.count(b"\n", pos, start)
+                    first = line + 1
+                    line += data.count(b"\n", start, end)
+                    parts.put((h, data[start:end], first, line))
+                    pos = end
+                line += data.count(b"\n", pos)
+    except Exception as exc:
+        parts.put(exc)
+    parts.put(None)
+
+# A function to count the lines in part of a buffer, a piece at a time.
+def countlines(buf, start, end):
+    n = 0
+    for i in range(start, end, splitchunk):
+        n += buf[i:min(i + splitchunk, end)].count(b"\n")
+    return n
+
+# A function to find where the line after the first n lines from start begins in a buffer.
+def skipbuffer(buf, start, end, n):
+    while n > 0 and start < end:
+        piece = buf[start:min(start + splitchunk, end)]
+        count = piece.count(b"\n")
+        if count >= n:
+            pos = 0
+            for _ in range(n):
+                pos = piece.index(b"\n", pos) + 1
+            return start + pos
+        start += len(piece)
+        n -= count
+    return start
+
+# A function to split the rows of one TSV log across worker processes.  Each worker converts
+# its rows and sends its own bulk bodies.  The totals are added to the processor and its sender,
+# and the lines of every part are marked as sent once its worker is done.  The first lines can be skipped.
+def splitlog(proc, skip=0):
+    args = proc.args
+    filename = proc.filename
+    setup = (proc.zeek_log_path, proc.es_index, proc.mappings, proc.fileid)
+    workers = args['fileprocs']
+    pending = collections.deque()
+
+    # The index is set up here, so the workers do not all send its mappings.
+    proc.prepare(proc.es_index, proc.mappings)
+    prepared = frozenset([proc.es_index]) if fingerprint(args, "/"+proc.es_index, proc.mappings) in provisioned else frozenset()
+
+    def collect(result, done):
+        result = result.get()
+        proc.items += result['items']
+        proc.sender.stats.add(result['sent'], result['retried'], result['dropped'], counted=True)
+        metrics.merge(result['metrics'])
+        correlatekeys.addpairs(result['keys'])
+        if done is not None:
+            done()
+
+    with multiprocessing.Pool(workers, initializer=initworker, initargs=(stdoutlock,)) as pool:
+        def dispatch(header, part, first, last):
+            done = proc.progress.claim(last) if proc.progress is not None else None
+            pending.append((pool.apply_async(splitworker, ((args, filename, setup, header, part, first, frozenset(provisioned), prepared),)), done))
+            # Only a few parts wait for each worker, so a big compressed log is not read into memory.
+            while len(pending) > 2 * workers:
+                collect(*pending.popleft())
+
+        if compression(filename) is None:
+            # An uncompressed log is mapped into memory and cut into ranges at newlines.
+            with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                blocks, header = headerblocks(mm, "")
+                line, pos = 0, 0
+                for h, start, end in blocks:
+                    line += countlines(mm, pos, start)
+                    pos = end
+                    step = max((end - start) // workers, splitchunk)
+                    while start < end:
+                        stop = mm.find(b"\n", min(start + step, end) - 1, end)
+                        stop = end if stop < 0 else stop + 1
+                        first = line + 1
+                        line += countlines(mm, start, stop)
+                        # Lines that were already sent are skipped.
+                        if line > skip:
+                            if first <= skip:
+                                start = skipbuffer(mm, start, stop, skip - first + 1)
+                                first = skip + 1
+                            dispatch(h, (start, stop), first, line)
+                        start = stop
+        else:
+            # A compressed log is read by its own thread, while the workers parse what it has read.
+            parts = queue.Queue(maxsize=workers)
+            stop = threading.Event()
+            thread = threading.Thread(target=readlogparts, args=(filename, parts, stop, skip), daemon=True)
+            thread.start()
+            try:
+                for part in iter(parts.get, None):
+                    if isinstance(part, Exception):
+                        raise part
+                    dispatch(*part)
+            finally:
+                stop.set()
+                while thread.is_alive():
+                    try:
+                        parts.get_nowait()
+                    except queue.Empty:
+                        thread.join(0.1)
+
+        while len(pending) > 0:
+            collect(*pending.popleft())
+
+# A function to process one log file into ES, or stdout.
+def processlog(args, filename):
+    # This sends the bulk bodies.  Output to stdout is written in order from this thread.
+    sender = BulkSender(args, senderthreads(args), args['queuesize'])
+    proc = LogProcessor(args, filename, sender)
+
+    # Logs are identified by what is in them for --ids and --checkpoint.  With --resume, the
+    # lines that were already sent are skipped.
+    key, progress, skip = None, None, 0
+    if args['ids'] or len(args['checkpoint']) > 0:
+        key = fileid(filename)
+        store = checkpointstore(args)
+        if store is not None and key is not None:
+            skip = store.get(key) if args['resume'] else 0
+            progress = LogProgress(store, key, filename, skip)
+
+    try:
+        # This section takes care of TSV logs.  Skip ahead for the JSON logic.
+        if not args['jsonlogs']:
+            reader = ZeekLogReader(filename, skip=skip)
+
+            # Get the date
+            try:
+                log_date = datetime.datetime.strptime(reader.opened, "%Y-%m-%d-%H-%M-%S")
+            except:
+                if not args['supresswarnings']:
+                    print("Date not found from Zeek log! {}".format(filename))
+                exit(-4)
 
-        grep_process = subprocess.Popen(['grep', '#fields'], 
-                                        stdin=head_process.stdout,
-                                        stdout=subprocess.PIPE)
+            # Get the Zeek log path
+            zeek_log_path = reader.path
 
-        fields = grep_process.communicate()[0].decode('UTF-8').strip().split('\t')[1:]
+            # Build the ES index.
+            es_index = indexname(args, zeek_log_path, log_date)
 
-        # Get the Zeek types from the log file.
+            # Only process if we have a valid log file.
+            if len(reader.types) > 0 and len(reader.fields) > 0:
+                # Put mappings
 
-        zcat_process = subprocess.Popen(zcat_name+[filename], 
-                                        stdout=subprocess.PIPE)
+                mappings = tsvmappings(reader.fields, reader.types, proc.keywords)
 
-        head_process = subprocess.Popen(['head'], 
-                                        stdin=zcat_process.stdout,
-                                        stdout=subprocess.PIPE)
+                # Put index template for data stream
 
-        grep_process = subprocess.Popen(['grep', '#types'], 
-                                        stdin=head_process.stdout,
-                                        stdout=subprocess.PIPE)
+                if args["datastream"] > 0:
+                    senddatastream(args, es_index, mappings)
 
-        types = grep_process.communicate()[0].decode('UTF-8').strip().split('\t')[1:]
+                # Put data
 
-        # Read TSV
+                proc.close()
+                proc = tsvprocessor(args)(args, filename, sender, zeek_log_path, es_index, mappings)
+                proc.track(key, progress)
 
-        zcat_process = subprocess.Popen(zcat_name+[filename], 
-                                        stdout=subprocess.PIPE)
+                if args['fileprocs'] > 1:
+                    # Large logs can be split across worker processes.
+                    splitlog(proc, skip)
+                else:
+                    # Iterate through every block of rows in the TSV.  Each block has its own fields and types.
+                    for read_tsv in reader.blocks():
+                        proc.setschema(reader)
+                        proc.addrows(read_tsv, reader.lineno + 1)
 
-        grep_process = subprocess.Popen(['grep', '-E', '-v', '^#'], 
-                                        stdin=zcat_process.stdout,
-                                        stdout=subprocess.PIPE)
+                    # We do this one last time to get rid of any remaining lines.
+                    proc.finish()
 
-        # Make the max size 
-        csv.field_size_limit(sys.maxsize)
+            reader.close()
+        else:
+            # This does everything the TSV version does, but for JSON
+            # Read JSON log
+            proc.close()
+            proc = JSONProcessor(args, filename, sender)
+            proc.track(key, progress)
+            with openlog(filename) as j_f:
+                skiplines(j_f, skip)
+                proc.addlines(blocklines(j_f), skip + 1)
+            proc.finish()
+    finally:
+        sender.close()
+        proc.close()
+
+    # Let the caller know how it went.
+    return dict(items=proc.items, sent=sender.stats.sent, retried=sender.stats.retried, dropped=sender.stats.dropped)
+
+# A function to find the log type from a log file name, like conn for conn.00:00:00-01:00:00.log.gz
+# or conn_20220101_00:00:00-01:00:00.log.gz.
+def logtype(filename):
+    return re.match(r"(.*?)(_\d.*)?$", os.path.basename(filename).split(".")[0]).group(1).lower()
+
+# A function to expand files, directories and globs into a sorted list of log files, grouped by log type.
+# Directories are searched recursively for *.log files, and *.log.gz, .zst, .bz2 and .lz4 files.  If log types are given, only those
+# are kept, in that order.
+def findlogs(inputs, logtypes=[]):
+    files = []
+    for name in inputs:
+        if os.path.isdir(name):
+            for root, dirs, dirfiles in os.walk(name):
+                files += [os.path.join(root, f) for f in dirfiles if logfilename.search(f)]
+        elif glob.has_magic(name):
+            files += glob.glob(name, recursive=True)
+        else:
+            files.append(name)
+
+    bytype = {}
+    for f in sorted(set(files)):
+        bytype.setdefault(logtype(f), []).append(f)
+    if len(logtypes) > 0:
+        return [(t, bytype[t]) for t in logtypes if t in bytype]
+    return sorted(bytype.items())
+
+# A function to set up a worker process.
+def initworker(lock):
+    global stdoutlock, deadletterlock
+    # Connections and checkpoint files are not shared with the parent.
+    esclients.clear()
+    humioclients.clear()
+    geoipreaders.clear()
+    checkpointstores.clear()
+    stdoutlock = lock
+    # The threads of the parent, like the metrics writer and the senders, can hold its locks when it forks.
+    # Those threads are not in the worker, so the locks would never be let go.
+    metrics.lock = threading.Lock()
+    batchsize.lock = threading.Lock()
+    deadletterlock = threading.Lock()
+    # Worker processes hand back only what they counted and collected themselves.
+    metrics.reset()
+    correlatekeys.clear()
+
+# A function run by a worker process to ingest one file.  A failed file is reported, not raised.
+def ingestworker(task):
+    args, filename, done, prepared = task
+    provisioned.update(done)
+    preparedindices.clear()
+    preparedindices.update(prepared)
+    metrics.timing = statson(args)
+    decompression(args)
+    try:
+        return dict(processlog(args, filename), filename=filename, ok=True, metrics=metrics.take(), keys=correlatekeys.take())
+    except KeyboardInterrupt:
+        raise
+    except BaseException as exc:
+        error = "exit code {}".format(exc.code) if isinstance(exc, SystemExit) else "{}: {}".format(type(exc).__name__, exc)
+        return dict(filename=filename, ok=False, error=error, metrics=metrics.take(), keys=correlatekeys.take())
+
+# A function to set up everything a log type needs in ES once, before the workers start on its files.
+# The index of every file is found from its header, or from the first line of a JSON log, and the
+# mappings of the files going to the same index are sent together.  It returns the indices set up.
+def setuplogtype(args, files):
+    if args['stdout']:
+        return frozenset()
+    ingest_pipeline = buildpipeline(args)
+    if len(ingest_pipeline["processors"]) > 0:
+        sendpipeline(args, ingest_pipeline)
+    # Nothing else is set up in ES for Parquet or Arrow files.
+    if args['outformat'] != "ndjson":
+        return frozenset()
+
+    indices = {}
+    for filename in files:
+        try:
+            found = logindex(args, filename)
+        except Exception:
+            # The worker process sending the file reports what is wrong with it.
+            continue
+        if found is not None:
+            es_index, mappings = found
+            if es_index not in indices:
+                indices[es_index] = mappings
+            else:
+                properties = indices[es_index]["mappings"]["properties"]
+                for k, v in mappings["mappings"]["properties"].items():
+                    properties.setdefault(k, v)
+
+    prepared = set()
+    for es_index, mappings in indices.items():
+        # Data stream templates are set up here for TSV logs, since the index name comes from the header.
+        if args['datastream'] > 0 and not args['jsonlogs']:
+            senddatastream(args, es_index, mappings)
+        sendmappings(args, es_index, mappings)
+        # Indices we could not set up are left to the workers.
+        if fingerprint(args, "/"+es_index, mappings) in provisioned:
+            prepared.add(es_index)
+    return frozenset(prepared)
+
+# A function to find the index a log goes to and its mappings, from its header or the first line of a JSON log
+# with a ts.  It returns None if the index is only named once the log is sent, like with hashes for dates.
+def logindex(args, filename):
+    if args['jsonlogs']:
+        if args['hashdates']:
+            return None
+        zeek_log_path = jsonlogpath(filename)
+        if zeek_log_path is None:
+            return None
+        loads = jsonparser(args['serializer'])
+        with openlog(filename) as f:
+            for line in f:
+                if len(line.strip()) > 0:
+                    j_data = loads(line)
+                    if "ts" in j_data:
+                        return jsonindexname(args, zeek_log_path, j_data["ts"]), jsonmappings()
+        return None
+    if args['hashdates'] and args['datastream'] == 0 and not args['esindex']:
+        return None
+    with ZeekLogReader(filename) as reader:
+        if len(reader.fields) == 0 or len(reader.types) == 0:
+            return None
+        log_date = datetime.datetime.strptime(reader.opened, "%Y-%m-%d-%H-%M-%S")
+        keywords = args['keywords'] if len(args['keywords']) > 0 else []
+        return indexname(args, reader.path, log_date), tsvmappings(reader.fields, reader.types, keywords)
+
+# A function to get the args for the worker processes sending the files of a log type.
+def logtypeargs(args, log_type):
+    typeargs = dict(args)
+    # Worker processes cannot start their own, so files are not split here.
+    typeargs['fileprocs'] = 0
+    # Filter files are read once here instead of in every worker.
+    filterfile = args['filterfile']
+    if len(args['filterdir']) > 0 and os.path.isfile(os.path.join(args['filterdir'], log_type+"_filter.txt")):
+        filterfile = os.path.join(args['filterdir'], log_type+"_filter.txt")
+    if len(filterfile) > 0:
+        with open(filterfile, "r") as ff:
+            typeargs['lambdafilter'] = ff.read()
+        typeargs['filterfile'] = ""
+    return typeargs
+
+# A function to ingest many log files with a pool of worker processes, one log type at a time.
+def ingestfiles(args, inputs):
+    start = time.time()
+    logs = findlogs(inputs, args['logtypes'])
+    procs = args['procs'] if args['procs'] > 0 else os.cpu_count()
+    summary = []
+
+    # The filter keys are loaded before the workers start, so they share them.
+    if len(args['filterkeys']) > 0:
+        loadfilterkeys(args['filterkeys'][1], args['keymemory'])
+
+    with multiprocessing.Pool(procs, initializer=initworker, initargs=(stdoutlock,)) as pool:
+        for log_type, files in logs:
+            typeargs = logtypeargs(args, log_type)
+            prepared = frozenset()
+            try:
+                prepared = setuplogtype(typeargs, files)
+            except Exception as exc:
+                if not args['supresswarnings']:
+                    print("WARNING! Could not set up log type {}: {}".format(log_type, exc), file=sys.stderr)
+            # The workers get everything set up so far, so they do not send it again.
+            done = frozenset(provisioned)
+            ok, failed, items, dropped = 0, 0, 0, 0
+            for result in pool.imap(ingestworker, [(typeargs, f, done, prepared) for f in files]):
+                metrics.merge(result['metrics'])
+                correlatekeys.addpairs(result['keys'])
+                if result['ok']:
+                    ok += 1
+                    items += result['items']
+                    dropped += result['dropped']
+                else:
+                    failed += 1
+                    if not args['supresswarnings']:
+                        print("WARNING! Failed to process {}: {}".format(result['filename'], result['error']), file=sys.stderr)
+            summary.append(dict(logtype=log_type, files=len(files), ok=ok, failed=failed, items=items, dropped=dropped))
+
+    if not args['supresswarnings']:
+        for s in summary:
+            print("{logtype}: {ok} of {files} files processed, {failed} failed, {items} documents, {dropped} dropped.".format(**s), file=sys.stderr)
+        print("Processed {} files in {:.1f} seconds.".format(sum(s['files'] for s in summary), time.time() - start), file=sys.stderr)
+    return summary
+
+# A function to open a bulk file written with --outdir, decompressing it if needed.
+def openbulkfile(filename):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rb")
+    if filename.endswith(".zst"):
+        return zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"))
+    return open(filename, "rb")
+
+# A function to find the setup files and the bulk files, by index, in --outdir directories.  Files still being written end
+# with .tmp and are left alone.  A bulk file given by itself is in the directory named for its index.
+def findbulkfiles(inputs):
+    setups, files = [], []
+    for i in inputs:
+        if os.path.isdir(i):
+            if os.path.isfile(os.path.join(i, setupfile)):
+                setups.append(os.path.join(i, setupfile))
+            for es_index in sorted(os.listdir(i)):
+                d = os.path.join(i, es_index)
+                if os.path.isdir(d):
+                    files += [(es_index, os.path.join(d, f)) for f in sorted(os.listdir(d)) if f.endswith(tuple(outendings.values()))]
+        elif os.path.basename(i) == setupfile:
+            setups.append(i)
+        else:
+            files.append((os.path.basename(os.path.dirname(os.path.abspath(i))), i))
+    return setups, files
+
+# A function to send the bulk files written with --outdir to ES.  The setup requests are sent first.  Then the
+# files are cut into bodies of --lines documents at newlines, without decoding the documents.  Files written with
+# --nobulk are found by their first line, and get the bulk action lines for their index put back.
+def loadbulkfiles(args, inputs):
+    setups, files = findbulkfiles(inputs)
+    if any(f.endswith(".zst") for _, f in files) and zstandard is None:
+        if not args['supresswarnings']:
+            print("Loading zstd files requires the zstandard Python library.")
+        exit(-13)
+    for filename in setups:
+        with open(filename, "rb") as f:
+            for line in f:
+                if len(line.strip()) > 0:
+                    request = json.loads(line)
+                    sendonce(args, request["path"], request["body"])
+
+    pipeline = "zeekgeoip" if len(buildpipeline(args)["processors"]) > 0 else None
+    batchsize.setup(args)
+    sender = BulkSender(args, args['senders'], args['queuesize'])
+    try:
+        for es_index, filename in files:
+            with openbulkfile(filename) as f:
+                lines = (line for line in blocklines(f) if len(line) > 0)
+                first = next(lines, None)
+                if first is None:
+                    continue
+                lines = itertools.chain([first], lines)
+                action = None
+                head = json.loads(first)
+                if not (len(head) == 1 and next(iter(head)) in ("create", "index")):
+                    action = BulkBuffer(es_index, pipeline, dumps=jsonserializer(args['serializer'])).action
+                # Requests are cut at whole documents, which are two lines with the action.
+                body, count = bytearray(), 0
+                for line in lines:
+                    if action is not None:
+                        body += action
+                        count += 1
+                    body += line
+                    body += b"\n"
+                    count += 1
+                    if count % 2 == 0 and batchsize.full(count // 2, len(body)):
+                        sender.send(body, es_index, filename)
+                        body, count = bytearray(), 0
+                if len(body) > 0:
+                    sender.send(body, es_index, filename)
+    finally:
+        sender.close()
+
+# A function to watch directories with inotify.  It returns a file descriptor that can be read when
+# something in them changes, or None if inotify is not available, in which case the logs are polled.
+def inotifywatch(dirs):
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        # Modified, closed after writing, moved from, moved to, created and deleted.
+        mask = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+        for d in dirs:
+            if libc.inotify_add_watch(fd, os.fsencode(d), mask) < 0:
+                os.close(fd)
+                return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+# A function to wait until a followed directory changes, or until it is time to check anyway.
+def waitforchange(watch):
+    if watch is None:
+        time.sleep(followwait)
+        return
+    if len(select.select([watch], [], [], followwait)[0]) > 0:
+        # Zeek writes a log in bursts, so we let a burst finish before reading it.
+        time.sleep(followbatch)
+        try:
+            while len(os.read(watch, 65536)) > 0:
+                pass
+        except BlockingIOError:
+            pass
+
+# This follows one live log, sending the lines Zeek adds to it.  When the log is rotated, what is left
+# of the old file is sent before the new one is read from the start.  The processor for every header,
+# along with its schema and index, is kept for as long as the file is.
+class LogTail:
+    def __init__(self, args, filename, sender, fromstart=True):
+        self.args = args
+        self.filename = filename
+        self.sender = sender
+        self.f = None
+        # The rows already in a log when we start following it can be skipped.
+        self.skip = not fromstart
+        self.header = ""
+        self.partial = b""
+        self.procs = {}
+        self.items = 0
+        # The lines read so far, the identity of the log and the lines sent, for --ids and --checkpoint.
+        self.lineno = 0
+        self.key = None
+        self.progress = None
+        # The processor that was given the last lines.
+        self.last = None
+        # The device and inode of the file read last, so it is known once it is rotated.
+        self.inode = None
+
+    # Give a processor the identity of the log and the progress of its lines, starting them if needed.
+    def track(self, proc, first):
+        store = checkpointstore(self.args)
+        if (self.args['ids'] or store is not None) and self.key is None:
+            self.key = fileid(self.filename)
+        if store is not None and self.key is not None and self.progress is None:
+            self.progress = LogProgress(store, self.key, self.filename, first - 1)
+        proc.track(self.key, self.progress)
+
+    # Get the processor for the rows after a header, or None if the header is not valid.
+    # The first line of the rows is used to start tracking the lines sent.
+    def processor(self, header, first):
+        if header not in self.procs:
+            if self.args['jsonlogs']:
+                self.procs[header] = (JSONProcessor(self.args, self.filename, self.sender), None)
+                self.track(self.procs[header][0], first)
+                return self.procs[header]
+            self.procs[header] = (None, None)
+            reader = ZeekLogReader(self.filename, io.StringIO(header))
+            if len(reader.fields) == 0 or len(reader.types) == 0:
+                return self.procs[header]
+            try:
+                log_date = datetime.datetime.strptime(reader.opened, "%Y-%m-%d-%H-%M-%S")
+            except ValueError:
+                if not self.args['supresswarnings']:
+                    print("Date not found from Zeek log! {}".format(self.filename))
+                return self.procs[header]
+            es_index = indexname(self.args, reader.path, log_date)
+            # The rows after a later header block share the mappings of the same index.
+            mappings = None
+            for proc, sep in self.procs.values():
+                if proc is not None and proc.es_index == es_index:
+                    mappings = proc.mappings
+            if mappings is None:
+                mappings = tsvmappings(reader.fields, reader.types, self.args['keywords'])
+                if self.args["datastream"] > 0 and not self.args['stdout']:
+                    senddatastream(self.args, es_index, mappings)
+            proc = TSVProcessor(self.args, self.filename, self.sender, reader.path, es_index, mappings)
+            proc.setschema(reader)
+            self.track(proc, first)
+            self.procs[header] = (proc, reader.separator)
+        return self.procs[header]
+
+    # Read and send every complete line added to the log since the last time.
+    def read(self):
+        while True:
+            chunk = self.f.read(splitchunk)
+            if len(chunk) == 0:
+                break
+            data = self.partial + chunk
+            end = data.rfind(b"\n") + 1
+            self.partial = data[end:]
+            blocks, self.header = headerblocks(data, self.header, 0, end)
+            line, pos = self.lineno, 0
+            self.lineno += data.count(b"\n", 0, end)
+            if self.skip:
+                continue
+            for header, start, stop in blocks:
+                line += data.count(b"\n", pos, start)
+                first = line + 1
+                line += data.count(b"\n", start, stop)
+                pos = stop
+                proc, sep = self.processor(header, first)
+                if proc is None:
+                    continue
+                # Lines are sent in order, so the checkpoint never passes lines that were not sent.
+                if self.last is not None and self.last is not proc:
+                    self.last.flush()
+                self.last = proc
+                if sep is None:
+                    proc.addlines(data[start:stop - 1].split(b"\n"), first)
+                else:
+                    proc.addrows(splitrows(data[start:stop].decode("UTF-8"), sep), first)
+        self.skip = False
+        for proc, sep in self.procs.values():
+            if proc is not None:
+                proc.flush()
+
+    # Check the log for new lines, and for rotation.  This returns False once the log is gone.
+    def poll(self):
+        try:
+            st = os.stat(self.filename)
+        except FileNotFoundError:
+            st = None
+        if self.f is not None:
+            # Anything written before the log was rotated is sent first.
+            self.read()
+            if st is None or st.st_ino != os.fstat(self.f.fileno()).st_ino or st.st_size < self.f.tell():
+                self.close()
+        if self.f is None and st is not None:
+            try:
+                self.f = open(self.filename, "rb")
+            except FileNotFoundError:
+                return False
+            st = os.fstat(self.f.fileno())
+            self.inode = (st.st_dev, st.st_ino)
+            # With --resume, we start after the lines that were already sent.
+            store = checkpointstore(self.args)
+            if self.args['resume'] and store is not None:
+                key = fileid(self.filename)
+                if key is not None and store.get(key) > 0:
+                    self.lineno = store.get(key)
+                    self.header = skiplines(self.f, self.lineno)
+                    self.skip = False
+            self.read()
+        return self.f is not None
+
+    # Stop reading the current file.
+    def close(self):
+        for proc, sep in self.procs.values():
+            if proc is not None:
+                proc.finish()
+                proc.close()
+                self.items += proc.items
+        if self.f is not None:
+            self.f.close()
+        self.f = None
+        self.header = ""
+        self.partial = b""
+        self.procs = {}
+        self.lineno = 0
+        self.key = None
+        self.progress = None
+        self.last = None
+
+# A function to follow the current logs in some directories, and the directories in them, sending new lines as they
+# are written until we are stopped.  Current logs that appear later, like those started after a rotation, are read
+# from the start.  Other logs that appear, like rotated, compressed or copied ones, are sent whole by worker processes
+# once they have not changed for a while.  Those that were there when we started are only sent with --fromstart.
+def followlogs(args, dirs):
+    sender = BulkSender(args, senderthreads(args), args['queuesize'])
+    watch = inotifywatch([root for d in dirs for root, subdirs, names in os.walk(d)])
+    tails = {}
+    fromstart = args['fromstart']
+    wait = metrics.timed(waitforchange, "idle") if metrics.timing else waitforchange
+    # The logs that were followed, by device and inode, are not sent again after they are rotated.
+    followed = set()
+    # The other logs waiting to be sent, and the ones already sent or skipped.
+    waiting = set()
+    done = set()
+    pool = None
+    pending = collections.deque()
+
+    # A function to hand back what a worker did with a log.
+    def collect(result):
+        result = result.get()
+        metrics.merge(result['metrics'])
+        if not result['ok'] and not args['supresswarnings']:
+            print("WARNING! Failed to process {}: {}".format(result['filename'], result['error']), file=sys.stderr)
+
+    # A docker stop sends SIGTERM, which stops us the same way Ctrl-C does.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while True:
+            # The current logs are followed, like conn.log, and the rest, like conn.2022-01-01-00-00-00.log.gz, are sent whole.
+            found = set()
+            for d in dirs:
+                for root, subdirs, names in os.walk(d):
+                    subdirs.sort()
+                    for name in sorted(names):
+                        path = os.path.join(root, name)
+                        if not logfilename.search(name) or (len(args['logtypes']) > 0 and logtype(name) not in args['logtypes']):
+                            continue
+                        found.add(path)
+                        if path in tails or path in waiting or path in done:
+                            continue
+                        if re.match(r"[^.]+\.log$", name):
+                            tails[path] = LogTail(args, path, sender, fromstart)
+                        elif fromstart:
+                            waiting.add(path)
+                        else:
+                            done.add(path)
+            fromstart = True
+            done &= found
+
+            for path in list(tails):
+                if not tails[path].poll():
+                    tails.pop(path).close()
+                elif tails[path].inode is not None:
+                    followed.add(tails[path].inode)
+
+            for path in sorted(waiting):
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    waiting.discard(path)
+                    continue
+                if (st.st_dev, st.st_ino) in followed:
+                    # The rest of a rotated log was sent by the tail that followed it.
+                    waiting.discard(path)
+                    done.add(path)
+                elif time.time() - st.st_mtime >= followsettle:
+                    waiting.discard(path)
+                    done.add(path)
+                    typeargs = logtypeargs(args, logtype(path))
+                    prepared = frozenset()
+                    try:
+                        prepared = setuplogtype(typeargs, [path])
+                    except Exception as exc:
+                        if not args['supresswarnings']:
+                            print("WARNING! Could not set up log type {}: {}".format(logtype(path), exc), file=sys.stderr)
+                    if pool is None:
+                        pool = multiprocessing.Pool(args['procs'] if args['procs'] > 0 else os.cpu_count(), initializer=initworker, initargs=(stdoutlock,))
+                    pending.append(pool.apply_async(ingestworker, ((typeargs, path, frozenset(provisioned), prepared),)))
+
+            while len(pending) > 0 and pending[0].ready():
+                collect(pending.popleft())
+
+            wait(watch)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for tail in tails.values():
+            tail.close()
+        sender.close()
+        if pool is not None:
+            pool.terminate()
+        if watch is not None:
+            os.close(watch)
 
-        # Only process if we have a valid log file.
-        if len(types) > 0 and len(fields) > 0:
-            read_tsv = csv.reader(io.TextIOWrapper(grep_process.stdout), delimiter="\t", quoting=csv.QUOTE_NONE)
+# Everything important is in here.
+def main(**args):
+    global stdoutlock
+    # Nothing counted by an earlier run in this process is reported as ours.
+    metrics.reset()
+    metrics.started = time.time()
+    # Every process writing to stdout shares this lock.
+    stdoutlock = multiprocessing.Lock()
 
-            # Put mappings
+    # Error checking
+    if args['esindex'] and args['stdout']:
+        if not args['supresswarnings']:
+            print("Cannot write to Elasticsearch and stdout at the same time.")
+        exit(-1)
 
-            mappings = {"mappings": {"properties": dict(geoip_orig=dict(properties=dict(location=dict(type="geo_point"))), geoip_resp=dict(properties=dict(location=dict(type="geo_point"))))}}
+    # Error checking
+    if args['nobulk'] and not args['stdout'] and len(args['outdir']) == 0:
+        if not args['supresswarnings']:
+            print("The nobulk option can only be used with the stdout or outdir options.")
+        exit(-2)
 
-            for i in range(len(fields)):
-                if types[i] == "time":
-                    mappings["mappings"]["properties"][fields[i]] = {"type": "date"}
-                elif types[i] == "addr":
-                    mappings["mappings"]["properties"][fields[i]] = {"type": "ip"}
-                elif types[i] == "string":
-                    # Special cases
-                    if fields[i] in keywords:
-                        mappings["mappings"]["properties"][fields[i]] = {"type": "text", "fields": { "keyword": { "type": "keyword" }}}
-                    else:
-                        mappings["mappings"]["properties"][fields[i]] = {"type": "text"}
+    # Error checking
+    if len(args['outdir']) > 0 and (args['stdout'] or len(args['humio']) > 0 or args['load']):
+        if not args['supresswarnings']:
+            print("The outdir option cannot be used with the stdout, humio or load options.")
+        exit(-12)
 
-            # Put index template for data stream
+    # Error checking
+    if args['load'] and args['stdout']:
+        if not args['supresswarnings']:
+            print("The load option sends bulk files to Elasticsearch, and cannot be used with the stdout option.")
+        exit(-19)
 
-            if args["datastream"] > 0:
-                senddatastream(args, es_index, mappings)
+    # Error checking
+    if args['fileprocs'] > 1 and args['jsonlogs']:
+        if not args['supresswarnings']:
+            print("The fileprocs option only splits TSV logs, and cannot be used with the jsonlogs option.")
+        exit(-20)
 
-            # Put data
+    # Error checking
+    if args['outcompress'] == "zstd" and args['outformat'] == "ndjson" and zstandard is None:
+        if not args['supresswarnings']:
+            print("The zstd outcompress option requires the zstandard Python library.")
+        exit(-13)
 
-            putmapping = False
-            putpipeline = False
-            n = 0
-            items = 0
-            outstring = ""
-            ofl = len(outputfields)
-
-            # Iterate through every row in the TSV.
-            for row in read_tsv:
-                # Build the dict and fill in any default info.
-                d = dict(zeek_log_filename=filename, zeek_log_path=zeek_log_path)
-                if (len(args['name']) > 0):
-                    d["zeek_log_system_name"] = args['name']
-                i = 0
-                added_val = False
-
-                # For each column in the row.
-                for col in row:
-                    # Process the data using a method for each type.  We also will only output fields of a certain name,
-                    # if identified on the command line.
-                    if types[i] == "time":
-                        if col != '-' and col != '(empty)' and col != '' and (ofl == 0 or fields[i] in outputfields):
-                            gmt_mydt = datetime.datetime.utcfromtimestamp(float(col))
-                            if not args['timestamp']:
-                                d[fields[i]] = "{}T{}".format(gmt_mydt.date(), gmt_mydt.time())
-                            else:
-                                if args['origtime']:
-                                    d[fields[i]] = gmt_mydt.timestamp()
-                                else:
-                                    d[fields[i]] = gmt_mydt.timestamp()*1000
-                            added_val = True
-                    elif types[i] == "interval" or types[i] == "double":
-                        if col != '-' and col != '(empty)' and col != '' and (ofl == 0 or fields[i] in outputfields):
-                            d[fields[i]] = float(col)
-                            added_val = True
-                    elif types[i] == "bool":
-                        if col != '-' and col != '(empty)' and col != '' and (ofl == 0 or fields[i] in outputfields):
-                            d[fields[i]] = col == "T"
-                            added_val = True
-                    elif types[i] == "port" or types[i] == "count" or types[i] == "int":
-                        if col != '-' and col != '(empty)' and col != '' and (ofl == 0 or fields[i] in outputfields):
-                            d[fields[i]] = int(col)
-                            added_val = True
-                    elif types[i].startswith("vector") or types[i].startswith("set"):
-                        if col != '-' and col != '(empty)' and col != '' and (ofl == 0 or fields[i] in outputfields):
-                            d[fields[i]] = col.split(",")
-                            added_val = True
-                    else:
-                        if col != '-' and col != '(empty)' and col != '' and (ofl == 0 or fields[i] in outputfields):
-                            d[fields[i]] = col
-                            added_val = True
-                    i += 1
-
-                # Here we only add data if there is a timestamp, and if the filter keys are used we make sure our key exists.
-                if added_val and "ts" in d and (not filterkeys_field or (filterkeys_field and d[filterkeys_field] in filterkeys)):
-                    # This is the Python function filtering logic.
-                    filter_data = False
-                    if filterfilter:
-                        output = list(filter(filterfilter, [d]))
-                        if len(output) == 0:
-                            filter_data = True
-
-                    # If we haven't filtered using the Python filter function...
-                    if not filter_data:
-                        # Log the keys to a file, if desired.
-                        i = 0
-                        for lkf in logkeyfields:
-                            lkfd = logkeys_fds[i]
-                            if lkf in d:
-                                if isinstance(d[lkf], list):
-                                    for z in d[lkf]:
-                                        lkfd.write(z)
-                                        lkfd.write("\n")
-                                else:
-                                    lkfd.write(d[lkf])
-                                    lkfd.write("\n")
-                            i += 1
-
-                        # Create the bulk header.
-                        if not args['nobulk']:
-                            i = dict(create=dict(_index=es_index))
-                            if len(ingest_pipeline["processors"]) > 0:
-                                i["create"]["pipeline"] = "zeekgeoip"
-                            outstring += json.dumps(i)+"\n"
-                        # Prepare the output and increment counters
-                        if args['humio']:
-                            d['ts'] = d['ts'] + "Z"
-                            if "_write_ts" in d:
-                                d['_write_ts'] = d['_write_ts'] + "Z"
-                            else:
-                                d["_write_ts"] = d["ts"]
-                            if "_path" not in d:
-                                d["_path"] = zeek_log_path
-                            if (len(args['name'].strip()) > 0):
-                                d["_system_name"] = args['name'].strip()
-                        d["@timestamp"] = d["ts"]
-                        outstring += json.dumps(d)+"\n"
-                        n += 1
-                        items += 1
-                        # If we aren't using stdout, prepare the ES index/datastream.
-                        if not args['stdout']:
-                            if putmapping == False:
-                                sendmappings(args, es_index, mappings)
-                                putmapping = True
-                            if putpipeline == False and len(ingest_pipeline["processors"]) > 0:
-                                sendpipeline(args, ingest_pipeline)
-                                putpipeline = True
-
-                # Once we get more than "lines", we send it to ES
-                if n >= args['lines'] and len(outstring) > 0:
-                    sendbulk(args, outstring, es_index, filename)
-                    outstring = ""
-                    n = 0
-
-            # We do this one last time to get rid of any remaining lines.
-            if n != 0 and len(outstring) > 0:
-                sendbulk(args, outstring, es_index, filename)
-    else:
-        # This does everything the TSV version does, but for JSON
-        # Read JSON log
-        zcat_process = subprocess.Popen(zcat_name+[filename], 
-                                        stdout=subprocess.PIPE)
-        j_in = io.TextIOWrapper(zcat_process.stdout)
-
-        zeek_log_path = ""
-        items = 0
-        n = 0
-        outstring = ""
-        es_index = ""
+    # Error checking
+    if args['outformat'] != "ndjson" and (pyarrow is None or len(args['outdir']) == 0 or args['jsonlogs'] or args['follow'] or args['ingestion'] or len(args['geoip']) > 0
+                                          or (args['outformat'] == "arrow" and args['outcompress'] == "gzip")):
+        if not args['supresswarnings']:
+            print("The parquet and arrow outformat options require the pyarrow Python library and the outdir option, cannot be used with the jsonlogs,\nfollow, ingestion or geoip options, and Arrow files cannot be gzip compressed.")
+        exit(-16)
 
-        # Put mappings
+    # Error checking
+    if len(args['rollup']) > 0 and args['outformat'] != "ndjson":
+        if not args['supresswarnings']:
+            print("The rollup option cannot be used with the parquet and arrow outformat options.")
+        exit(-17)
 
-        mappings = {"mappings": {"properties": dict(ts=dict(type="date"), geoip_orig=dict(properties=dict(location=dict(type="geo_point"))), 
-                                                                            geoip_resp=dict(properties=dict(location=dict(type="geo_point"))))}}
-        mappings["mappings"]["properties"]["id.orig_h"] = {"type": "ip"}
-        mappings["mappings"]["properties"]["id.resp_h"] = {"type": "ip"}
-        putmapping = False
-        putpipeline = False
-        putdatastream = False
+    # Error checking
+    if len(args['humio']) > 0 and (not args['stdout'] or not args['nobulk'] or args['timestamp']):
+        if not args['supresswarnings']:
+            print("The Humio option can only be used with the stdout and nobulk options, and cannot have the timestamp option.")
+        exit(-5)
 
-        # We continue until broken.
-        while True:
-            line = j_in.readline()
-            
-            # Here is where we break out of the while True loop.
-            if not line:
-                break
+    # Error checking
+    if not args['timestamp'] and args['origtime']:
+        if not args['supresswarnings']:
+            print("The origtime option can only be used with the timestamp option.")
+        exit(-3)
 
-            # Load our data so we can process it.
-            j_data = json.loads(line)
+    # Error checking
+    if len(args['lambdafilter']) > 0 and len(args['filterfile']) > 0:
+        if not args['supresswarnings']:
+            print("The lambdafilter option cannot be used with the filterfile option.")
+        exit(-7)
 
-            # Only process data that has a timestamp field.
-            if "ts" in j_data:
-                # Here we deal with the time output format.
-                gmt_mydt = datetime.datetime.utcfromtimestamp(float(j_data["ts"]))
+    # Error checking
+    if len(args['geoip']) > 0 and (maxminddb is None or args['ingestion']):
+        if not args['supresswarnings']:
+            print("The geoip option requires the maxminddb Python library, and cannot be used with the ingestion option.")
+        exit(-15)
 
-                if not args['timestamp']:
-                    j_data["ts"] = "{}T{}".format(gmt_mydt.date(), gmt_mydt.time())
-                else:
-                    if args['origtime']:
-                        j_data["ts"] = gmt_mydt.timestamp()
-                    else:
-                        # ES uses ms
-                        j_data["ts"] = gmt_mydt.timestamp()*1000
+    # Error checking
+    if args['numpy'] and numpy is None:
+        if not args['supresswarnings']:
+            print("The numpy option requires the numpy Python library.")
+        exit(-8)
 
-                # This happens when we go through this loop the first time and do not have an es_index name.
-                if es_index == "":
-                    sysname = ""
+    # Error checking
+    if len(args['filter']) > 0:
+        try:
+            parsefilter(args['filter'])
+        except ValueError as exc:
+            if not args['supresswarnings']:
+                print("The filter could not be read: {}".format(exc))
+            exit(-11)
 
-                    if (len(args['name']) > 0):
-                        sysname = "{}_".format(args['name'])
+    # Error checking
+    if args['resume'] and len(args['checkpoint']) == 0:
+        if not args['supresswarnings']:
+            print("The resume option can only be used with the checkpoint option.")
+        exit(-10)
 
-                    # Since the JSON logs do not include the Zeek log path, we try to guess it from the name.
-                    try:
-                        zeek_log_path = re.search(".*\/([^\._]+).*", filename).group(1).lower()
-                    except:
-                        print("Log path cannot be found from filename: {}".format(filename))
-                        exit(-5)
-
-                    # We allow for hahes instead of dates in our index name.
-                    if not args['hashdates']:
-                        es_index = "zeek_{}{}_{}".format(sysname, zeek_log_path, gmt_mydt.date())
-                    else:
-                        es_index = "zeek_{}{}_{}".format(sysname, zeek_log_path, random.getrandbits(hashbits))
-
-                    es_index = es_index.replace(':', '_').replace("/", "_")
-
-                # If we are not sending the data to stdout, we prepare the ES index or datastream.
-                if not args['stdout']:
-                    if putmapping == False:
-                        sendmappings(args, es_index, mappings)
-                        putmapping = True
-                    if putpipeline == False and len(ingest_pipeline["processors"]) > 0:
-                        sendpipeline(args, ingest_pipeline)
-                        putpipeline = True
-                    if args["datastream"] > 0 and putdatastream == False:
-                        senddatastream(args, es_index, mappings)
-                        putdatastream = True
+    # Error checking
+    if len(args['correlate']) > 0 and (len(args['correlate']) < 2 or len(args['filterkeys']) > 0 or args['follow'] or args['load'] or args['keyindex']):
+        if not args['supresswarnings']:
+            print("The correlate option needs a field and related log types, and cannot be used with the filterkeys, follow, load or keyindex options.")
+        exit(-14)
 
-                # We add the system name, if desired.
-                if (len(args['name']) > 0):
-                    j_data["zeek_log_system_name"] = args['name']
-
-                # Here we are checking if the keys will filter the data in.
-                if not filterkeys_field or (filterkeys_field and j_data[filterkeys_field] in filterkeys):
-                    # This check below is for the Python filters.
-                    filter_data = False
-                    if filterfilter:
-                        output = list(filter(filterfilter, [j_data]))
-                        if len(output) == 0:
-                            filter_data = True
-
-                    if not filter_data:
-                        # We log the keys, if so desired.
-                        i = 0
-                        for lkf in logkeyfields:
-                            lkfd = logkeys_fds[i]
-                            if lkf in j_data:
-                                if isinstance(j_data[lkf], list):
-                                    for z in j_data[lkf]:
-                                        lkfd.write(z)
-                                        lkfd.write("\n")
-                                else:
-                                    lkfd.write(j_data[lkf])
-                                    lkfd.write("\n")
-                            i += 1
-                        items += 1
-
-                        if not args['nobulk']:
-                            i = dict(create=dict(_index=es_index))
-                            if len(ingest_pipeline["processors"]) > 0:
-                                i["create"]["pipeline"] = "zeekgeoip"
-                            outstring += json.dumps(i)+"\n"
-                        j_data["@timestamp"] = j_data["ts"]
-                        # Here we only include the output fields identified via the command line.
-                        if len(outputfields) > 0:
-                            new_j_data = {}
-                            for o in outputfields:
-                                if o in j_data:
-                                    new_j_data[o] = j_data[o]
-                            j_data = new_j_data
-                        outstring += json.dumps(j_data) + "\n"
-                        n += 1
+    # Error checking
+    inputs = args['filename'] if isinstance(args['filename'], list) else [args['filename']]
+    if args['follow'] and not all(os.path.isdir(d) for d in inputs):
+        if not args['supresswarnings']:
+            print("The follow option can only be used with directories.")
+        exit(-9)
 
-                # Here we output a set of lines to the ES server.
-                if n >= args['lines'] and len(outstring) > 0:
-                    sendbulk(args, outstring, es_index, filename)
-                    outstring = ""
-                    n = 0
-
-        # We send the last of the data to the ES server, if there is any left.
-        if n != 0 and len(outstring) > 0:
-            sendbulk(args, outstring, es_index, filename)
+    # Error checking
+    if not args['keyindex'] and not args['load'] and not all(candecompress(i) for i in inputs if os.path.isfile(i)):
+        if not args['supresswarnings']:
+            print("Reading zstd logs requires the zstandard Python library, and lz4 logs the lz4 Python library.")
+        exit(-18)
+
+    # This remembers the ES setup requests made by earlier runs.
+    loadprovisioncache(args)
+
+    # Stats are counted anyway, but stages are only timed if we were asked for them.
+    metrics.timing = statson(args)
+    decompression(args)
+
+    # orjson is used when it is installed, but not for stdout, which keeps the output format of the json module.
+    if args['serializer'] == "auto":
+        args['serializer'] = "orjson" if orjson is not None and not args['stdout'] else "json"
+    writer = MetricsWriter(args) if len(args['statsfile']) > 0 or len(args['promfile']) > 0 else None
+
+    # The profile can be written while we run with SIGUSR1, which is handy when following logs.
+    profiler = None
+    if len(args['profile']) > 0:
+        profiler = cProfile.Profile()
+        if hasattr(signal, "SIGUSR1"):
+            def dumpprofile(signum, frame):
+                profiler.dump_stats(args['profile'])
+                profiler.enable()
+            signal.signal(signal.SIGUSR1, dumpprofile)
+        profiler.enable()
+
+    try:
+        # Live logs are followed until we are stopped.  A single file is processed here.
+        # Anything more goes to the worker processes.  Bulk files from --outdir are loaded as they are.
+        # Key files are only built into key indexes, and correlated logs go to the workers in two rounds.
+        if args['keyindex']:
+            buildkeyindexes(args, inputs)
+        elif args['load']:
+            loadbulkfiles(args, inputs)
+        elif len(args['correlate']) > 0:
+            correlatelogs(args, inputs)
+        elif args['follow']:
+            followlogs(args, inputs)
+        elif len(inputs) == 1 and not os.path.isdir(inputs[0]) and not glob.has_magic(inputs[0]) and len(args['logtypes']) == 0:
+            processlog(args, inputs[0])
+        else:
+            ingestfiles(args, inputs)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args['profile'])
+        if writer is not None:
+            writer.close()
+        if args['stats']:
+            print(metrics.summary(), file=sys.stderr)
 
 # This deals with running as a script vs. cython.
 if __name__ == "__main__":